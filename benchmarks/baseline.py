@@ -0,0 +1,303 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 11:03:27
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Performance baseline of the package, and regression check against it.
+'record' measures a fixed set of benchmarks and saves them in benchmarks//baseline.json (kept under version control) :
+    - throughput (steps/s) and peak memory of a few dispatch cases (see bench_dispatch.py)
+    - time per call of the device methods (see bench_devices.py)
+    - end-to-end time and peak memory of main.py on the bundled input//inpParam.xlsx
+    - import time of the package, on top of numpy and pandas (see bench_import.py)
+It also saves the outputs of main.py (.csv files) and of every strategy on a synthetic input as golden results under benchmarks//golden.
+'compare' runs the same measurements and compares them with the baseline : a metric regresses when it is worse than the baseline by more
+than a threshold, the threshold being the tolerance or twice the noise (relative spread of the repeated runs) if the runs are noisier,
+or the threshold of the metric in NoiseThresholds if it is higher.
+The timings that look regressed are measured again, and only regressions confirmed by the second measurement are reported.
+The outputs are compared with the golden results too. The exit code is 1 if a metric regresses or an output differs.
+NB : timings depend on the machine, record the baseline on the machine where it will be compared.
+:How to use:
+python benchmarks//baseline.py record
+python benchmarks//baseline.py compare --tolerance 0.15
+python benchmarks//baseline.py golden      (only compares the outputs with the golden results, no timing)
+'''
+#---------------------
+# %%
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+
+import io
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+try:
+    import resource # peak memory of the child processes (not available on Windows)
+except ImportError:
+    resource = None
+
+import bench_dispatch as BD
+import bench_devices as BV
+import bench_import as BI
+
+BaselineVersion = 1 # format of baseline.json
+BenchDir = os.path.dirname(os.path.realpath(__file__))
+RepoDir = os.path.dirname(BenchDir)
+BaselinePath = os.path.join(BenchDir, "baseline.json")
+GoldenDir = os.path.join(BenchDir, "golden")
+# dispatch cases of the baseline : every strategy on the base case, and bigger stocks with a forecast
+DispatchCases = [dict(BD.BaseCase, strategy=strategy) for strategy in BD.Strategies] + \
+                [dict(BD.BaseCase, strategy="LF-SelSu", horizon="30D", batteries=100, forecast_h=24),
+                 dict(BD.BaseCase, strategy="CostStrt", batteries=100, forecast_h=24)]
+# golden results of every strategy : one week at 1 hour, 10 batteries, 24 hour forecast (grid cut-offs and several SOCs are involved)
+GoldenCases = [dict(strategy=strategy, horizon="7D", dt_min=60, batteries=10, forecast_h=24) for strategy in BD.Strategies]
+MainInput = "inpParam.xlsx"
+# relative thresholds of the metrics noisier than their repeated runs show : the cost functions of the grid look up pandas tables (allocations, GC)
+# at every call, their time per call varies by up to 50 % from one run to the next on a single-CPU machine
+NoiseThresholds = {"devices/Grid.sale_cost/ns_per_call": 0.6, "devices/Grid.purchase_cost/ns_per_call": 0.6}
+
+def _metric(value: float, samples: list, unit: str, better: str) -> dict:
+    return {"value": value, "samples": samples, "unit": unit, "better": better}
+
+def measure_main(repeat: int = 3) -> tuple[dict, list[str], list[str]]:
+    """runs main.py on the bundled input, *repeat* times
+
+    Returns:
+        dict: metrics main/seconds and main/peak_rss_mb (if known)
+        list[str]: .csv files written in output// by the runs
+        list[str]: files created in output// by the runs (to be deleted afterwards)
+    """
+    env = dict(os.environ, MPLBACKEND="Agg")
+    OutputDir = os.path.join(RepoDir, "output")
+    before = {f: os.path.getmtime(os.path.join(OutputDir, f)) for f in os.listdir(OutputDir)}
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run = subprocess.run([sys.executable, os.path.join(RepoDir, "main.py"), MainInput], cwd=RepoDir, env=env, capture_output=True, text=True)
+        seconds.append(time.perf_counter() - t0)
+        assert run.returncode == 0, f"!!! main.py failed :\n{run.stderr[-2000:]} !!!"
+    metrics = {"main/seconds": _metric(min(seconds), seconds, "s", "lower")}
+    if resource is not None: # peak of the biggest child process : main.py is the first one
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        metrics["main/peak_rss_mb"] = _metric(peak / 2**20 if sys.platform == 'darwin' else peak / 2**10, [], "MB", "lower")
+    written = sorted(f for f in os.listdir(OutputDir) if f not in before or os.path.getmtime(os.path.join(OutputDir, f)) != before[f])
+    return metrics, [os.path.join(OutputDir, f) for f in written if f.endswith(".csv")], [os.path.join(OutputDir, f) for f in written if f not in before]
+
+def measure_dispatch(repeat: int = 5, cases: list[dict] = None) -> dict:
+    """steps/s and peak memory of DispatchCases (or of cases)"""
+    metrics = {}
+    for result in BD.run_suite(DispatchCases if cases is None else cases, repeat):
+        samples = [result["steps"] / s for s in result["seconds"]]
+        metrics[f"dispatch/{result['name']}/steps_per_s"] = _metric(result["steps_per_s"], samples, "steps/s", "higher")
+        if result["peak_rss_mb"] is not None:
+            metrics[f"dispatch/{result['name']}/peak_rss_mb"] = _metric(result["peak_rss_mb"], [], "MB", "lower")
+    return metrics
+
+def measure_devices(repeat: int = 3, min_time: float = 0.1, names: list[str] = None) -> dict:
+    """time per call of the device methods (see bench_devices.py), every one or those of names only"""
+    return {f"devices/{result['name']}/ns_per_call": _metric(result["ns_per_call"], result["ns"], "ns", "lower")
+            for result in BV.run(names, min_time, repeat, verbose=False) if names is None or result["name"] in names}
+
+def measure_imports(repeat: int = 5, statements: list[str] = None) -> dict:
+    """import time of the targets of bench_import.py (every one or those of statements only)"""
+    return {f"import/{result['statement'].split()[-1]}/seconds": _metric(result["seconds"], result["samples"], "s", "lower")
+            for result in BI.run({statement: budget for statement, budget in BI.Targets.items() if statements is None or statement in statements}, repeat, verbose=False)}
+
+def golden_outputs() -> dict:
+    """outputs of GoldenCases : time series of the strategy and SOC of every battery, as read back from a .csv file"""
+    outputs = {}
+    for case in GoldenCases:
+        dfIN = BD.case_input(case)
+        dfRes, allSOCs = BD.dispatch(case, dfIN, *BD.case_devices(case, dfIN))
+        dfOut = pd.concat([pd.DataFrame(dfRes), pd.DataFrame(allSOCs)], axis=1)
+        outputs[f"dispatch_{BD.case_name(case)}.csv"] = pd.read_csv(io.StringIO(dfOut.to_csv(index=False)))
+    return outputs
+
+def diff_frames(dfGolden: pd.DataFrame, dfNew: pd.DataFrame, rtol: float = 1e-9, atol: float = 1e-9) -> list[str]:
+    """differences between a golden result and a new one (empty if they are the same)
+
+    Args:
+        dfGolden (pd.DataFrame): golden result
+        dfNew (pd.DataFrame): new result
+        rtol (float, optional): relative tolerance on numbers. Defaults to 1e-9.
+        atol (float, optional): absolute tolerance on numbers. Defaults to 1e-9.
+
+    Returns:
+        list[str]: one line per differing column (first differing row and maximum gap)
+    """
+    if list(dfGolden.columns) != list(dfNew.columns):
+        return [f"columns {list(dfGolden.columns)} became {list(dfNew.columns)}"]
+    if len(dfGolden) != len(dfNew):
+        return [f"{len(dfGolden)} rows became {len(dfNew)}"]
+    diffs = []
+    for col in dfGolden.columns:
+        old, new = dfGolden[col].to_numpy(), dfNew[col].to_numpy()
+        if pd.api.types.is_numeric_dtype(old.dtype) and pd.api.types.is_numeric_dtype(new.dtype):
+            old, new = old.astype(float), new.astype(float)
+            same = np.isclose(old, new, rtol=rtol, atol=atol, equal_nan=True)
+            gap = np.nanmax(np.abs(old - new)) if not same.all() else 0
+        else:
+            same = old.astype(str) == new.astype(str)
+            gap = None
+        if not same.all():
+            first = int(np.flatnonzero(~same)[0])
+            diffs.append(f"{col} : {int((~same).sum())} rows differ, first at row {first} ({old[first]} -> {new[first]})"
+                         + (f", max gap {gap}" if gap is not None else ""))
+    return diffs
+
+def record_golden(main_csv: list[str]):
+    """saves the outputs of main.py (main_csv) and of GoldenCases as golden results"""
+    shutil.rmtree(GoldenDir, ignore_errors=True)
+    os.makedirs(GoldenDir)
+    for path in main_csv:
+        shutil.copyfile(path, os.path.join(GoldenDir, "main_" + os.path.basename(path)))
+    for name, dfOut in golden_outputs().items():
+        dfOut.to_csv(os.path.join(GoldenDir, name), index=False)
+
+def compare_golden(main_csv: list[str]) -> dict:
+    """compares the outputs of main.py (main_csv) and of GoldenCases with the golden results
+
+    Returns:
+        dict: golden file name -> list of differences (empty if the same)
+    """
+    assert os.path.isdir(GoldenDir), f"!!! no golden results in {GoldenDir} : run 'baseline.py record' first !!!"
+    new = {"main_" + os.path.basename(path): pd.read_csv(path) for path in main_csv}
+    new.update(golden_outputs())
+    report = {}
+    for name in sorted(os.listdir(GoldenDir)):
+        report[name] = diff_frames(pd.read_csv(os.path.join(GoldenDir, name)), new[name]) if name in new else ["not written anymore"]
+    for name in sorted(set(new) - set(report)):
+        report[name] = ["no golden result"]
+    return report
+
+def compare_metrics(baseline: dict, current: dict, tolerance: float = 0.15, rss_tolerance: float = 0.10) -> pd.DataFrame:
+    """compares the metrics of a run with those of the baseline
+
+    Args:
+        baseline (dict): metrics of the baseline
+        current (dict): metrics of the run
+        tolerance (float, optional): relative slowdown accepted on timings. Defaults to 0.15.
+        rss_tolerance (float, optional): relative increase accepted on peak memory. Defaults to 0.10.
+
+    Returns:
+        pd.DataFrame: one row per metric of the baseline : baseline, current, change (>0 = worse), threshold and status ('ok', 'better', 'REGRESSION', 'missing')
+    """
+    def noise(metric):
+        samples = metric["samples"]
+        return (max(samples) - min(samples)) / min(samples) if len(samples) > 1 and min(samples) > 0 else 0
+    rows = []
+    for name, old in baseline.items():
+        new = current.get(name)
+        if new is None:
+            rows.append([name, old["value"], None, None, None, "missing"])
+            continue
+        change = (new["value"] - old["value"]) / old["value"] if old["value"] else 0
+        change = -change if old["better"] == "higher" else change
+        threshold = max(rss_tolerance if old["unit"] == "MB" else tolerance, 2 * max(noise(old), noise(new)), NoiseThresholds.get(name, 0))
+        status = "REGRESSION" if change > threshold else "better" if change < -threshold else "ok"
+        rows.append([name, old["value"], new["value"], change, threshold, status])
+    return pd.DataFrame(rows, columns=["metric", "baseline", "current", "change", "threshold", "status"])
+
+def measure_all(repeat: int = 3) -> tuple[dict, list[str], list[str]]:
+    """every metric of the baseline (main.py first, so that the peak memory of the child processes is its own)"""
+    metrics, main_csv, created = measure_main(repeat)
+    metrics.update(measure_dispatch(max(repeat, 5)))
+    metrics.update(measure_devices(repeat))
+    metrics.update(measure_imports(max(repeat, 5)))
+    return metrics, main_csv, created
+
+def confirm(metrics: dict, suspects: list[str], repeat: int = 3) -> dict:
+    """measures again the timings of suspects (metrics that look regressed) : a regression is kept only if the new runs confirm it,
+    one slow run on a busy machine is not enough. Every sample is kept, the value is the best one of both runs.
+
+    Args:
+        metrics (dict): metrics of the run
+        suspects (list[str]): names of the regressed metrics
+        repeat (int, optional): see measure_all(). Defaults to 3.
+
+    Returns:
+        dict: metrics, with the suspects measured twice
+    """
+    suspects = [name for name in suspects if name in metrics and metrics[name]["unit"] != "MB"] # peak memory doesn't depend on the load of the machine
+    again = {}
+    if "main/seconds" in suspects:
+        main_metrics, _, created = measure_main(repeat)
+        _clean(created)
+        again["main/seconds"] = main_metrics["main/seconds"]
+    names = {name.split("/")[1] for name in suspects if name.startswith("dispatch/")}
+    if names:
+        again.update(measure_dispatch(max(repeat, 5), [case for case in DispatchCases if BD.case_name(case) in names]))
+    names = [name.split("/")[1] for name in suspects if name.startswith("devices/")]
+    if names:
+        again.update(measure_devices(repeat, names=names))
+    names = [f"import {name.split('/')[1]}" for name in suspects if name.startswith("import/")]
+    if names:
+        again.update(measure_imports(max(repeat, 5), names))
+    merged = dict(metrics)
+    for name in suspects:
+        if name in again:
+            best = max if metrics[name]["better"] == "higher" else min
+            merged[name] = _metric(best(metrics[name]["value"], again[name]["value"]), metrics[name]["samples"] + again[name]["samples"],
+                                   metrics[name]["unit"], metrics[name]["better"])
+    return merged
+
+def _clean(created: list[str]):
+    """deletes the files created in output// by the runs of main.py (files already there are kept)"""
+    for path in created:
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance baseline and regression check of the package.")
+    parser.add_argument("command", choices=['record', 'compare', 'golden'], help="record the baseline, compare a run with it, or only compare the outputs")
+    parser.add_argument("--baseline", default=BaselinePath, help="baseline file")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of main.py and of each device benchmark (at least 5 per dispatch case)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative slowdown accepted when the runs are not noisier")
+    parser.add_argument("--rss-tolerance", type=float, default=0.10, help="relative increase of peak memory accepted")
+    args = parser.parse_args()
+
+    if args.command == 'golden':
+        _, main_csv, created = measure_main(1)
+        metrics = None
+    else:
+        metrics, main_csv, created = measure_all(args.repeat)
+    try:
+        if args.command == 'record':
+            record_golden(main_csv)
+            with open(args.baseline, 'w', encoding="utf-8") as f:
+                json.dump({"version": BaselineVersion, "environment": BD.environment(), "metrics": metrics}, f, indent=1)
+            print(f"{len(metrics)} metrics saved at {args.baseline}, golden results saved under {GoldenDir}")
+            sys.exit(0)
+        failed = False
+        if metrics is not None:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            assert baseline["version"] == BaselineVersion, f"!!! baseline format {baseline['version']} unknown, record it again !!!"
+            env = BD.environment()
+            for key in ["machine", "system", "cpus", "python"]:
+                if baseline["environment"].get(key) != env[key]:
+                    print(f"!!! the baseline was recorded with {key} = {baseline['environment'].get(key)}, not {env[key]} : timings may not be comparable !!!")
+            report = compare_metrics(baseline["metrics"], metrics, args.tolerance, args.rss_tolerance)
+            suspects = report.loc[report["status"] == "REGRESSION", "metric"].tolist()
+            if suspects:
+                print(f"{len(suspects)} metric(s) look regressed, measuring them again")
+                metrics = confirm(metrics, suspects, args.repeat)
+                report = compare_metrics(baseline["metrics"], metrics, args.tolerance, args.rss_tolerance)
+            with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.max_colwidth', 80):
+                print(report.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+            regressions = report[report["status"].isin(["REGRESSION", "missing"])]
+            print(f"\n{len(regressions)} regression(s) out of {len(report)} metrics (baseline of {baseline['environment'].get('date')}, commit {baseline['environment'].get('commit')})")
+            failed = len(regressions) > 0
+        golden = compare_golden(main_csv)
+        for name, diffs in golden.items():
+            print(f"{'same' if not diffs else 'DIFF'} {name}" + "".join(f"\n    {d}" for d in diffs))
+        failed = failed or any(golden.values())
+        print("!!! performance or outputs regressed !!!" if failed else "no regression")
+        sys.exit(1 if failed else 0)
+    finally:
+        _clean(created)
+# %%
@@ -0,0 +1,207 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 10:14:51
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Micro-benchmarks of the device methods called at every time step of a dispatch (Battery, BatteryStock, DieselGenerator, Grid).
+Every method is timed alone, over realistic arguments (random draws, fixed seed) and in its edge branches (full battery, empty battery,
+Pmax and Pmin clamping, empty tank, grid cut-off...). The state of the device is restored before every call : the time of this restoration
+is measured apart and subtracted. Every case checks on its first call that it really goes through the branch it is named after.
+:How to use:
+python benchmarks//bench_devices.py                              (every case, time per call in ns)
+python benchmarks//bench_devices.py --filter run_DG get_Pmax     (cases whose name contains one of these texts)
+python benchmarks//bench_devices.py --json output//devices.json  (saves the results)
+'''
+#---------------------
+# %%
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from virtualPMS import Battery, BatteryStock, DieselGenerator, Grid
+from bench_dispatch import BattParams, DieselParams, environment
+
+dt = 0.25          # hours (15 minutes)
+Fleets = [1, 10, 100]
+YearSteps = 35040  # length of the grid state : one year at 15 minutes
+Draws = 1024       # number of random arguments of a case, used in turn
+
+def _battery(n: int = 1) -> list[Battery]:
+    return [Battery({**BattParams, 'capacity': BattParams['capacity'] / n, 'Pmax_ch': BattParams['Pmax_ch'] / n,
+                     'Pmax_disch': BattParams['Pmax_disch'] / n}) for _ in range(n)]
+
+def _diesel() -> DieselGenerator:
+    DG_1 = DieselGenerator(dict(DieselParams))
+    DG_1.find_DG_coeffs()
+    return DG_1
+
+def _grid(cut_offs: bool = True) -> tuple[Grid, pd.Series]:
+    """grid over one year at 15 minutes (one cut-off of 2 hours every day at noon if cut_offs) and its time array, as dfIN["Time"] in a dispatch"""
+    TimeArray = pd.Series(pd.date_range('2025-01-01', periods=YearSteps, freq='15min'), name="Time")
+    state = np.ones(YearSteps, dtype=np.int64)
+    if cut_offs:
+        state[(TimeArray.dt.hour >= 12) & (TimeArray.dt.hour < 14)] = 0
+    # NB : reference tables of virtualPMS//DataBase (month in the first column), see bench_dispatch.case_devices()
+    return Grid(state, pd.read_csv(Grid.GridPricesRef).set_index('Id'), pd.read_csv(Grid.GridScheduleRef)), TimeArray
+
+def _soc_setter(batteries: list[Battery], socs: np.ndarray):
+    """restores the SOC of every battery from the row k of socs (Draws x batteries)"""
+    rows = socs.tolist()
+    def reset(k):
+        for b, soc in zip(batteries, rows[k % Draws]):
+            b.SOC = soc
+    return reset
+
+def cases() -> dict:
+    """every micro-benchmark : name -> (call, reset, expect)
+        call(k): calls the method with the k-th arguments
+        reset(k): restores the state of the device before the k-th call (None if the method neither changes nor reads it)
+        expect(result): True if the first call went through the branch of the case
+    """
+    rng = np.random.default_rng(0)
+    out = {}
+
+    # Battery
+    b = _battery()[0]
+    socs = rng.uniform(b.SOCmin, b.SOCmax, (Draws, 1))
+    powers = rng.uniform(0, b.Pmax_ch, Draws).tolist()
+    setter = _soc_setter([b], socs)
+    out["Battery.battery_charge"] = (lambda k: b.battery_charge(powers[k % Draws], dt), setter, lambda r: 0 < r)
+    out["Battery.battery_charge[full]"] = (lambda k: b.battery_charge(powers[k % Draws], dt), _soc_setter([b], np.full((Draws, 1), b.SOCmax)), lambda r: r == 0)
+    out["Battery.battery_charge[Pmax]"] = (lambda k: b.battery_charge(2 * b.Pmax_ch, dt), _soc_setter([b], np.full((Draws, 1), b.SOCmin)), lambda r: r == b.Pmax_ch)
+    out["Battery.battery_discharge"] = (lambda k: b.battery_discharge(powers[k % Draws], dt), setter, lambda r: 0 < r)
+    out["Battery.battery_discharge[empty]"] = (lambda k: b.battery_discharge(powers[k % Draws], dt), _soc_setter([b], np.full((Draws, 1), b.SOCmin)), lambda r: r == 0)
+    out["Battery.battery_discharge[Pmax]"] = (lambda k: b.battery_discharge(2 * b.Pmax_disch, dt), _soc_setter([b], np.full((Draws, 1), b.SOCmax)), lambda r: r == b.Pmax_disch)
+
+    # BatteryStock
+    grid_1, TimeArray = _grid()
+    grid_on, _ = _grid(cut_offs=False)
+    for n in Fleets:
+        stock = BatteryStock(_battery(n))
+        first = stock.battery_stock[0]
+        setter = _soc_setter(stock.battery_stock, rng.uniform(first.SOCmin, first.SOCmax, (Draws, n)))
+        full = _soc_setter(stock.battery_stock, np.full((Draws, n), first.SOCmax))
+        empty = _soc_setter(stock.battery_stock, np.full((Draws, n), first.SOCmin))
+        P = rng.uniform(0, BattParams['Pmax_ch'], Draws).tolist()
+        out[f"BatteryStock.battery_stock_charge[{n}bat]"] = (lambda k, s=stock: s.battery_stock_charge(P[k % Draws], dt), setter, lambda r: 0 < r)
+        out[f"BatteryStock.battery_stock_charge[{n}bat,full]"] = (lambda k, s=stock: s.battery_stock_charge(P[k % Draws], dt), full, lambda r: r == 0)
+        out[f"BatteryStock.battery_stock_discharge[{n}bat]"] = (lambda k, s=stock: s.battery_stock_discharge(P[k % Draws], dt), setter, lambda r: 0 < r)
+        out[f"BatteryStock.battery_stock_discharge[{n}bat,empty]"] = (lambda k, s=stock: s.battery_stock_discharge(P[k % Draws], dt), empty, lambda r: r == 0)
+        out[f"BatteryStock.get_SOC[{n}bat]"] = (lambda k, s=stock: s.get_SOC(), setter, lambda r: 0 < r)
+        out[f"BatteryStock.get_SOC[{n}bat,max]"] = (lambda k, s=stock: s.get_SOC('max'), setter, lambda r: r == first.SOCmax)
+        out[f"BatteryStock.get_Pmax[{n}bat,ch]"] = (lambda k, s=stock: s.get_Pmax(dt, 'ch'), setter, lambda r: 0 < r)
+        out[f"BatteryStock.get_Pmax[{n}bat,dis]"] = (lambda k, s=stock: s.get_Pmax(dt, 'dis'), setter, lambda r: 0 < r)
+        steps = rng.integers(0, YearSteps, Draws).tolist()
+        day_ahead = [i - i % 96 + 40 for i in steps] # 10:00, 2 hours before the cut-off of the day
+        out[f"BatteryStock.charge_cost[{n}bat]"] = (lambda k, s=stock: s.charge_cost(grid_on, steps[k % Draws], dt), setter, lambda r: r == grid_on.prices.iloc[2, 1])
+        out[f"BatteryStock.charge_cost[{n}bat,full]"] = (lambda k, s=stock: s.charge_cost(grid_on, steps[k % Draws], dt), full, lambda r: r == 0)
+        out[f"BatteryStock.charge_cost[{n}bat,forecast 24h]"] = (lambda k, s=stock: s.charge_cost(grid_1, day_ahead[k % Draws], dt, True, True, 24), setter, lambda r: r == 10e10)
+        out[f"BatteryStock.charge_cost[{n}bat,inactive]"] = (lambda k, s=stock: s.charge_cost(grid_1, steps[k % Draws], dt, False), setter, lambda r: r == 0)
+        out[f"BatteryStock.discharge_cost[{n}bat]"] = (lambda k, s=stock: s.discharge_cost(grid_1, P[k % Draws] / 10, dt, True), setter, lambda r: r < 10e10)
+        out[f"BatteryStock.discharge_cost[{n}bat,over Pmax]"] = (lambda k, s=stock: s.discharge_cost(grid_1, 2 * BattParams['Pmax_disch'], dt, True), setter, lambda r: r == 10e10)
+        out[f"BatteryStock.discharge_cost[{n}bat,inactive]"] = (lambda k, s=stock: s.discharge_cost(grid_1, P[k % Draws], dt, False), setter, lambda r: r == np.inf)
+
+    # DieselGenerator
+    DG_1 = _diesel()
+    def fuel_setter(rate):
+        def reset(k):
+            DG_1.FuelRate = rate
+        return reset
+    nominal = rng.uniform(DG_1.Pmin, DG_1.Pmax, Draws).tolist()
+    low = rng.uniform(0, DG_1.Pmin, Draws).tolist()
+    low_fuel = DG_1.f_r_min + (DG_1.A * DG_1.Pmin + DG_1.B) * dt / DG_1.TankCapacity / 2 # half the fuel needed by one time step at Pmin
+    out["DieselGenerator.run_DG"] = (lambda k: DG_1.run_DG(nominal[k % Draws], dt), fuel_setter(1), lambda r: DG_1.Pmin <= r[1] <= DG_1.Pmax)
+    out["DieselGenerator.run_DG[Pmin]"] = (lambda k: DG_1.run_DG(low[k % Draws], dt), fuel_setter(1), lambda r: r[1] == DG_1.Pmin)
+    out["DieselGenerator.run_DG[Pmax]"] = (lambda k: DG_1.run_DG(2 * DG_1.Pmax, dt), fuel_setter(1), lambda r: r[1] == DG_1.Pnom)
+    out["DieselGenerator.run_DG[low fuel]"] = (lambda k: DG_1.run_DG(nominal[k % Draws], dt), fuel_setter(low_fuel), lambda r: r == (0, 0))
+    out["DieselGenerator.run_DG[empty tank]"] = (lambda k: DG_1.run_DG(nominal[k % Draws], dt), fuel_setter(DG_1.f_r_min), lambda r: r == (0, 0))
+    out["DieselGenerator.run_DG[inactive]"] = (lambda k: DG_1.run_DG(nominal[k % Draws], dt, False), None, lambda r: r == (0, 0))
+    runs = [DG_1.run_DG(p, dt) for p in nominal]
+    def runtime_setter(runtime):
+        def reset(k):
+            DG_1.FuelRate, DG_1.cur_runtime = 1, runtime
+        return reset
+    out["DieselGenerator.use_cost"] = (lambda k: DG_1.use_cost(runs[k % Draws][0], nominal[k % Draws] * 0.9, runs[k % Draws][1]), runtime_setter(0), lambda r: 0 < r < 10e10)
+    out["DieselGenerator.use_cost[minimum runtime]"] = (lambda k: DG_1.use_cost(runs[k % Draws][0], nominal[k % Draws] * 0.9, runs[k % Draws][1]),
+                                                        runtime_setter(DG_1.MinimumRuntime / 2), lambda r: r == 0)
+    out["DieselGenerator.use_cost[empty tank]"] = (lambda k: DG_1.use_cost(0, nominal[k % Draws], 0), fuel_setter(DG_1.f_r_min), lambda r: r == 10e10)
+    out["DieselGenerator.use_cost[inactive]"] = (lambda k: DG_1.use_cost(runs[k % Draws][0], nominal[k % Draws], runs[k % Draws][1], False), None, lambda r: r == np.inf)
+
+    # Grid
+    state = grid_1.state
+    on = rng.choice(np.flatnonzero(state == 1), Draws).tolist()
+    off = rng.choice(np.flatnonzero(state == 0), Draws).tolist()
+    out["Grid.sale_cost"] = (lambda k: grid_1.sale_cost(TimeArray, on[k % Draws]), None, lambda r: 0 < r)
+    out["Grid.sale_cost[cut-off]"] = (lambda k: grid_1.sale_cost(TimeArray, off[k % Draws]), None, lambda r: r == 0)
+    out["Grid.purchase_cost"] = (lambda k: grid_1.purchase_cost(TimeArray, on[k % Draws]), None, lambda r: 0 < r < np.inf)
+    out["Grid.purchase_cost[cut-off]"] = (lambda k: grid_1.purchase_cost(TimeArray, off[k % Draws]), None, lambda r: r == np.inf)
+    return out
+
+def _loop(call, reset, calls: int) -> float:
+    """duration of *calls* calls (state restored before each one)"""
+    if reset is None:
+        t0 = time.perf_counter()
+        for k in range(calls):
+            call(k)
+        return time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for k in range(calls):
+        reset(k)
+        call(k)
+    return time.perf_counter() - t0
+
+def measure(name: str, call, reset, expect, min_time: float = 0.2, repeat: int = 3) -> dict:
+    """times one micro-benchmark
+
+    Args:
+        name (str): name of the case
+        call, reset, expect: see cases()
+        min_time (float, optional): minimum duration of one repetition in seconds (the number of calls is doubled until it is reached). Defaults to 0.2.
+        repeat (int, optional): number of repetitions, the fastest one is kept. Defaults to 3.
+
+    Returns:
+        dict: name, calls per repetition, time per call in ns (best and of every repetition, restoration of the state excluded)
+    """
+    if reset is not None:
+        reset(0)
+    assert expect(call(0)), f"!!! {name} doesn't go through the expected branch !!!"
+    calls = 1
+    while _loop(call, reset, calls) < min_time:
+        calls *= 2
+    ns = []
+    for _ in range(repeat):
+        overhead = 0 if reset is None else _loop(lambda k: None, reset, calls)
+        ns.append(max(_loop(call, reset, calls) - overhead, 0) / calls * 1e9)
+    return {"name": name, "calls": calls, "ns_per_call": min(ns), "ns": ns}
+
+def run(filters: list[str] = None, min_time: float = 0.2, repeat: int = 3, verbose: bool = True) -> list[dict]:
+    """runs every micro-benchmark whose name contains one of the filters (all of them if filters is empty)"""
+    results = []
+    for name, (call, reset, expect) in cases().items():
+        if filters and not any(f in name for f in filters):
+            continue
+        results.append(measure(name, call, reset, expect, min_time, repeat))
+        if verbose:
+            print(f"{name:60} {round(results[-1]['ns_per_call']):>10} ns/call")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the device methods (time per call).")
+    parser.add_argument("--filter", nargs='+', help="runs the cases whose name contains one of these texts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum duration of one repetition (s)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per case, the fastest one is kept")
+    parser.add_argument("--json", help="saves the results in this file")
+    args = parser.parse_args()
+    results = run(args.filter, args.min_time, args.repeat)
+    if args.json:
+        with open(args.json, 'w', encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+        print("results saved at", args.json)
+# %%
@@ -0,0 +1,205 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 09:02:14
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Benchmark suite of the dispatching strategies : throughput (time steps per second) and peak memory of every case.
+Cases combine a strategy (LFE/CCE x both priorities, CostStrat), a horizon (1 day to 10 years), a sampling period (1 to 60 minutes),
+a fleet size (1 to 1000 batteries) and a forecast window (off, 1 hour to 7 days). Inputs are deterministic synthetic series (create_input.py, fixed seed).
+Every case runs in a fresh process, so that its peak memory is its own.
+:How to use:
+python benchmarks//bench_dispatch.py                                   (quick suite : one axis varied at a time around a 7-day, 15-minute CostStrat case)
+python benchmarks//bench_dispatch.py --suite full                      (every combination : several hours)
+python benchmarks//bench_dispatch.py --strategies LF-SelSu CostStrt --horizons 30D 1Y --batteries 1 100
+python benchmarks//bench_dispatch.py --target 5000 --json output//bench.json   (exit code 1 if a case runs slower than 5000 steps/s)
+'''
+#---------------------
+# %%
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+try:
+    import resource # peak memory of the process (not available on Windows)
+except ImportError:
+    resource = None
+
+from create_input import generate_input
+from virtualPMS import Battery, BatteryStock, DieselGenerator, Grid
+from virtualPMS import DispatchingStrats as DS
+
+# --- axes of the suite ---
+Strategies = {"LF-SelSu": ("lfe", "Self Sufficiency"), "LF-EmSys": ("lfe", "Emergency System"),
+              "CC-SelSu": ("cce", "Self Sufficiency"), "CC-EmSys": ("cce", "Emergency System"), "CostStrt": ("coststrat", None)}
+Horizons = {"1D": 1, "7D": 7, "30D": 30, "1Y": 365, "10Y": 3650} # days
+Sampling = [1, 5, 15, 60]                                         # minutes
+Fleets = [1, 10, 100, 1000]                                       # number of batteries
+Forecasts = [0, 1, 24, 168]                                       # hours, 0 = forecast off
+BaseCase = {"strategy": "CostStrt", "horizon": "7D", "dt_min": 15, "batteries": 1, "forecast_h": 0}
+
+# --- devices : values of the bundled input/inpParam.xlsx. The stock capacity and power are shared between the batteries ---
+BattParams = {'capacity': 3181, 'SOC': 0.5, 'SOCmin': 0.1, 'SOCmax': 1, 'eta': 0.98, 'Pmax_ch': 306.6, 'Pmax_disch': 253.1,
+              'lifetime': 500000, 'ReplacementCost': 10000, 'MaintenanceCost': 0.03}
+DieselParams = {"Pmax": 300, "Pnom": 250, "Pmin": 100, "TankCapacity": 2000, "FuelRate": 1, "f_r_min": 0.1, "FuelPrice": 1.5,
+                "lifetime": 200000, "ReplacementCost": 10000, "MaintenanceCost": 0.08, "MinimumRuntime": 20}
+ActiveDevices = {"Grid": True, "Batteries": True, "DieselGenerator": True}
+SOClim = 0.7
+ChargeUsingGridCost = 0.054 # off-peak buying price
+
+def case_name(case: dict) -> str:
+    return f"{case['strategy']}_{case['horizon']}_{case['dt_min']}min_{case['batteries']}bat_F{case['forecast_h']}h"
+
+def case_input(case: dict) -> pd.DataFrame:
+    """deterministic synthetic input of a case (same case, same series)"""
+    return generate_input('synthetic', '2025-01-01', Horizons[case["horizon"]], case["dt_min"] / 60, seed=0, outages_per_day=0.2)
+
+def case_devices(case: dict, dfIN: pd.DataFrame) -> tuple[Grid, BatteryStock, DieselGenerator]:
+    """new devices of a case (the dispatch changes their state).
+    NB : the grid tables are the reference ones of virtualPMS//DataBase (month in the first column, as in the test section of Grid.py)."""
+    n = case["batteries"]
+    BattStock = BatteryStock([Battery({**BattParams, 'capacity': BattParams['capacity'] / n, 'Pmax_ch': BattParams['Pmax_ch'] / n,
+                                       'Pmax_disch': BattParams['Pmax_disch'] / n}) for _ in range(n)])
+    DG_1 = DieselGenerator(dict(DieselParams))
+    DG_1.find_DG_coeffs()
+    grid_1 = Grid(dfIN["Grid State"].to_numpy(), pd.read_csv(Grid.GridPricesRef).set_index('Id'), pd.read_csv(Grid.GridScheduleRef))
+    return grid_1, BattStock, DG_1
+
+def dispatch(case: dict, dfIN: pd.DataFrame, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator) -> tuple[pd.DataFrame, dict]:
+    """runs the strategy of a case, as main.py does"""
+    strat, priority = Strategies[case["strategy"]]
+    dt = case["dt_min"] / 60
+    forecast, ForecastPeriod = case["forecast_h"] > 0, case["forecast_h"] if case["forecast_h"] > 0 else 24
+    if strat == "coststrat":
+        return DS.CostStrat(dfIN, ActiveDevices, grid_1, BattStock, DG_1, dt, ChargeUsingGridCost, forecast, ForecastPeriod)
+    if priority == 'Self Sufficiency':
+        return DS.LFE_CCE_self_sufficiency(strat, dfIN, ActiveDevices, grid_1, BattStock, DG_1, dt, SOClim, forecast, ForecastPeriod)
+    return DS.LFE_CCE_emergency_system(strat, dfIN, ActiveDevices, grid_1, BattStock, DG_1, dt, SOClim, forecast, ForecastPeriod)
+
+def peak_rss_mb() -> float:
+    """peak resident memory of the current process in MB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, kB on Linux
+
+def measure(case: dict, repeat: int = 1) -> dict:
+    """runs one case *repeat* times (new devices every time) and measures it
+
+    Args:
+        case (dict): strategy, horizon, dt_min, batteries, forecast_h (see BaseCase)
+        repeat (int, optional): number of runs. Defaults to 1.
+
+    Returns:
+        dict: the case, its number of time steps, the duration of every run (s), steps/s of the fastest run, peak memory before and after the runs (MB)
+    """
+    dfIN = case_input(case)
+    input_rss = peak_rss_mb()
+    seconds = []
+    for _ in range(repeat):
+        devices = case_devices(case, dfIN)
+        t0 = time.perf_counter()
+        dispatch(case, dfIN, *devices)
+        seconds.append(time.perf_counter() - t0)
+    return {"name": case_name(case), **case, "steps": len(dfIN), "seconds": seconds, "steps_per_s": len(dfIN) / min(seconds),
+            "input_rss_mb": input_rss, "peak_rss_mb": peak_rss_mb()}
+
+def suite(name: str = 'quick', **axes) -> list[dict]:
+    """cases of a suite
+
+    Args:
+        name (str, optional): 'quick' (BaseCase and one axis varied at a time, a few minutes) or 'full' (every combination of the axes). Defaults to 'quick'.
+        **axes: strategies, horizons, dt_min, batteries, forecast_h : lists restricting the axes. If one is given, the cases are every combination
+                of the given axes, the other ones being those of BaseCase ('quick') or every value ('full').
+
+    Returns:
+        list[dict]: the cases
+    """
+    assert(name in ['quick', 'full'])
+    keys = {"strategies": "strategy", "horizons": "horizon", "dt_min": "dt_min", "batteries": "batteries", "forecast_h": "forecast_h"}
+    every = {"strategy": list(Strategies), "horizon": list(Horizons), "dt_min": Sampling, "batteries": Fleets, "forecast_h": Forecasts}
+    given = {keys[axis]: values for axis, values in axes.items() if values}
+    if name == 'quick' and not given:
+        sweeps = {"strategy": list(Strategies), "horizon": ["1D", "7D", "30D", "1Y"], "dt_min": [1, 15, 60], "batteries": Fleets, "forecast_h": Forecasts}
+        cases = [dict(BaseCase, **{axis: value}) for axis, values in sweeps.items() for value in values]
+    else:
+        values = {axis: given.get(axis, every[axis] if name == 'full' else [BaseCase[axis]]) for axis in BaseCase}
+        cases = [dict(zip(values.keys(), combination)) for combination in itertools.product(*values.values())]
+    unique = {case_name(case): case for case in cases}
+    for case in unique.values():
+        assert(case["strategy"] in Strategies and case["horizon"] in Horizons), f"!!! unknown case {case_name(case)} !!!"
+    return list(unique.values())
+
+def run_suite(cases: list[dict], repeat: int = 1, isolate: bool = True, verbose: bool = True) -> list[dict]:
+    """measures every case, each one in a new process (isolate=True) so that its peak memory doesn't include the previous cases
+
+    Args:
+        cases (list[dict]): output of suite()
+        repeat (int, optional): runs per case (the fastest one is kept). Defaults to 1.
+        isolate (bool, optional): one new process per case. Defaults to True.
+        verbose (bool, optional): prints every result. Defaults to True.
+
+    Returns:
+        list[dict]: results of measure()
+    """
+    results = []
+    for case in cases:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                result = pool.submit(measure, case, repeat).result()
+        else:
+            result = measure(case, repeat)
+        results.append(result)
+        if verbose:
+            peak = "n/a" if result["peak_rss_mb"] is None else round(result["peak_rss_mb"])
+            print(f"{result['name']:40} {result['steps']:>9} steps {round(min(result['seconds']), 3):>9} s {round(result['steps_per_s']):>9} steps/s {peak:>6} MB")
+    return results
+
+def environment() -> dict:
+    """versions and machine of a benchmark run"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "pandas": pd.__version__, "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count()}
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark suite of the dispatching strategies (steps/s and peak memory of every case).")
+    parser.add_argument("--suite", choices=['quick', 'full'], default='quick', help="quick : one axis varied at a time, full : every combination")
+    parser.add_argument("--strategies", nargs='+', choices=list(Strategies), help="strategies to run")
+    parser.add_argument("--horizons", nargs='+', choices=list(Horizons), help="simulated periods")
+    parser.add_argument("--dt", nargs='+', type=int, dest="dt_min", help="sampling periods in minutes")
+    parser.add_argument("--batteries", nargs='+', type=int, help="numbers of batteries of the stock")
+    parser.add_argument("--forecast", nargs='+', type=int, dest="forecast_h", help="forecast windows in hours (0 = forecast off)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest one is kept")
+    parser.add_argument("--inline", action='store_true', help="runs every case in this process (no isolation of the peak memory)")
+    parser.add_argument("--target", type=float, help="minimum steps/s : exit code 1 if a case is slower")
+    parser.add_argument("--json", help="saves the results in this file")
+    return parser
+
+if __name__ == "__main__":
+    args = _parser().parse_args()
+    cases = suite(args.suite, strategies=args.strategies, horizons=args.horizons, dt_min=args.dt_min, batteries=args.batteries, forecast_h=args.forecast_h)
+    print(f"{len(cases)} cases")
+    results = run_suite(cases, args.repeat, not args.inline)
+    if args.json:
+        with open(args.json, 'w', encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+        print("results saved at", args.json)
+    if args.target:
+        slow = [result["name"] for result in results if result["steps_per_s"] < args.target]
+        print(f"!!! {len(slow)} case(s) under {args.target} steps/s : {' '.join(slow)} !!!" if slow else f"every case reaches {args.target} steps/s")
+        sys.exit(1 if slow else 0)
+# %%
@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 16:31:44
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Import time of the package, and budget of it.
+A worker of a process pool that only dispatches imports the package in every new process : this import must stay cheap. Every target
+is imported in a new python process (python -X importtime), after numpy and pandas which every target needs : the time measured is the
+time of the package itself. Every target has a budget (seconds on top of numpy and pandas), and must not load the heavy optional
+modules (matplotlib, openpyxl, pyarrow...), which are imported on first use only (see TimeSeriesAnalysis._pyplot() and virtualPMS//__init__.py).
+The bytecode of the package is brought up to date first : compiling the modules is not part of the measure.
+:How to use:
+python benchmarks//bench_import.py               (time of every target, heaviest modules, exit code 1 if a budget is exceeded)
+python benchmarks//bench_import.py --repeat 9    (more runs per target, the median is kept)
+'''
+#---------------------
+# %%
+import os
+import sys
+import json
+import argparse
+import compileall
+import subprocess
+import numpy as np
+
+RepoDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# import statement -> budget in seconds, on top of numpy and pandas
+Targets = {"import virtualPMS": 0.05,
+           "import virtualPMS.DispatchingStrats": 0.1,
+           "import virtualPMS.Simulation": 0.3}
+# modules that a target must not load (imported on first use only)
+Forbidden = ["matplotlib", "openpyxl", "pyarrow", "scipy", "tkinter"]
+Preload = "import numpy, pandas"
+
+def import_time(statement: str, repeat: int = 5, top: int = 8) -> dict:
+    """imports a target in *repeat* new python processes
+
+    Args:
+        statement (str): import statement of the target
+        repeat (int, optional): number of processes, the median is kept. Defaults to 5.
+        top (int, optional): number of heaviest modules listed. Defaults to 8.
+
+    Returns:
+        dict: statement, seconds (median), samples, forbidden (heavy modules loaded), top (heaviest modules of the package : name, seconds)
+    """
+    code = f"{Preload}\nimport sys, json\nbefore = set(sys.modules)\n{statement}\nprint(json.dumps(sorted(set(sys.modules) - before)))"
+    samples, selves = [], {}
+    for _ in range(repeat):
+        run = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=RepoDir, capture_output=True, text=True)
+        assert run.returncode == 0, f"!!! {statement} failed :\n{run.stderr[-2000:]} !!!"
+        lines = [line.split("|") for line in run.stderr.splitlines() if line.startswith("import time:") and "cumulative" not in line]
+        # the preloaded modules come first : the target is the rest, its top-level imports are not indented
+        start = max(k for k, (_, _, name) in enumerate(lines) if name.strip() in ("numpy", "pandas")) + 1
+        samples.append(sum(int(cumulative) for _, cumulative, name in lines[start:] if not name.startswith("  ")) / 1e6)
+        for own, _, name in lines[start:]:
+            selves.setdefault(name.strip(), []).append(int(own.split(":")[1]) / 1e6)
+        loaded = json.loads(run.stdout.splitlines()[-1])
+    heaviest = sorted(((name, float(np.median(s))) for name, s in selves.items()), key=lambda x: -x[1])[:top]
+    return {"statement": statement, "seconds": float(np.median(samples)), "samples": samples,
+            "forbidden": sorted({name.split(".")[0] for name in loaded} & set(Forbidden)), "top": heaviest}
+
+def run(targets: dict = None, repeat: int = 5, verbose: bool = True) -> list[dict]:
+    """import time of every target (Targets by default) and check of its budget (key 'over' : True if exceeded)"""
+    results = []
+    # up-to-date bytecode of the package : the time of an import, not of compiling the modules again (stale .pyc files are not
+    # rewritten when PYTHONDONTWRITEBYTECODE is set, and a modified module would then be compiled in every process)
+    compileall.compile_dir(os.path.join(RepoDir, "virtualPMS"), quiet=1)
+    for statement, budget in (Targets if targets is None else targets).items():
+        result = import_time(statement, repeat)
+        result["budget"] = budget
+        result["over"] = result["seconds"] > budget or bool(result["forbidden"])
+        results.append(result)
+        if verbose:
+            print(f"{statement:40} {result['seconds']*1e3:8.1f} ms (budget {budget*1e3:.0f} ms)" +
+                  (f"  !!! loads {', '.join(result['forbidden'])} !!!" if result["forbidden"] else "") + ("  OVER BUDGET" if result["over"] else ""))
+            print("".join(f"    {name:50} {seconds*1e3:7.1f} ms\n" for name, seconds in result["top"]), end='')
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time of the package (on top of numpy and pandas) and check of its budget.")
+    parser.add_argument("--repeat", type=int, default=5, help="new processes per target, the median is kept")
+    parser.add_argument("--json", help="saves the results in this file")
+    args = parser.parse_args()
+    results = run(repeat=args.repeat)
+    if args.json:
+        with open(args.json, 'w', encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print("results saved at", args.json)
+    sys.exit(1 if any(result["over"] for result in results) else 0)
+# %%
@@ -4,102 +4,308 @@
 :Project: virtual PMS for microgrids
 :Version: 1.0
 :Author: Mathieu Lafitte
-:Description: Easily creates an input data file for main.py from known datasets
+:Description: Easily creates an input data file for main.py from known datasets or synthetic time series.
+:How to use:
+python create_input.py indus --src input//indus_22.csv --start 2016-01-01 --end 2016-03-01
+python create_input.py synthetic --days 3650 --dt 0.25 --outages 0.05 --out input//synth_10y.npz
+python create_input.py --help (for every option)
+python create_input.py --self-test
+The functions herein can also be imported (generate_input(), write_input()...) to create inputs within a script.
 '''
 #---------------------
 # %%
 import os
+import csv
+import argparse
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-
-cWD = os.path.dirname(os.path.realpath(__file__))
-# Choose your input data set among the following :
-# constant time series : 'constant' | sinus function : 'sinus' | French industrial site : 'indus'
-inp_data = 'indus'                                                              # change value
-
-assert(inp_data in ['constant','sinus', 'indus'])
-
-# --------------------------------------------------------------------------------------------
-# Constant time series
-# --------------------------------------------------------------------------------------------
-# constant arrays to check details
-if inp_data == 'constant':
-    dt = 0.25 # sampling period in hours
-    start_date = datetime(2025, 1, 1)                                           # change value
-    # lenght of the period you want to study, in days :
-    period = 15                                                                 # change value
-    num_steps = int((period * 24) / dt)
-    TimeArray = np.array([start_date + timedelta(hours=i * dt) for i in range(num_steps)])
-    end_date = TimeArray[-1]
-    P_green = np.array([100] * num_steps)     # non controlled power supply : solar panels, wind turbines... 
-    P_L = np.array([150] * num_steps)         # load demand
-
-# --------------------------------------------------------------------------------------------
-# Wavy (sinus) time series
-# --------------------------------------------------------------------------------------------
-# sinusoidal arrays to check details
-if inp_data == 'sinus':
-    dt = 0.25 # sampling period in hours
-    start_date = datetime(2025, 1, 1)                                           # change value
-    # lenght of the period you want to study, in days :
-    period = 15                                                                 # change value
-    num_steps = int((period * 24) / dt)
-    TimeArray = np.array([start_date + timedelta(hours=i * dt) for i in range(num_steps)])
-    end_date = TimeArray[-1]
-    x_axis = np.array([i / num_steps * 4 * np.pi for i in range(num_steps)])
-    P_green = 10 * np.sin(x_axis) + 100     # non controlled power supply : solar panels, wind turbines... 
-    P_L = 20 * np.cos(x_axis) + 100         # load demand
-
-# --------------------------------------------------------------------------------------------
-# Industrial data
-# --------------------------------------------------------------------------------------------
-# data comes from french industries forecasting PV and Load : https://zenodo.org/records/5510400#.YUizGls69hE
-# !! check input before running, sometimes data is missing and dates not in the good order
-elif inp_data == 'indus':
-    df = pd.read_csv(os.path.join(cWD,'input','indus_22.csv'), sep=None, engine='python')           # change value
-    TimeArray = pd.to_datetime(df['timestamp'].to_numpy())
-    TimeArray = TimeArray.tz_localize(None)
-    dt = (TimeArray[1] - TimeArray[0]).total_seconds() / 3600 # duration of a time step in hours ; every time step should be the same lenght
-    P_L = df['actual_consumption'].to_numpy()
-    P_green = df['actual_pv'].to_numpy()
-
-    # you can select the period you want to study giving the date bounds, but make sure that there is no missing data in between !
-    start_date = pd.to_datetime('2016-01-01 00:00:00')                           # change value
-    end_date = pd.to_datetime('2016-03-01 00:00:00')                             # change value
-    start_idx = TimeArray.get_loc(start_date)
-    end_idx = TimeArray.get_loc(end_date)
-    
-    TimeArray = TimeArray[start_idx : end_idx]
-    P_L = P_L[start_idx : end_idx]
-    P_green = P_green[start_idx : end_idx]
-
-    num_steps = min(len(TimeArray),len(P_L),len(P_green))
-    # plt.plot(TimeArray) # to check if some dates are missing
-    # plt.show()
-
-# grid reliable (=1) or not (=0) at any given time step
-GridState = np.array([1] * (num_steps - num_steps//2) + [0] * (num_steps//2), dtype=np.int64) # change value
-
-assert(len(TimeArray) == len(P_L) == len(P_green) == len(GridState))
-print("dt =",dt,"h")
-# print(np.shape(TimeArray),TimeArray[:10],"\n",np.shape(P_L),P_L[:10],"\n",np.shape(P_green),P_green[:10])
-
-# prepare the time array
+
 TimeFormat = "%Y-%m-%d %H:%M:%S" # do not change
-TimeArray = np.array([date_i.strftime(TimeFormat) for date_i in TimeArray])
-
-# add unit line
-TimeArray = np.concatenate(([TimeFormat], TimeArray))
-P_L = np.concatenate((["kW"], P_L))
-P_green = np.concatenate((["kW"], P_green))
-GridState = np.concatenate((["binary (optional)"], GridState))
-
-# csv generation
-dict_TS = {"Time":TimeArray,"Load":P_L, "Green Prod":P_green, "Grid State": GridState}
-df_TS = pd.DataFrame(dict_TS)
-df_TS.set_index("Time")
-filepath = os.path.join(cWD,"input",f"{inp_data}_{str(start_date).split(" ")[0]}_{str(end_date).split(" ")[0]}.csv")
-df_TS.to_csv(filepath, index=False)
-print("file saved at ",filepath)
+
+def stream_indus_csv(src_path: str, dst_path: str, start_date: str, end_date: str, time_col: str = 'timestamp', load_col: str = 'actual_consumption',
+                     green_col: str = 'actual_pv', grid_state: int = 1, chunksize: int = 500_000, assume_sorted: bool = False) -> tuple[int, float]:
+    """Streams a (very) large raw dataset into the input time series format, in constant memory.
+    The delimiter is sniffed once on the head of the file, then the file is read by chunks with the C engine of pandas.
+    Every chunk is filtered on [start_date, end_date[ and appended to dst_path right away.
+
+    Args:
+        src_path (str): path of the raw csv file (e.g. a Zenodo industrial dataset)
+        dst_path (str): path of the generated input file (same format as the "Green&LoadTimeSeries" sheet of inpParam.xlsx)
+        start_date (str): first date of the selected window (included), e.g. '2016-01-01 00:00:00'
+        end_date (str): last date of the selected window (excluded)
+        time_col (str, optional): name of the time column in the raw file. Defaults to 'timestamp'.
+        load_col (str, optional): name of the load column in the raw file. Defaults to 'actual_consumption'.
+        green_col (str, optional): name of the renewable production column in the raw file. Defaults to 'actual_pv'.
+        grid_state (int, optional): grid state written for every time step (1 = reliable, 0 = cut-off). Defaults to 1.
+        chunksize (int, optional): number of rows read at once. Defaults to 500_000.
+        assume_sorted (bool, optional): if True, reading stops at the first chunk starting after end_date. Defaults to False.
+
+    Returns:
+        tuple[int, float]: number of time steps written, duration of a time step in hours (nan if less than 2 time steps)
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+
+    # sniff the delimiter once, on the head of the file only
+    with open(src_path, 'r', newline='') as f:
+        sep = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=",;\t|").delimiter
+
+    # header and unit line
+    pd.DataFrame({"Time":[TimeFormat],"Load":["kW"], "Green Prod":["kW"], "Grid State": ["binary (optional)"]}).to_csv(dst_path, index=False)
+
+    num_steps = 0
+    first_times = []
+    reader = pd.read_csv(src_path, sep=sep, engine='c', usecols=[time_col, load_col, green_col], chunksize=chunksize)
+    for chunk in reader:
+        TimeChunk = pd.to_datetime(chunk[time_col])
+        if TimeChunk.dt.tz is not None:
+            TimeChunk = TimeChunk.dt.tz_localize(None)
+        if assume_sorted and len(TimeChunk) > 0 and TimeChunk.iloc[0] >= end_date:
+            break
+        mask = ((TimeChunk >= start_date) & (TimeChunk < end_date)).to_numpy()
+        if not mask.any():
+            continue
+        dfChunk = pd.DataFrame({"Time":TimeChunk[mask].to_numpy(), "Load":chunk[load_col].to_numpy()[mask],
+                                "Green Prod":chunk[green_col].to_numpy()[mask], "Grid State":grid_state})
+        dfChunk.to_csv(dst_path, mode='a', header=False, index=False, date_format=TimeFormat)
+        if len(first_times) < 2:
+            first_times.extend(dfChunk["Time"].iloc[:2 - len(first_times)])
+        num_steps += len(dfChunk)
+
+    dt = (first_times[1] - first_times[0]).total_seconds() / 3600 if len(first_times) == 2 else np.nan
+    return num_steps, dt
+
+def time_array(start_date: str, period: float, dt: float) -> np.ndarray:
+    """regular time array built with datetime64 arithmetic (no python loop).
+
+    Args:
+        start_date (str): first date, e.g. '2025-01-01 00:00:00'
+        period (float): lenght of the period you want to study, in days
+        dt (float): sampling period in hours
+
+    Returns:
+        np.ndarray: datetime64[ns] array of int(period * 24 / dt) dates
+    """
+    num_steps = int(round(period * 24 / dt))
+    return np.datetime64(pd.Timestamp(start_date), 'ns') + np.arange(num_steps) * np.timedelta64(int(round(dt * 3600e9)), 'ns')
+
+def _hour_and_day(TimeArray: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """hour of the day (float, 0 to 24) and day of the year (int, 0 to 365) of every date"""
+    days = TimeArray.astype('datetime64[D]')
+    hour = (TimeArray - days) / np.timedelta64(1, 'h')
+    doy = (days - TimeArray.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64)
+    return hour, doy
+
+def synthetic_load(TimeArray: np.ndarray, mean: float = 100, daily: float = 0.3, seasonal: float = 0.15, noise: float = 0.05, rng: np.random.Generator = None) -> np.ndarray:
+    """load demand with a morning and an evening peak, a winter peak and a multiplicative gaussian noise.
+
+    Args:
+        TimeArray (np.ndarray): datetime64 array
+        mean (float, optional): average load in kW. Defaults to 100.
+        daily (float, optional): relative amplitude of the daily shape. Defaults to 0.3.
+        seasonal (float, optional): relative amplitude of the seasonal shape (maximum in winter). Defaults to 0.15.
+        noise (float, optional): relative standard deviation of the noise. Defaults to 0.05.
+        rng (np.random.Generator, optional): random generator (for reproducible series). Defaults to None.
+
+    Returns:
+        np.ndarray: load demand in kW (>=0)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    hour, doy = _hour_and_day(TimeArray)
+    shape_day = np.exp(-(hour - 8)**2 / 4) + 1.3 * np.exp(-(hour - 19)**2 / 6) - 0.5 # morning and evening peaks, centered on 0
+    shape_year = np.cos(2 * np.pi * doy / 365)                                     # maximum on january 1st
+    P_L = mean * (1 + daily * shape_day + seasonal * shape_year) * (1 + noise * rng.standard_normal(len(TimeArray)))
+    return np.maximum(P_L, 0)
+
+def synthetic_pv(TimeArray: np.ndarray, peak: float = 100, seasonal: float = 0.3, clouds: float = 0.3, rng: np.random.Generator = None) -> np.ndarray:
+    """photovoltaic production : bell shape between sunrise and sunset, longer days in summer, random cloudy days.
+
+    Args:
+        TimeArray (np.ndarray): datetime64 array
+        peak (float, optional): peak power in kW (clear sky, summer solstice). Defaults to 100.
+        seasonal (float, optional): relative amplitude of the seasonal variation of the peak and of the day lenght. Defaults to 0.3.
+        clouds (float, optional): 0 for a clear sky every day, 1 for days that can be fully cloudy. Defaults to 0.3.
+        rng (np.random.Generator, optional): random generator (for reproducible series). Defaults to None.
+
+    Returns:
+        np.ndarray: green power production in kW (>=0)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    hour, doy = _hour_and_day(TimeArray)
+    summer = np.cos(2 * np.pi * (doy - 172) / 365)                                 # 1 at summer solstice, -1 at winter solstice
+    day_lenght = 12 * (1 + seasonal * summer)
+    sun = np.clip(np.sin(np.pi * (hour - 12 + day_lenght / 2) / day_lenght), 0, None)**1.5
+    day_index = (TimeArray.astype('datetime64[D]') - TimeArray[0].astype('datetime64[D]')).astype(np.int64)
+    sky = 1 - clouds * rng.random(day_index[-1] + 1)                               # one cloud cover per day
+    return peak * (1 + seasonal * summer) / (1 + seasonal) * sun * sky[day_index]
+
+def synthetic_grid_state(TimeArray: np.ndarray, outages_per_day: float = 0, mean_outage: float = 2, rng: np.random.Generator = None) -> np.ndarray:
+    """grid reliable (=1) or not (=0) at any given time step. Outages start at random (Poisson process) and last a random duration (exponential law).
+
+    Args:
+        TimeArray (np.ndarray): datetime64 array (regular)
+        outages_per_day (float, optional): average number of grid cut-offs per day. Defaults to 0.
+        mean_outage (float, optional): average duration of a cut-off, in hours. Defaults to 2.
+        rng (np.random.Generator, optional): random generator (for reproducible series). Defaults to None.
+
+    Returns:
+        np.ndarray: grid state (int64, 0 or 1)
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    num_steps = len(TimeArray)
+    dt = (TimeArray[1] - TimeArray[0]) / np.timedelta64(1, 'h') if num_steps > 1 else 1
+    nb_outages = rng.poisson(outages_per_day * num_steps * dt / 24)
+    starts = rng.integers(0, num_steps, nb_outages)
+    ends = np.minimum(starts + np.maximum(1, np.round(rng.exponential(mean_outage / dt, nb_outages))).astype(np.int64), num_steps)
+    cut_offs = np.zeros(num_steps + 1, dtype=np.int64) # +1 at the beginning of every outage, -1 at its end
+    np.add.at(cut_offs, starts, 1)
+    np.add.at(cut_offs, ends, -1)
+    return (np.cumsum(cut_offs[:-1]) == 0).astype(np.int64)
+
+def generate_input(inp_data: str, start_date: str = '2025-01-01', period: float = 15, dt: float = 0.25, seed: int = None,
+                   load_mean: float = 100, pv_peak: float = 100, noise: float = 0.05, clouds: float = 0.3,
+                   outages_per_day: float = 0, mean_outage: float = 2) -> pd.DataFrame:
+    """creates the input time series (load, green production and grid state) of a whole period at once.
+
+    Args:
+        inp_data (str): constant time series : 'constant' | sinus function : 'sinus' | daily and seasonal shapes with noise and outages : 'synthetic'
+        start_date (str, optional): first date. Defaults to '2025-01-01'.
+        period (float, optional): lenght of the period you want to study, in days. Defaults to 15.
+        dt (float, optional): sampling period in hours. Defaults to 0.25.
+        seed (int, optional): seed of the random generator ('synthetic' only), None for a different series at every call. Defaults to None.
+        load_mean (float, optional): average load in kW ('synthetic' only). Defaults to 100.
+        pv_peak (float, optional): peak of green power production in kW ('synthetic' only). Defaults to 100.
+        noise (float, optional): relative standard deviation of the load noise ('synthetic' only). Defaults to 0.05.
+        clouds (float, optional): cloud cover variability, 0 to 1 ('synthetic' only). Defaults to 0.3.
+        outages_per_day (float, optional): average number of grid cut-offs per day ('synthetic' only). Defaults to 0.
+        mean_outage (float, optional): average duration of a grid cut-off in hours ('synthetic' only). Defaults to 2.
+
+    Returns:
+        pd.DataFrame: "Time" (datetime64), "Load" (kW), "Green Prod" (kW), "Grid State" (binary)
+    """
+    assert(inp_data in ['constant', 'sinus', 'synthetic'])
+    TimeArray = time_array(start_date, period, dt)
+    num_steps = len(TimeArray)
+    if inp_data == 'constant':    # constant arrays to check details
+        P_green = np.full(num_steps, 100)     # non controlled power supply : solar panels, wind turbines...
+        P_L = np.full(num_steps, 150)         # load demand
+    elif inp_data == 'sinus':     # sinusoidal arrays to check details
+        x_axis = np.arange(num_steps) / num_steps * 4 * np.pi
+        P_green = 10 * np.sin(x_axis) + 100
+        P_L = 20 * np.cos(x_axis) + 100
+    if inp_data in ['constant', 'sinus']:
+        GridState = np.array([1] * (num_steps - num_steps//2) + [0] * (num_steps//2), dtype=np.int64)
+    else:
+        rng = np.random.default_rng(seed)
+        P_L = synthetic_load(TimeArray, load_mean, noise=noise, rng=rng)
+        P_green = synthetic_pv(TimeArray, pv_peak, clouds=clouds, rng=rng)
+        GridState = synthetic_grid_state(TimeArray, outages_per_day, mean_outage, rng=rng)
+    return pd.DataFrame({"Time": TimeArray, "Load": P_L, "Green Prod": P_green, "Grid State": GridState})
+
+def write_input(dfTS: pd.DataFrame, filepath: str):
+    """saves input time series at the format expected by main.py (see the "TimeSeriesFile" parameter of the "main" sheet of inpParam.xlsx).
+
+    Args:
+        dfTS (pd.DataFrame): "Time", "Load", "Green Prod", "Grid State" columns (see generate_input())
+        filepath (str): '.csv' (same format as the "Green&LoadTimeSeries" sheet, with a unit line, can be copied into inpParam.xlsx)
+                        or '.npz' (binary numpy arrays : much faster to write and to read, recommended for long time series)
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    assert(ext in ['.csv', '.npz'])
+    if ext == '.npz':
+        np.savez(filepath, **{col: dfTS[col].to_numpy() for col in ["Time", "Load", "Green Prod", "Grid State"]})
+    else:
+        pd.DataFrame({"Time":[TimeFormat],"Load":["kW"], "Green Prod":["kW"], "Grid State": ["binary (optional)"]}).to_csv(filepath, index=False)
+        dfTS.to_csv(filepath, mode='a', header=False, index=False, date_format=TimeFormat)
+
+def _self_test():
+    """checks of the functions of this file (python create_input.py --self-test), on temporary files only"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # stream_indus_csv() : sniffed delimiter, window across chunk boundaries, same rows as reading the whole file
+        src_path, dst_path = os.path.join(tmpdir, "raw.csv"), os.path.join(tmpdir, "indus.csv")
+        Time = pd.date_range('2016-01-01', periods=100, freq='15min')
+        rng = np.random.default_rng(0)
+        dfRaw = pd.DataFrame({"id": np.arange(100), "timestamp": Time.strftime(TimeFormat), "actual_consumption": rng.random(100) * 100,
+                              "actual_pv": rng.random(100) * 50})
+        dfRaw.to_csv(src_path, sep=';', index=False)
+        TimeRaw = pd.to_datetime(pd.read_csv(src_path, sep=';')["timestamp"])
+        for start_date, end_date in [('2016-01-01 01:40', '2016-01-01 19:00'), ('2016-01-01 00:00', '2016-01-02 01:00')]:
+            window = ((TimeRaw >= start_date) & (TimeRaw < end_date)).to_numpy()
+            for assume_sorted in [False, True]:
+                num_steps, dt = stream_indus_csv(src_path, dst_path, start_date, end_date, chunksize=7, assume_sorted=assume_sorted)
+                dfOut = pd.read_csv(dst_path, skiprows=[1])
+                assert(num_steps == window.sum() == len(dfOut) and dt == 0.25)
+                assert(np.array_equal(pd.to_datetime(dfOut["Time"]).to_numpy(), TimeRaw[window].to_numpy()))
+                assert(np.allclose(dfOut["Load"], dfRaw["actual_consumption"][window]) and np.allclose(dfOut["Green Prod"], dfRaw["actual_pv"][window]))
+                assert((dfOut["Grid State"] == 1).all())
+        num_steps, dt = stream_indus_csv(src_path, dst_path, '2017-01-01', '2017-02-01', chunksize=7)      # empty window : header and units only
+        assert(num_steps == 0 and np.isnan(dt) and len(pd.read_csv(dst_path)) == 1)
+
+        # generate_input() : reproducible with a seed, number of steps and sampling period of the request
+        dfSynth = generate_input('synthetic', '2024-02-27', period=3, dt=0.25, seed=1, outages_per_day=2)
+        pd.testing.assert_frame_equal(dfSynth, generate_input('synthetic', '2024-02-27', period=3, dt=0.25, seed=1, outages_per_day=2))
+        assert(not dfSynth["Load"].equals(generate_input('synthetic', '2024-02-27', period=3, dt=0.25, seed=2)["Load"]))
+        for inp_data in ['constant', 'sinus', 'synthetic']:
+            dfTS = generate_input(inp_data, '2024-02-27', period=3, dt=0.25, seed=1)
+            assert(len(dfTS) == 288 and (np.diff(dfTS["Time"].to_numpy()) == np.timedelta64(15, 'm')).all())
+        assert((dfSynth[["Load", "Green Prod"]] >= 0).all().all() and set(dfSynth["Grid State"]) == {0, 1})
+
+        # write_input() : read back by main.py (inpReading.read_time_series()) as the same time series
+        from virtualPMS import inpReading
+        for ext in ['.csv', '.npz']:
+            write_input(dfSynth, os.path.join(tmpdir, "synth" + ext))
+            dfRead = inpReading.read_time_series(os.path.join(tmpdir, "synth" + ext))
+            dfRead["Time"] = pd.to_datetime(dfRead["Time"], format=TimeFormat if ext == '.csv' else None)
+            pd.testing.assert_frame_equal(dfRead, dfSynth, check_exact=False, rtol=1e-12)
+    print("create_input.py : self-test ok")
+
+if __name__ == "__main__":
+    cWD = os.path.dirname(os.path.realpath(__file__))
+    parser = argparse.ArgumentParser(description="creates an input time series file for main.py")
+    # constant time series : 'constant' | sinus function : 'sinus' | synthetic load and PV : 'synthetic' | French industrial site : 'indus'
+    parser.add_argument("inp_data", nargs='?', default='indus', choices=['constant', 'sinus', 'synthetic', 'indus'], help="input data set")
+    parser.add_argument("--start", default=None, help="first date (default : 2025-01-01, or 2016-01-01 for 'indus')")
+    parser.add_argument("--end", default='2016-03-01', help="last date, excluded ('indus' only)")
+    parser.add_argument("--days", type=float, default=15, help="lenght of the period you want to study, in days")
+    parser.add_argument("--dt", type=float, default=0.25, help="sampling period in hours")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random generator ('synthetic' only)")
+    parser.add_argument("--load", type=float, default=100, help="average load in kW ('synthetic' only)")
+    parser.add_argument("--pv", type=float, default=100, help="peak green power in kW ('synthetic' only)")
+    parser.add_argument("--noise", type=float, default=0.05, help="relative noise of the load ('synthetic' only)")
+    parser.add_argument("--clouds", type=float, default=0.3, help="cloud cover variability, 0 to 1 ('synthetic' only)")
+    parser.add_argument("--outages", type=float, default=0, help="average number of grid cut-offs per day ('synthetic' only)")
+    parser.add_argument("--outage-hours", type=float, default=2, help="average duration of a grid cut-off, in hours ('synthetic' only)")
+    parser.add_argument("--src", default=os.path.join(cWD,'input','indus_22.csv'), help="raw dataset ('indus' only)")
+    parser.add_argument("--out", default=None, help="output file (.csv or .npz). Defaults to input//{inp_data}_{start}_{end}.csv")
+    parser.add_argument("--self-test", action='store_true', help="checks the functions of this file on temporary files, and exits")
+    args = parser.parse_args()
+    if args.self_test:
+        _self_test()
+        parser.exit()
+
+    # --------------------------------------------------------------------------------------------
+    # Industrial data
+    # --------------------------------------------------------------------------------------------
+    # data comes from french industries forecasting PV and Load : https://zenodo.org/records/5510400#.YUizGls69hE
+    # !! check input before running, sometimes data is missing and dates not in the good order (main.py repairs it, see RepairTimeSeriesSheet)
+    if args.inp_data == 'indus':
+        start_date = pd.to_datetime(args.start if args.start is not None else '2016-01-01 00:00:00')
+        end_date = pd.to_datetime(args.end)
+        # the raw file is streamed by chunks, so that multi-GB datasets can be processed in constant memory
+        filepath = args.out if args.out is not None else os.path.join(cWD,"input",f"{args.inp_data}_{str(start_date).split(" ")[0]}_{str(end_date).split(" ")[0]}.csv")
+        num_steps, dt = stream_indus_csv(args.src, filepath, start_date, end_date)
+        print("dt =",dt,"h")
+        print(num_steps,"time steps saved at ",filepath)
+
+    # --------------------------------------------------------------------------------------------
+    # Constant, wavy (sinus) or synthetic time series
+    # --------------------------------------------------------------------------------------------
+    else:
+        dfTS = generate_input(args.inp_data, args.start if args.start is not None else '2025-01-01', args.days, args.dt, args.seed,
+                              args.load, args.pv, args.noise, args.clouds, args.outages, args.outage_hours)
+        start_date, end_date = dfTS["Time"].iloc[0], dfTS["Time"].iloc[-1]
+        filepath = args.out if args.out is not None else os.path.join(cWD,"input",f"{args.inp_data}_{str(start_date).split(" ")[0]}_{str(end_date).split(" ")[0]}.csv")
+        write_input(dfTS, filepath)
+        print("dt =",args.dt,"h")
+        print(len(dfTS),"time steps saved at ",filepath)
 # %%
@@ -29,6 +29,7 @@ setup(
     packages=find_packages(include=['virtualPMS*']),
     include_package_data=True,
     install_requires=requirements,
+    entry_points={'console_scripts': ['virtualPMS = virtualPMS.__main__:main']},
     classifiers=[
         'Programming Language :: Python :: 3',
         'Operating System :: OS Independent',
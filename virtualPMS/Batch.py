@@ -0,0 +1,213 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 17:12:09
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Batch of runs (command "batch" of python -m virtualPMS) + test section.
+Every input workbook of the batch (folders and glob patterns of .xlsx files) is run with its own configuration (see Simulation.py) by a
+pool of worker processes. The results are saved with the usual names, the output of every run is written in its own log file
+({workbook}_LOG.txt), and the batch writes an index of the runs (batch_index.csv) : status, duration, identifiers, path of the results
+and KPIs of every workbook. The index is written again after every run, so that it is up to date while the batch is running.
+A run that fails is recorded as failed in the index and doesn't stop the others, even if it kills its worker process : the workbooks
+that were running in a pool that broke are run again alone, only the one that breaks its pool again is failed.
+'''
+#---------------------
+#%%
+import os
+import sys
+if __name__ == "__main__": # test section run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+import glob
+import time
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+
+from virtualPMS import Simulation
+
+IndexName = "batch_index.csv"
+IndexColumns = ["input", "status", "seconds", "inputID", "strategy", "devices", "forecast", "steps", "prefix", "partial", "log", "error"] # then the KPIs
+
+def add_arguments(parser):
+    """arguments of a batch (command "batch" of python -m virtualPMS)"""
+    parser.add_argument("inputs", nargs='+', help="folders (every .xlsx file of the folder) and/or glob patterns of input files")
+    parser.add_argument("--output", help="folder of the results, logs and index (default output// of the working directory, see Simulation.work_dir())")
+    parser.add_argument("--workers", type=int, help="worker processes (default one per CPU)")
+    parser.add_argument("--max-seconds", type=float, help="time budget of the dispatch of every run : a run that spends it is stopped and marked 'stopped', "
+                                                          "only its partial results and resume state are saved (column 'partial' of the index)")
+    parser.add_argument("--index", help=f"path of the index of the runs (default {IndexName} in the output folder)")
+
+def find_inputs(patterns: list[str]) -> list[str]:
+    """input workbooks of a batch
+
+    Args:
+        patterns (list[str]): folders (every .xlsx file of the folder) and/or glob patterns
+
+    Returns:
+        list[str]: paths of the workbooks, in the order of the patterns, sorted by name within a pattern, without duplicates
+    """
+    inputs = []
+    for pattern in patterns:
+        found = glob.glob(os.path.join(pattern, "*.xlsx")) if os.path.isdir(pattern) else glob.glob(pattern)
+        found = [path for path in sorted(found) if not os.path.basename(path).startswith("~$")] # lock files of opened workbooks
+        assert found, f"!!! no input file matches {pattern} !!!"
+        inputs += [os.path.abspath(path) for path in found]
+    return list(dict.fromkeys(inputs))
+
+def log_path(input_path: str, out_dir: str) -> str:
+    return os.path.join(out_dir, os.path.splitext(os.path.basename(input_path))[0] + "_LOG.txt")
+
+def run_one(input_path: str, out_dir: str, max_seconds: float = None) -> dict:
+    """runs one workbook of the batch (in a worker process) : its output goes to its log file, and its errors are returned, not raised
+
+    Returns:
+        dict: row of the index (see IndexColumns), KPIs included
+    """
+    log = log_path(input_path, out_dir)
+    argv = [input_path, "--output", out_dir, "--figure-workers", "1"] + ([] if max_seconds is None else ["--max-seconds", str(max_seconds)])
+    row = {"input": input_path, "log": log}
+    t0 = time.perf_counter()
+    with open(log, 'w', encoding="utf-8") as f, redirect_stdout(f), redirect_stderr(f):
+        try:
+            summary = Simulation.run(Simulation.parse_args(argv))
+            row.update({key: value for key, value in summary.items() if key != "kpis"}, **summary["kpis"])
+        except Exception as error:
+            traceback.print_exc()
+            row.update(status="failed", error=f"{type(error).__name__}: {error}".strip()[:500])
+    row["seconds"] = time.perf_counter() - t0
+    return row
+
+def _worker_init():
+    """initializer of the worker processes : figures are only saved, never shown"""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+def write_index(rows: dict, inputs: list[str], index_path: str) -> pd.DataFrame:
+    """writes the index of the runs done so far (in the order of the inputs)"""
+    dfIndex = pd.DataFrame([rows[path] for path in inputs if path in rows])
+    dfIndex = dfIndex.reindex(columns=IndexColumns + [col for col in dfIndex.columns if col not in IndexColumns])
+    dfIndex.to_csv(index_path, index=False)
+    return dfIndex
+
+def run_batch(inputs: list[str], out_dir: str, workers: int = None, max_seconds: float = None, index_path: str = None, job=run_one) -> pd.DataFrame:
+    """runs every workbook of inputs in a pool of worker processes
+
+    Args:
+        inputs (list[str]): paths of the workbooks (see find_inputs())
+        out_dir (str): folder of the results, of the logs and of the index
+        workers (int, optional): worker processes. Defaults to None (one per CPU).
+        max_seconds (float, optional): time budget of the dispatch of every run. Defaults to None (no limit).
+        index_path (str, optional): path of the index. Defaults to None (batch_index.csv in out_dir).
+        job (function, optional): runs one workbook (input_path, out_dir, max_seconds) -> row of the index. Defaults to run_one.
+
+    Returns:
+        pd.DataFrame: index of the runs, one row per workbook
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index_path = index_path or os.path.join(out_dir, IndexName)
+    workers = max(1, min(len(inputs), workers or os.cpu_count() or 1))
+    rows = {}
+    pending, alone = list(inputs), [] # alone : workbooks that were running in a broken pool, run again in a pool of their own
+    while pending or alone:
+        if pending:
+            batch, size, pending = pending, workers, []
+        else:
+            batch, size = [alone.pop(0)], 1
+        for path in batch:
+            if os.path.exists(log_path(path, out_dir)):
+                os.remove(log_path(path, out_dir)) # the log file tells which workbooks were started when a pool breaks
+        with ProcessPoolExecutor(max_workers=size, initializer=_worker_init) as pool:
+            futures = {pool.submit(job, path, out_dir, max_seconds): path for path in batch}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    rows[path] = future.result()
+                except BrokenProcessPool:
+                    if size > 1: # started (it has a log file) : it may be the cause, run again alone ; not started : run again with the others
+                        (alone if os.path.exists(log_path(path, out_dir)) else pending).append(path)
+                        continue
+                    rows[path] = {"input": path, "status": "failed", "log": log_path(path, out_dir), "error": "the worker process died"}
+                print(f"[{len(rows)}/{len(inputs)}] {rows[path]['status']:7} {rows[path].get('seconds', 0):7.1f} s  {os.path.basename(path)}")
+                write_index(rows, inputs, index_path)
+        pending.sort(key=inputs.index)
+    dfIndex = write_index(rows, inputs, index_path)
+    duplicated = dfIndex.loc[dfIndex["prefix"].notna() & dfIndex["prefix"].duplicated(keep=False), "input"]
+    if len(duplicated):
+        print(f"!!! {len(duplicated)} workbooks have the same inputID and configuration, their results overwrite each other : {', '.join(map(os.path.basename, duplicated))} !!!")
+    print(f"{(dfIndex['status'] == 'ok').sum()}/{len(dfIndex)} runs ok, index saved at {index_path}")
+    return dfIndex
+
+def run(args) -> pd.DataFrame:
+    """runs a batch (see add_arguments() for args)"""
+    return run_batch(find_inputs(args.inputs), args.output or os.path.join(Simulation.work_dir(), "output"), args.workers, args.max_seconds, args.index)
+
+# test section
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+    import json
+    import shutil
+    import tempfile
+
+    def crashing_job(input_path, out_dir, max_seconds=None):
+        """kills its worker process for the workbook named crash.xlsx"""
+        if os.path.basename(input_path) == "crash.xlsx":
+            open(log_path(input_path, out_dir), 'w').close()
+            os._exit(1)
+        return run_one(input_path, out_dir, max_seconds)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        in_dir, out_dir = os.path.join(tmpdir, "input"), os.path.join(tmpdir, "output")
+        os.makedirs(in_dir)
+        shutil.copy(os.path.join(Simulation.RootDir, "input", "inpParam.xlsx"), os.path.join(in_dir, "site_a.xlsx"))
+        with open(os.path.join(in_dir, "broken.xlsx"), 'w') as f:
+            f.write("not a workbook")
+        open(os.path.join(in_dir, "~$site_a.xlsx"), 'w').close()
+        inputs = find_inputs([in_dir, os.path.join(in_dir, "site_*.xlsx")])
+        # default folders : the current directory when it has an input// folder, never the folder of the package
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmpdir)
+            assert os.path.samefile(Simulation.work_dir(), tmpdir)
+            os.chdir(in_dir)
+            assert Simulation.work_dir() in (os.getcwd(), Simulation.RootDir)
+        finally:
+            os.chdir(cwd)
+        assert [os.path.basename(path) for path in inputs] == ["broken.xlsx", "site_a.xlsx"]
+        try:
+            find_inputs([os.path.join(in_dir, "*.csv")])
+            raise RuntimeError("a pattern without any file must fail")
+        except AssertionError:
+            pass
+
+        # a failed workbook doesn't stop the batch, the index has the KPIs of the others
+        dfIndex = run_batch(inputs, out_dir, workers=2).set_index("input")
+        assert dfIndex["status"].to_dict() == {inputs[0]: "failed", inputs[1]: "ok"}
+        assert "Traceback" in open(dfIndex.loc[inputs[0], "log"]).read() and dfIndex.loc[inputs[0], "error"]
+        ok = dfIndex.loc[inputs[1]]
+        assert ok["inputID"] == "campus" and ok["steps"] > 0 and os.path.exists(ok["prefix"] + "_TradedEnergy.csv")
+        dfEnergy = pd.read_csv(ok["prefix"] + "_TradedEnergy.csv")
+        assert ok[f"{dfEnergy['var'][0]} ({dfEnergy['unit'][0]})"] == dfEnergy["value"][0]
+        assert pd.read_csv(os.path.join(out_dir, IndexName))["status"].tolist() == ["failed", "ok"]
+
+        # time budget : the run is stopped, only its partial results and the state to resume from are saved
+        shutil.rmtree(out_dir)
+        dfIndex = run_batch(inputs[1:], out_dir, max_seconds=0)
+        assert dfIndex["status"].tolist() == ["stopped"] and not os.path.exists(dfIndex["prefix"][0] + "_TradedEnergy.csv")
+        assert os.path.exists(dfIndex["prefix"][0] + "_AllVar_PARTIAL.csv") and os.path.exists(dfIndex["prefix"][0] + "_AllSOCs_PARTIAL.csv")
+        with open(dfIndex["partial"][0], encoding="utf-8") as f:
+            state = json.load(f)
+        assert state["stopped"] and state["reason"] == "max_seconds" and state["next_step"] == dfIndex["steps"][0] == 0
+        summary = Simulation.run(Simulation.parse_args([inputs[1], "--output", out_dir, "--max-seconds", "0", "--profile"])) # the profile is saved too
+        with open(summary["prefix"] + "_PARTIAL_PROFILE.json", encoding="utf-8") as f:
+            report = json.load(f)
+        assert report["run"]["status"] == "stopped" and report["run"]["partial"] == summary["partial"] and report["phases"][-1]["phase"] == "dispatch"
+        assert pd.read_csv(os.path.join(out_dir, "profile_summary.csv"))["status"].tolist() == ["stopped"]
+
+        # a workbook that kills its worker : the others are run again, only this one fails
+        shutil.copy(os.path.join(in_dir, "broken.xlsx"), os.path.join(in_dir, "crash.xlsx"))
+        dfIndex = run_batch(find_inputs([in_dir]), out_dir, workers=2, job=crashing_job)
+        assert dfIndex["status"].tolist() == ["failed", "failed", "ok"] and dfIndex["error"][1] == "the worker process died"
+        print(dfIndex.drop(columns=["log", "prefix", "partial"]).to_string())
+# %%
@@ -10,7 +10,8 @@
 #%%
 import os
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+if __name__ == "__main__": # test section run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
 
 from virtualPMS.Battery import Battery
 from virtualPMS.Grid import Grid
@@ -10,13 +10,42 @@
 #%%
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+if __name__ == "__main__": # test section run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
 
 from virtualPMS import Battery, BatteryStock, DieselGenerator, Grid
 import pandas as pd
 import numpy as np
 
-def LFE_CCE_emergency_system(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, SOClim: float = 0.7, forecast: bool=False, forecast_period: float = 24) -> tuple[dict,dict]:
+# description of the branches of every strategy (values of indic), used by the hot-path counters (Profiling.BranchCounters)
+BranchLabels = {"emergency_system": {1: "excess : battery charging",
+                                     2: "excess : selling to the grid",
+                                     3: "excess : resistor",
+                                     4: "deficit : grid + battery charging (forecast)",
+                                     5: "deficit : grid supplies load",
+                                     6: "deficit : battery discharging",
+                                     7: "deficit : DG insufficient + battery",
+                                     8: "deficit : DG sufficient + battery charging"},
+                "self_sufficiency": {1: "excess : battery charging",
+                                     2: "excess : selling to the grid",
+                                     3: "excess : resistor",
+                                     4: "deficit : battery discharging",
+                                     5: "deficit : DG insufficient + battery",
+                                     6: "deficit : DG sufficient + battery charging",
+                                     7: "deficit : grid + battery charging (forecast)",
+                                     8: "deficit : grid supplies load"},
+                "CostStrat": {1: "P_net = 0",
+                              2: "excess : selling to the grid",
+                              3: "excess : battery charging",
+                              4: "deficit : grid + battery charging",
+                              5: "deficit : grid only",
+                              6: "deficit : battery discharging",
+                              7: "deficit : DG + selling the excess",
+                              8: "deficit : DG + battery charging",
+                              9: "deficit : DG + grid",
+                              10: "deficit : DG + battery"}}
+
+def LFE_CCE_emergency_system(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, SOClim: float = 0.7, forecast: bool=False, forecast_period: float = 24, counters=None, progress=None) -> tuple[dict,dict]:
     """Load Following and Cycle Charging dispatching routine. 
     Preserve system's components : when energy is missing, priority goes to grid > batteries > DG.
     
@@ -37,6 +66,11 @@ def LFE_CCE_emergency_system(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
         forecast_period (float, optional): will only be used when forecast == True. based on the duration of battery charging and forecast abilities, 
                                            it represents the future period of time the function is allowed to look at in order to anticipate dispatching, IN HOURS. 
                                            Defaults to 24.
+        counters (Profiling.BranchCounters, optional): hot-path counters (branch visits, time per branch, calls of the device methods).
+                                                       Defaults to None (no instrumentation).
+        progress (Progress.DispatchProgress, optional): progress callback and budget. When the budget is spent, only the steps dispatched are returned
+                                                        and calling again with the same input, devices and progress (after progress.resume())
+                                                        dispatches the remaining steps. Defaults to None (no progress, no budget).
     
     Returns:
         dict, dict: Power and others time series.
@@ -90,88 +124,104 @@ def LFE_CCE_emergency_system(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
 
     # SIMULATION
     # --------------------------------------------------------------------------------------------
-    for i in range(len(TimeArray)):
-        for j,bat_name in enumerate(allSOCs.keys()):
-            allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
-        F_C.append(DG_1.FuelRate)
-        SOC.append(BattStock.get_SOC())
-        RuntimeDG.append(DG_1.cur_runtime)
-
-        if P_net[i] >= 0:                                                                                              # green power excess
-            P_L_modif.append(P_L[i])
-            P_diesel.append(0)
-            DG_1.cur_runtime = 0
-            if BattStock.get_SOC() < BattStock.get_SOC('max'):                                                         # battery charging
-                Pbat_ch_i = BattStock.battery_stock_charge(P_net[i],dt)
-                P_bat.append(- Pbat_ch_i)
-                P_grid.append(- P_net[i] + Pbat_ch_i if grid_1.state[i]==1 else 0) # remaining power to the grid if connected
-                # P_resistor.append(P_net[i] - Pbat_ch_i) # renewable prod clipping
-                indic.append(1)
-            elif grid_1.state[i]:                                                                                      # selling to the grid
-                P_grid.append(- P_net[i])
-                P_bat.append(0)
-                # P_resistor.append(0)
-                indic.append(2)
-            else :                                                                                                     # battery full and grid unavailable : resistor
-                P_grid.append(0)
-                P_bat.append(0)
-                # P_resistor.append(P_net[i]) # renewable prod clipping
-                indic.append(3)
-        else :                                                                                                            # green power deficit
-            # print('belif   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
-            if grid_1.state[i] and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime:                                        # purchasing from the grid
+    try:
+        if counters is not None:
+            counters.begin(BranchLabels['emergency_system'], grid_1, BattStock, DG_1)
+        start, stop = (0, len(TimeArray)) if progress is None else progress.begin(len(TimeArray))
+        for i in range(start, stop):
+            if progress is not None and (i - start) % progress.every == 0 and not progress.tick(i): # time budget spent
+                break
+            if counters is not None:
+                counters.step_start(i)
+            for j,bat_name in enumerate(allSOCs.keys()):
+                allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
+            F_C.append(DG_1.FuelRate)
+            SOC.append(BattStock.get_SOC())
+            RuntimeDG.append(DG_1.cur_runtime)
+
+            if P_net[i] >= 0:                                                                                              # green power excess
                 P_L_modif.append(P_L[i])
                 P_diesel.append(0)
                 DG_1.cur_runtime = 0
-                # P_resistor.append(0)
-                if forecast and (BattStock.get_SOC() < SOClim or 0 in grid_state_long[i:i+int(forecast_period/dt)]):   # battery charging using grid
-                    Pmax_bat = BattStock.get_Pmax(dt, 'ch')
-                    Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
-                    P_grid.append(Pbat_ch_i - P_net[i])
+                if BattStock.get_SOC() < BattStock.get_SOC('max'):                                                         # battery charging
+                    Pbat_ch_i = BattStock.battery_stock_charge(P_net[i],dt)
                     P_bat.append(- Pbat_ch_i)
-                    indic.append(4)
-                else :                                                                                                 # grid supplies load
-                    P_grid.append(abs(P_net[i]))
+                    P_grid.append(- P_net[i] + Pbat_ch_i if grid_1.state[i]==1 else 0) # remaining power to the grid if connected
+                    # P_resistor.append(P_net[i] - Pbat_ch_i) # renewable prod clipping
+                    indic.append(1)
+                elif grid_1.state[i]:                                                                                      # selling to the grid
+                    P_grid.append(- P_net[i])
                     P_bat.append(0)
-                    indic.append(5)
-            elif abs(P_net[i]) <= BattStock.get_Pmax(dt, 'dis') and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime: # battery discharging
-                # battery power sufficient
-                # print('bchar   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
-                Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
-                # print('achar   max',get_Pmax(BattStock,dt,'dis'),'P_bat_real',Pbat_dis_i,'P_bat_sim',get_Pbat(BattStock,abs(P_net[i]),dt))
-                # if Pbat_dis_i < abs(P_net[i]):
-                #     BattStocks_debug.append([[copy.deepcopy(b) for b in BattStock], P_net[i], dt])
-                #     print('idx',i,'time', time[i],'p_disch', Pbat_dis_i, 'soc', get_SOC(BattStock,'soc'))
-                # assert(Pbat_dis_i == abs(P_net[i]))
-                P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
-                P_grid.append(- P_net[i] - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                P_bat.append(Pbat_dis_i)
-                P_diesel.append(0)
-                DG_1.cur_runtime = 0
-                # P_resistor.append(0)
-                indic.append(6)
-            else :                                                                                                     # running DG
-                P_DG_asked = DG_1.Pnom if strat.lower()=='cce' else abs(P_net[i])
-                F_Cons, Pdiesel_i = DG_1.run_DG(P_DG_asked, dt, ActiveDevices["DieselGenerator"])
-                P_diesel.append(Pdiesel_i)
-                DG_1.cur_runtime += dt
-                DG_1.FuelRate -= F_Cons * dt / DG_1.TankCapacity
-                if Pdiesel_i < abs(P_net[i]):                                                                          # DG power unsufficient
-                    Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
-                    P_bat.append(Pbat_dis_i)
-                    P_grid.append(abs(P_net[i]) - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                    P_L_modif.append(P_green[i] + Pdiesel_i + Pbat_dis_i + P_grid[i]) # load clipping
                     # P_resistor.append(0)
-                    indic.append(7)
-                else :                                                                                                 # DG power sufficient
+                    indic.append(2)
+                else :                                                                                                     # battery full and grid unavailable : resistor
+                    P_grid.append(0)
+                    P_bat.append(0)
+                    # P_resistor.append(P_net[i]) # renewable prod clipping
+                    indic.append(3)
+            else :                                                                                                            # green power deficit
+                # print('belif   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
+                if grid_1.state[i] and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime:                                        # purchasing from the grid
                     P_L_modif.append(P_L[i])
-                    Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i + P_net[i], dt)
-                    P_bat.append(- Pbat_ch_i)
-                    P_grid.append(Pdiesel_i - abs(P_net[i]) - Pbat_ch_i if grid_1.state[i] == 1 else 0)
-                    # print('p_dg',Pdiesel_i,'soc',get_SOC(BattStock))
-                    indic.append(8)
-                    # P_resistor.append(P_green[-1] + P_bat[-1] + P_diesel[-1] - P_L_modif[-1]) # DG output clipping
-                # print(round(F_Cons * dt / DG_1.TankCapacity,3), round(DG_1.FuelRate,3))
+                    P_diesel.append(0)
+                    DG_1.cur_runtime = 0
+                    # P_resistor.append(0)
+                    if forecast and (BattStock.get_SOC() < SOClim or 0 in grid_state_long[i:i+int(forecast_period/dt)]):   # battery charging using grid
+                        Pmax_bat = BattStock.get_Pmax(dt, 'ch')
+                        Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
+                        P_grid.append(Pbat_ch_i - P_net[i])
+                        P_bat.append(- Pbat_ch_i)
+                        indic.append(4)
+                    else :                                                                                                 # grid supplies load
+                        P_grid.append(abs(P_net[i]))
+                        P_bat.append(0)
+                        indic.append(5)
+                elif abs(P_net[i]) <= BattStock.get_Pmax(dt, 'dis') and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime: # battery discharging
+                    # battery power sufficient
+                    # print('bchar   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
+                    Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
+                    # print('achar   max',get_Pmax(BattStock,dt,'dis'),'P_bat_real',Pbat_dis_i,'P_bat_sim',get_Pbat(BattStock,abs(P_net[i]),dt))
+                    # if Pbat_dis_i < abs(P_net[i]):
+                    #     BattStocks_debug.append([[copy.deepcopy(b) for b in BattStock], P_net[i], dt])
+                    #     print('idx',i,'time', time[i],'p_disch', Pbat_dis_i, 'soc', get_SOC(BattStock,'soc'))
+                    # assert(Pbat_dis_i == abs(P_net[i]))
+                    P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
+                    P_grid.append(- P_net[i] - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                    P_bat.append(Pbat_dis_i)
+                    P_diesel.append(0)
+                    DG_1.cur_runtime = 0
+                    # P_resistor.append(0)
+                    indic.append(6)
+                else :                                                                                                     # running DG
+                    P_DG_asked = DG_1.Pnom if strat.lower()=='cce' else abs(P_net[i])
+                    F_Cons, Pdiesel_i = DG_1.run_DG(P_DG_asked, dt, ActiveDevices["DieselGenerator"])
+                    P_diesel.append(Pdiesel_i)
+                    DG_1.cur_runtime += dt
+                    DG_1.FuelRate -= F_Cons * dt / DG_1.TankCapacity
+                    if Pdiesel_i < abs(P_net[i]):                                                                          # DG power unsufficient
+                        Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
+                        P_bat.append(Pbat_dis_i)
+                        P_grid.append(abs(P_net[i]) - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                        P_L_modif.append(P_green[i] + Pdiesel_i + Pbat_dis_i + P_grid[-1]) # load clipping
+                        # P_resistor.append(0)
+                        indic.append(7)
+                    else :                                                                                                 # DG power sufficient
+                        P_L_modif.append(P_L[i])
+                        Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i + P_net[i], dt)
+                        P_bat.append(- Pbat_ch_i)
+                        P_grid.append(Pdiesel_i - abs(P_net[i]) - Pbat_ch_i if grid_1.state[i] == 1 else 0)
+                        # print('p_dg',Pdiesel_i,'soc',get_SOC(BattStock))
+                        indic.append(8)
+                        # P_resistor.append(P_green[-1] + P_bat[-1] + P_diesel[-1] - P_L_modif[-1]) # DG output clipping
+                    # print(round(F_Cons * dt / DG_1.TankCapacity,3), round(DG_1.FuelRate,3))
+            if counters is not None:
+                counters.step_end(indic[-1])
+    finally: # the devices get their methods back, even if the dispatch fails
+        if counters is not None:
+            counters.finish(indic)
+    if progress is not None: # results of the steps dispatched by this call only
+        progress.finish(len(indic))
+        TimeArray, P_L, P_green, P_net = (serie.iloc[start:start + len(indic)] for serie in (TimeArray, P_L, P_green, P_net))
     
     # OUTPUT
     # --------------------------------------------------------------------------------------------
@@ -209,7 +259,7 @@ def LFE_CCE_emergency_system(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
     dfOut_TS = pd.DataFrame(DictOut_TS)
     return dfOut_TS, allSOCs
 
-def LFE_CCE_self_sufficiency(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, SOClim: float = 0.7, forecast: bool=False, forecast_period: float = 24) -> tuple[dict,dict]:
+def LFE_CCE_self_sufficiency(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, SOClim: float = 0.7, forecast: bool=False, forecast_period: float = 24, counters=None, progress=None) -> tuple[dict,dict]:
     """Load Following and Cycle Charging dispatching routine. 
     Optimize the self sufficiency : when energy is missing, priority goes to batteries > DG > grid.
     
@@ -230,6 +280,11 @@ def LFE_CCE_self_sufficiency(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
         forecast_period (float, optional): will only be used when forecast == True. based on the duration of battery charging and forecast abilities, 
                                            it represents the future period of time the function is allowed to look at in order to anticipate dispatching, IN HOURS. 
                                            Defaults to 24.
+        counters (Profiling.BranchCounters, optional): hot-path counters (branch visits, time per branch, calls of the device methods).
+                                                       Defaults to None (no instrumentation).
+        progress (Progress.DispatchProgress, optional): progress callback and budget. When the budget is spent, only the steps dispatched are returned
+                                                        and calling again with the same input, devices and progress (after progress.resume())
+                                                        dispatches the remaining steps. Defaults to None (no progress, no budget).
     
     Returns:
         dict, dict: Power and others time series.
@@ -283,89 +338,105 @@ def LFE_CCE_self_sufficiency(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
 
     # SIMULATION
     # --------------------------------------------------------------------------------------------
-    for i in range(len(TimeArray)):
-        for j,bat_name in enumerate(allSOCs.keys()):
-            allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
-        F_C.append(DG_1.FuelRate)
-        SOC.append(BattStock.get_SOC())
-        RuntimeDG.append(DG_1.cur_runtime)
-
-        if P_net[i] >= 0:                                                                                            # green power excess
-            P_L_modif.append(P_L[i])
-            P_diesel.append(0)
-            DG_1.cur_runtime = 0
-            if BattStock.get_SOC() < BattStock.get_SOC('max'):                                                       # battery charging
-                Pbat_ch_i = BattStock.battery_stock_charge(P_net[i],dt)
-                P_bat.append(- Pbat_ch_i)
-                P_grid.append(- P_net[i] + Pbat_ch_i if grid_1.state[i]==1 else 0) # remaining power to the grid if connected
-                # P_resistor.append(P_net[i] - Pbat_ch_i) # renewable prod clipping
-                indic.append(1)
-            elif grid_1.state[i]:                                                                                    # selling to the grid
-                P_grid.append(- P_net[i])
-                P_bat.append(0)
-                # P_resistor.append(0)
-                indic.append(2)
-            else :                                                                                                   # battery full and grid unavailable : resistor
-                P_grid.append(0)
-                P_bat.append(0)
-                # P_resistor.append(P_net[i]) # renewable prod clipping
-                indic.append(3)
-        else :                                                                                                       # green power deficit
-            if abs(P_net[i]) <= BattStock.get_Pmax(dt, 'dis') and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime:    # battery discharging
-                # battery power sufficient
-                # print('bchar   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
-                Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
-                # print('achar   max',get_Pmax(BattStock,dt,'dis'),'P_bat_real',Pbat_dis_i,'P_bat_sim',get_Pbat(BattStock,abs(P_net[i]),dt))
-                # if Pbat_dis_i < abs(P_net[i]):
-                #     BattStocks_debug.append([[copy.deepcopy(b) for b in BattStock], P_net[i], dt])
-                #     print('idx',i,'time', time[i],'p_disch', Pbat_dis_i, 'soc', get_SOC(BattStock,'soc'))
-                # assert(Pbat_dis_i == abs(P_net[i]))
-                P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
-                P_grid.append(- P_net[i] - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                P_bat.append(Pbat_dis_i)
-                P_diesel.append(0)
-                DG_1.cur_runtime = 0
-                # P_resistor.append(0)
-                indic.append(4)
-            elif DG_1.cur_runtime < DG_1.MinimumRuntime or grid_1.state[i] == 0:                                     # running DG
-                P_DG_asked = DG_1.Pnom if strat.lower()=='cce' else abs(P_net[i])
-                F_Cons, Pdiesel_i = DG_1.run_DG(P_DG_asked, dt, ActiveDevices["DieselGenerator"])
-                P_diesel.append(Pdiesel_i)
-                DG_1.cur_runtime += dt
-                DG_1.FuelRate -= F_Cons * dt / DG_1.TankCapacity
-                if Pdiesel_i < abs(P_net[i]):                                                                        # DG power unsufficient
-                    Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
-                    P_bat.append(Pbat_dis_i)
-                    P_grid.append(abs(P_net[i]) - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                    P_L_modif.append(P_green[i] + Pdiesel_i + Pbat_dis_i + P_grid[i]) # load clipping
-                    # P_resistor.append(0)
-                    indic.append(5)
-                else :                                                                                               # DG power sufficient
-                    P_L_modif.append(P_L[i])
-                    Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i + P_net[i], dt)
-                    # print('p_dg',Pdiesel_i,'soc',get_SOC(BattStock))
-                    P_bat.append(- Pbat_ch_i)
-                    P_grid.append(Pdiesel_i - abs(P_net[i]) - Pbat_ch_i if grid_1.state[i] == 1 else 0)
-                    indic.append(6)
-                    # P_resistor.append(P_green[-1] + P_bat[-1] + P_diesel[-1] - P_L_modif[-1]) # DG output clipping
-                # print(round(F_Cons * dt / DG_1.TankCapacity,3), round(DG_1.FuelRate,3))
-            # print('belif   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
-            elif grid_1.state[i] == 1:                                                                               # purchasing from the grid
+    try:
+        if counters is not None:
+            counters.begin(BranchLabels['self_sufficiency'], grid_1, BattStock, DG_1)
+        start, stop = (0, len(TimeArray)) if progress is None else progress.begin(len(TimeArray))
+        for i in range(start, stop):
+            if progress is not None and (i - start) % progress.every == 0 and not progress.tick(i): # time budget spent
+                break
+            if counters is not None:
+                counters.step_start(i)
+            for j,bat_name in enumerate(allSOCs.keys()):
+                allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
+            F_C.append(DG_1.FuelRate)
+            SOC.append(BattStock.get_SOC())
+            RuntimeDG.append(DG_1.cur_runtime)
+
+            if P_net[i] >= 0:                                                                                            # green power excess
                 P_L_modif.append(P_L[i])
                 P_diesel.append(0)
                 DG_1.cur_runtime = 0
-                # P_resistor.append(0)
-                if forecast and (BattStock.get_SOC() < SOClim or 0 in grid_state_long[i:i+int(forecast_period/dt)]): # battery charging using grid
-                    Pmax_bat = BattStock.get_Pmax(dt, 'ch')
-                    Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
-                    P_grid.append(Pbat_ch_i - P_net[i])
+                if BattStock.get_SOC() < BattStock.get_SOC('max'):                                                       # battery charging
+                    Pbat_ch_i = BattStock.battery_stock_charge(P_net[i],dt)
                     P_bat.append(- Pbat_ch_i)
-                    indic.append(7)
-                else :                                                                                               # grid supplies load
-                    P_grid.append(abs(P_net[i]))
+                    P_grid.append(- P_net[i] + Pbat_ch_i if grid_1.state[i]==1 else 0) # remaining power to the grid if connected
+                    # P_resistor.append(P_net[i] - Pbat_ch_i) # renewable prod clipping
+                    indic.append(1)
+                elif grid_1.state[i]:                                                                                    # selling to the grid
+                    P_grid.append(- P_net[i])
+                    P_bat.append(0)
+                    # P_resistor.append(0)
+                    indic.append(2)
+                else :                                                                                                   # battery full and grid unavailable : resistor
+                    P_grid.append(0)
                     P_bat.append(0)
-                    indic.append(8)
-            # else: every possibility should have already been processed (cf grid state 0 or 1)
+                    # P_resistor.append(P_net[i]) # renewable prod clipping
+                    indic.append(3)
+            else :                                                                                                       # green power deficit
+                if abs(P_net[i]) <= BattStock.get_Pmax(dt, 'dis') and not 0 < DG_1.cur_runtime < DG_1.MinimumRuntime:    # battery discharging
+                    # battery power sufficient
+                    # print('bchar   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
+                    Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
+                    # print('achar   max',get_Pmax(BattStock,dt,'dis'),'P_bat_real',Pbat_dis_i,'P_bat_sim',get_Pbat(BattStock,abs(P_net[i]),dt))
+                    # if Pbat_dis_i < abs(P_net[i]):
+                    #     BattStocks_debug.append([[copy.deepcopy(b) for b in BattStock], P_net[i], dt])
+                    #     print('idx',i,'time', time[i],'p_disch', Pbat_dis_i, 'soc', get_SOC(BattStock,'soc'))
+                    # assert(Pbat_dis_i == abs(P_net[i]))
+                    P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
+                    P_grid.append(- P_net[i] - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                    P_bat.append(Pbat_dis_i)
+                    P_diesel.append(0)
+                    DG_1.cur_runtime = 0
+                    # P_resistor.append(0)
+                    indic.append(4)
+                elif DG_1.cur_runtime < DG_1.MinimumRuntime or grid_1.state[i] == 0:                                     # running DG
+                    P_DG_asked = DG_1.Pnom if strat.lower()=='cce' else abs(P_net[i])
+                    F_Cons, Pdiesel_i = DG_1.run_DG(P_DG_asked, dt, ActiveDevices["DieselGenerator"])
+                    P_diesel.append(Pdiesel_i)
+                    DG_1.cur_runtime += dt
+                    DG_1.FuelRate -= F_Cons * dt / DG_1.TankCapacity
+                    if Pdiesel_i < abs(P_net[i]):                                                                        # DG power unsufficient
+                        Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
+                        P_bat.append(Pbat_dis_i)
+                        P_grid.append(abs(P_net[i]) - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                        P_L_modif.append(P_green[i] + Pdiesel_i + Pbat_dis_i + P_grid[-1]) # load clipping
+                        # P_resistor.append(0)
+                        indic.append(5)
+                    else :                                                                                               # DG power sufficient
+                        P_L_modif.append(P_L[i])
+                        Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i + P_net[i], dt)
+                        # print('p_dg',Pdiesel_i,'soc',get_SOC(BattStock))
+                        P_bat.append(- Pbat_ch_i)
+                        P_grid.append(Pdiesel_i - abs(P_net[i]) - Pbat_ch_i if grid_1.state[i] == 1 else 0)
+                        indic.append(6)
+                        # P_resistor.append(P_green[-1] + P_bat[-1] + P_diesel[-1] - P_L_modif[-1]) # DG output clipping
+                    # print(round(F_Cons * dt / DG_1.TankCapacity,3), round(DG_1.FuelRate,3))
+                # print('belif   max',get_Pmax(BattStock,dt,'dis'),'pnet',abs(P_net[i]),'P_bat',get_Pbat(BattStock,abs(P_net[i]),dt))
+                elif grid_1.state[i] == 1:                                                                               # purchasing from the grid
+                    P_L_modif.append(P_L[i])
+                    P_diesel.append(0)
+                    DG_1.cur_runtime = 0
+                    # P_resistor.append(0)
+                    if forecast and (BattStock.get_SOC() < SOClim or 0 in grid_state_long[i:i+int(forecast_period/dt)]): # battery charging using grid
+                        Pmax_bat = BattStock.get_Pmax(dt, 'ch')
+                        Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
+                        P_grid.append(Pbat_ch_i - P_net[i])
+                        P_bat.append(- Pbat_ch_i)
+                        indic.append(7)
+                    else :                                                                                               # grid supplies load
+                        P_grid.append(abs(P_net[i]))
+                        P_bat.append(0)
+                        indic.append(8)
+                # else: every possibility should have already been processed (cf grid state 0 or 1)
+            if counters is not None:
+                counters.step_end(indic[-1])
+    finally: # the devices get their methods back, even if the dispatch fails
+        if counters is not None:
+            counters.finish(indic)
+    if progress is not None: # results of the steps dispatched by this call only
+        progress.finish(len(indic))
+        TimeArray, P_L, P_green, P_net = (serie.iloc[start:start + len(indic)] for serie in (TimeArray, P_L, P_green, P_net))
 
     # OUTPUT
     # --------------------------------------------------------------------------------------------
@@ -403,7 +474,7 @@ def LFE_CCE_self_sufficiency(strat: str, dfIN: pd.DataFrame, ActiveDevices: dict
     dfOut_TS = pd.DataFrame(DictOut_TS)
     return dfOut_TS, allSOCs
 
-def CostStrat(dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, ChargeUsingGridCost: float=0, forecast: bool=False, forecast_period: float = 24) -> tuple[dict,dict]:
+def CostStrat(dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock: BatteryStock, DG_1: DieselGenerator, dt: float, ChargeUsingGridCost: float=0, forecast: bool=False, forecast_period: float = 24, counters=None, progress=None) -> tuple[dict,dict]:
     """Strategy based on costs dispatching routine. 
     Decisions are taken after the calculation of use costs of every device.
     
@@ -422,6 +493,11 @@ def CostStrat(dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock:
         forecast_period (float, optional): will only be used when forecast == True. based on the duration of battery charging and forecast abilities, 
                                            it represents the future period of time the function is allowed to look at in order to anticipate dispatching, IN HOURS. 
                                            Defaults to 24.
+        counters (Profiling.BranchCounters, optional): hot-path counters (branch visits, time per branch, calls of the device methods).
+                                                       Defaults to None (no instrumentation).
+        progress (Progress.DispatchProgress, optional): progress callback and budget. When the budget is spent, only the steps dispatched are returned
+                                                        and calling again with the same input, devices and progress (after progress.resume())
+                                                        dispatches the remaining steps. Defaults to None (no progress, no budget).
     
     Returns:
         dict, dict: Power and others time series.
@@ -478,103 +554,119 @@ def CostStrat(dfIN: pd.DataFrame, ActiveDevices: dict, grid_1: Grid, BattStock:
     # SIMULATION
     # --------------------------------------------------------------------------------------------
     # to understand 'Yes' and 'No' comments, refer to the practical diagram
-    for i in range(len(TimeArray)):
-        for j,bat_name in enumerate(allSOCs.keys()):
-            allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
-        F_C.append(DG_1.FuelRate)
-        SOC.append(BattStock.get_SOC())
-        RuntimeDG.append(DG_1.cur_runtime)
-
-        GridSaleCost = grid_1.sale_cost(TimeArray, i)
-        BatteryChargeCost = BattStock.charge_cost(grid_1, i, dt, ActiveDevices["Batteries"], forecast, forecast_period)
-        GridSaleCost_list.append(GridSaleCost)
-        BatteryChargeCost_list.append(BatteryChargeCost)
-
-        if P_net[i] == 0:                                                                                              # P_green = P_load
-            P_L_modif.append(P_L[i])
-            P_grid.append(0)
-            P_bat.append(0)
-            P_diesel.append(0)
-            DG_1.cur_runtime = 0
-            indic.append(1)
-            GridPurchaseCost_list.append(np.inf)
-            BatteryDischargeCost_list.append(np.inf)
-            DGUseCost_list.append(np.inf)
-        elif P_net[i] > 0:                                                                                             # green power excess
-            P_L_modif.append(P_L[i])
-            P_diesel.append(0)
-            DG_1.cur_runtime = 0
-            if BatteryChargeCost < GridSaleCost:                                                                       # selling to the grid
-                P_grid.append(- P_net[i])
+    try:
+        if counters is not None:
+            counters.begin(BranchLabels['CostStrat'], grid_1, BattStock, DG_1)
+        start, stop = (0, len(TimeArray)) if progress is None else progress.begin(len(TimeArray))
+        for i in range(start, stop):
+            if progress is not None and (i - start) % progress.every == 0 and not progress.tick(i): # time budget spent
+                break
+            if counters is not None:
+                counters.step_start(i)
+            for j,bat_name in enumerate(allSOCs.keys()):
+                allSOCs[bat_name].append(BattStock.battery_stock[j].SOC)
+            F_C.append(DG_1.FuelRate)
+            SOC.append(BattStock.get_SOC())
+            RuntimeDG.append(DG_1.cur_runtime)
+
+            GridSaleCost = grid_1.sale_cost(TimeArray, i)
+            BatteryChargeCost = BattStock.charge_cost(grid_1, i, dt, ActiveDevices["Batteries"], forecast, forecast_period)
+            GridSaleCost_list.append(GridSaleCost)
+            BatteryChargeCost_list.append(BatteryChargeCost)
+
+            if P_net[i] == 0:                                                                                              # P_green = P_load
+                P_L_modif.append(P_L[i])
+                P_grid.append(0)
                 P_bat.append(0)
-                indic.append(2)
-            else :                                                                                                     # battery charging
-                Pbat_ch_i = BattStock.battery_stock_charge(P_net[i], dt)
-                P_grid.append(Pbat_ch_i - P_net[i] if grid_1.state[i] == 1 else 0)
-                P_bat.append(- Pbat_ch_i)
-                indic.append(3)
-            GridPurchaseCost_list.append(np.inf)
-            BatteryDischargeCost_list.append(np.inf)
-            DGUseCost_list.append(np.inf)
-        else:                                                                                                          # green power deficit
-            f_cons, Pdiesel_i = DG_1.run_DG(abs(P_net[i]), dt, ActiveDevices["DieselGenerator"]) # simulation to see if running the DG is worth the effort (time series are not updated here)
-            GridPurchaseCost = grid_1.purchase_cost(TimeArray, i)
-            BatteryDischargeCost = BattStock.discharge_cost(grid_1, abs(P_net[i]), dt, ActiveDevices["Batteries"])
-            DGUseCost = DG_1.use_cost(f_cons, abs(P_net[i]), Pdiesel_i, ActiveDevices["DieselGenerator"])
-            GridPurchaseCost_list.append(GridPurchaseCost)
-            BatteryDischargeCost_list.append(BatteryDischargeCost)
-            DGUseCost_list.append(DGUseCost)
-            # print(grid_state[i],'GridSaleCost', round(GridSaleCost,3), 'BatteryChargeCost', round(BatteryChargeCost,3), 'GridPurchaseCost', round(GridPurchaseCost,3), 'BatteryDischargeCost', round(BatteryDischargeCost,3), 'DGUseCost', round(DGUseCost,3))
-            if GridPurchaseCost < BatteryDischargeCost and GridPurchaseCost < DGUseCost:                                                                                    # purchasing from the grid
+                P_diesel.append(0)
+                DG_1.cur_runtime = 0
+                indic.append(1)
+                GridPurchaseCost_list.append(np.inf)
+                BatteryDischargeCost_list.append(np.inf)
+                DGUseCost_list.append(np.inf)
+            elif P_net[i] > 0:                                                                                             # green power excess
                 P_L_modif.append(P_L[i])
                 P_diesel.append(0)
                 DG_1.cur_runtime = 0
-                if GridPurchaseCost < ChargeUsingGridCost:                                                             # battery charging with the grid
-                    Pmax_bat = BattStock.get_Pmax(dt, 'ch')
-                    Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
-                    P_grid.append(abs(P_net[i]) + Pbat_ch_i)
-                    P_bat.append(- Pbat_ch_i)
-                    indic.append(4)
-                else:                                                                                                  # grid supplying only the load
-                    P_grid.append(abs(P_net[i]))
+                if BatteryChargeCost < GridSaleCost:                                                                       # selling to the grid
+                    P_grid.append(- P_net[i])
                     P_bat.append(0)
-                    indic.append(5)
-            else :                                                                                                     # grid too expensive or disconnected
-                if BatteryDischargeCost < DGUseCost:                                                                   # battery discharging
-                    Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
-                    P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
-                    P_grid.append(abs(P_net[i]) - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                    P_bat.append(Pbat_dis_i)
+                    indic.append(2)
+                else :                                                                                                     # battery charging
+                    Pbat_ch_i = BattStock.battery_stock_charge(P_net[i], dt)
+                    P_grid.append(Pbat_ch_i - P_net[i] if grid_1.state[i] == 1 else 0)
+                    P_bat.append(- Pbat_ch_i)
+                    indic.append(3)
+                GridPurchaseCost_list.append(np.inf)
+                BatteryDischargeCost_list.append(np.inf)
+                DGUseCost_list.append(np.inf)
+            else:                                                                                                          # green power deficit
+                f_cons, Pdiesel_i = DG_1.run_DG(abs(P_net[i]), dt, ActiveDevices["DieselGenerator"]) # simulation to see if running the DG is worth the effort (time series are not updated here)
+                GridPurchaseCost = grid_1.purchase_cost(TimeArray, i)
+                BatteryDischargeCost = BattStock.discharge_cost(grid_1, abs(P_net[i]), dt, ActiveDevices["Batteries"])
+                DGUseCost = DG_1.use_cost(f_cons, abs(P_net[i]), Pdiesel_i, ActiveDevices["DieselGenerator"])
+                GridPurchaseCost_list.append(GridPurchaseCost)
+                BatteryDischargeCost_list.append(BatteryDischargeCost)
+                DGUseCost_list.append(DGUseCost)
+                # print(grid_state[i],'GridSaleCost', round(GridSaleCost,3), 'BatteryChargeCost', round(BatteryChargeCost,3), 'GridPurchaseCost', round(GridPurchaseCost,3), 'BatteryDischargeCost', round(BatteryDischargeCost,3), 'DGUseCost', round(DGUseCost,3))
+                if GridPurchaseCost < BatteryDischargeCost and GridPurchaseCost < DGUseCost:                                                                                    # purchasing from the grid
+                    P_L_modif.append(P_L[i])
                     P_diesel.append(0)
                     DG_1.cur_runtime = 0
-                    indic.append(6)
-                else :                                                                                                 # running DG
-                    P_diesel.append(Pdiesel_i) # the DG is really running
-                    DG_1.cur_runtime += dt
-                    DG_1.FuelRate -= f_cons * dt / DG_1.TankCapacity
-                    if abs(P_net[i]) < Pdiesel_i:                                                                      # DG power sufficient
-                        P_L_modif.append(P_L[i])
-                        if BatteryChargeCost < GridSaleCost:                                                           # selling DG excess to the grid
-                            P_grid.append(abs(P_net[i]) - Pdiesel_i)
-                            P_bat.append(0)
-                            indic.append(7)
-                        else :                                                                                         # battery charging with DG excess
-                            Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i - abs(P_net[i]), dt)
-                            P_grid.append(abs(P_net[i]) + Pbat_ch_i - Pdiesel_i if grid_1.state[i] == 1 else 0)
-                            P_bat.append(- Pbat_ch_i)
-                            indic.append(8)
-                    else :                                                                                             # DG power unsufficient
-                        if GridPurchaseCost < BatteryDischargeCost:                                                    # purchasing from the grid
+                    if GridPurchaseCost < ChargeUsingGridCost:                                                             # battery charging with the grid
+                        Pmax_bat = BattStock.get_Pmax(dt, 'ch')
+                        Pbat_ch_i = BattStock.battery_stock_charge(Pmax_bat, dt)
+                        P_grid.append(abs(P_net[i]) + Pbat_ch_i)
+                        P_bat.append(- Pbat_ch_i)
+                        indic.append(4)
+                    else:                                                                                                  # grid supplying only the load
+                        P_grid.append(abs(P_net[i]))
+                        P_bat.append(0)
+                        indic.append(5)
+                else :                                                                                                     # grid too expensive or disconnected
+                    if BatteryDischargeCost < DGUseCost:                                                                   # battery discharging
+                        Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]), dt)
+                        P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pbat_dis_i)
+                        P_grid.append(abs(P_net[i]) - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                        P_bat.append(Pbat_dis_i)
+                        P_diesel.append(0)
+                        DG_1.cur_runtime = 0
+                        indic.append(6)
+                    else :                                                                                                 # running DG
+                        P_diesel.append(Pdiesel_i) # the DG is really running
+                        DG_1.cur_runtime += dt
+                        DG_1.FuelRate -= f_cons * dt / DG_1.TankCapacity
+                        if abs(P_net[i]) < Pdiesel_i:                                                                      # DG power sufficient
                             P_L_modif.append(P_L[i])
-                            P_grid.append(abs(P_net[i]) - Pdiesel_i)
-                            P_bat.append(0)
-                            indic.append(9)
-                        else :                                                                                         # battery discharging
-                            Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
-                            P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pdiesel_i + Pbat_dis_i) # load clipping
-                            P_grid.append(- P_net[i] - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
-                            P_bat.append(Pbat_dis_i)
-                            indic.append(10)
+                            if BatteryChargeCost < GridSaleCost:                                                           # selling DG excess to the grid
+                                P_grid.append(abs(P_net[i]) - Pdiesel_i)
+                                P_bat.append(0)
+                                indic.append(7)
+                            else :                                                                                         # battery charging with DG excess
+                                Pbat_ch_i = BattStock.battery_stock_charge(Pdiesel_i - abs(P_net[i]), dt)
+                                P_grid.append(abs(P_net[i]) + Pbat_ch_i - Pdiesel_i if grid_1.state[i] == 1 else 0)
+                                P_bat.append(- Pbat_ch_i)
+                                indic.append(8)
+                        else :                                                                                             # DG power unsufficient
+                            if GridPurchaseCost < BatteryDischargeCost:                                                    # purchasing from the grid
+                                P_L_modif.append(P_L[i])
+                                P_grid.append(abs(P_net[i]) - Pdiesel_i)
+                                P_bat.append(0)
+                                indic.append(9)
+                            else :                                                                                         # battery discharging
+                                Pbat_dis_i = BattStock.battery_stock_discharge(abs(P_net[i]) - Pdiesel_i, dt)
+                                P_L_modif.append(P_L[i] if grid_1.state[i] == 1 else P_green[i] + Pdiesel_i + Pbat_dis_i) # load clipping
+                                P_grid.append(- P_net[i] - Pdiesel_i - Pbat_dis_i if grid_1.state[i] == 1 else 0)
+                                P_bat.append(Pbat_dis_i)
+                                indic.append(10)
+            if counters is not None:
+                counters.step_end(indic[-1])
+    finally: # the devices get their methods back, even if the dispatch fails
+        if counters is not None:
+            counters.finish(indic)
+    if progress is not None: # results of the steps dispatched by this call only
+        progress.finish(len(indic))
+        TimeArray, P_L, P_green, P_net = (serie.iloc[start:start + len(indic)] for serie in (TimeArray, P_L, P_green, P_net))
 
     # OUTPUT
     # --------------------------------------------------------------------------------------------
@@ -694,6 +786,104 @@ if __name__ == "__main__":
     TSA.plot_compact(dfResNormalLFE, "test_output", False, False, False, True)
     TSA.plot_compact(dfResNormalCCE, "test_output", False, False, False, True)
 
+    # hot-path counters : same results, one visit per step, the methods of the devices are given back at the end
+    from virtualPMS.Profiling import BranchCounters
+    from copy import deepcopy
+    devices = (GridNormal, BattStockNormal, DGNormal)
+    dfResPlain, _ = CostStrat(df_TS, ActiveDevicesNormal, *deepcopy(devices), dt, 0.1, True, 48)
+    counters = BranchCounters(every=4)
+    GridCounted, BattStockCounted, DGCounted = deepcopy(devices)
+    dfResCounted, _ = CostStrat(df_TS, ActiveDevicesNormal, GridCounted, BattStockCounted, DGCounted, dt, 0.1, True, 48, counters=counters)
+    pd.testing.assert_frame_equal(dfResPlain, dfResCounted)
+    assert not {"sale_cost", "charge_cost", "run_DG"} & (set(vars(GridCounted)) | set(vars(BattStockCounted)) | set(vars(DGCounted)))
+    dfBranches = counters.branch_table()
+    assert dfBranches["visits"].sum() == num_steps and set(dfBranches["branch"]) == set(BranchLabels["CostStrat"])
+    dfCalls = counters.call_table().set_index("method")
+    assert dfCalls.loc["Grid.sale_cost", "calls"] == dfCalls.loc["BatteryStock.charge_cost", "calls"] == num_steps
+    print(dfBranches.to_string(index=False))
+    print(dfCalls.to_string())
+
+    # progress and budget : a dispatch stopped every 500 steps and resumed gives the results of the whole dispatch
+    from virtualPMS.Progress import DispatchProgress, concat, dispatch
+    from functools import partial
+    for strategy in [partial(CostStrat, ChargeUsingGridCost=0.1), partial(LFE_CCE_self_sufficiency, "cce", SOClim=0.5)]:
+        dfResWhole, allSOCsWhole = strategy(df_TS, ActiveDevicesNormal, *deepcopy(devices), dt, forecast=True, forecast_period=48)
+        infos = []
+        progress = DispatchProgress(infos.append, every=100, max_steps=500)
+        DevicesParts = deepcopy(devices)
+        parts = [strategy(df_TS, ActiveDevicesNormal, *DevicesParts, dt, forecast=True, forecast_period=48, progress=progress)]
+        while progress.stopped:
+            progress.resume()
+            parts.append(strategy(df_TS, ActiveDevicesNormal, *DevicesParts, dt, forecast=True, forecast_period=48, progress=progress))
+        assert len(parts) == -(-num_steps // 500) and len(parts[0][0]) == 500
+        dfResParts, allSOCsParts = concat(parts)
+        pd.testing.assert_frame_equal(dfResWhole, dfResParts)
+        assert allSOCsWhole == allSOCsParts and infos[-1]["step"] == num_steps
+
+    # grid cut-off all along and DG smaller than the deficit : the branches "DG insufficient + battery" run after the first chunk too
+    GridOff = Grid(np.zeros(num_steps, dtype=np.int64), pd.read_csv(Grid.GridPricesRef).set_index('Id'), pd.read_csv(Grid.GridScheduleRef))
+    DGSmall = DieselGenerator(dict(paramInDGNormal, Pmax=10, Pnom=8, Pmin=2))
+    DGSmall.find_DG_coeffs()
+    devicesOff = (GridOff, BatteryStock([Battery(dict(paramIn_batt, capacity=50))]), DGSmall)
+    df_TS_Off = df_TS.assign(**{"Grid State": GridOff.state})
+    for strategy, branch in [(partial(LFE_CCE_emergency_system, "lfe"), 7), (partial(LFE_CCE_emergency_system, "cce"), 7),
+                             (partial(LFE_CCE_self_sufficiency, "lfe"), 5), (partial(LFE_CCE_self_sufficiency, "cce"), 5)]:
+        dfResWhole, allSOCsWhole = strategy(df_TS_Off, ActiveDevicesNormal, *deepcopy(devicesOff), dt)
+        assert (dfResWhole["indic"][500:] == branch).any()
+        progress, DevicesParts = DispatchProgress(max_steps=500), deepcopy(devicesOff)
+        parts = [strategy(df_TS_Off, ActiveDevicesNormal, *DevicesParts, dt, progress=progress)]
+        while progress.stopped:
+            progress.resume()
+            parts.append(strategy(df_TS_Off, ActiveDevicesNormal, *DevicesParts, dt, progress=progress))
+        dfResParts, allSOCsParts = concat(parts)
+        pd.testing.assert_frame_equal(dfResWhole, dfResParts)
+        assert allSOCsWhole == allSOCsParts
+
+    # hot-path counters of a dispatch stopped and resumed add up ; the devices get their methods back even if the dispatch fails
+    counters, DevicesParts = BranchCounters(), deepcopy(devices)
+    dispatch(CostStrat, df_TS, ActiveDevicesNormal, *DevicesParts, dt, 0.1, True, 48, progress=DispatchProgress(), chunk_steps=500, counters=counters)
+    assert counters.branch_table()["visits"].sum() == num_steps and counters.call_table().set_index("method").loc["Grid.sale_cost", "calls"] == num_steps
+    class StopDispatch(Exception):
+        pass
+    def fail(info):
+        if info["step"] >= 200:
+            raise StopDispatch()
+    DevicesParts = deepcopy(devices)
+    try:
+        CostStrat(df_TS, ActiveDevicesNormal, *DevicesParts, dt, 0.1, True, 48, counters=BranchCounters(), progress=DispatchProgress(fail, every=100))
+        raise RuntimeError("the callback must stop the dispatch")
+    except StopDispatch:
+        pass
+    assert not {"sale_cost", "charge_cost", "run_DG"} & set().union(*(vars(device) for device in DevicesParts))
+
+    # results published during the dispatch : chunks appended to an Arrow IPC stream, readable while the dispatch goes on.
+    # A dispatch in chunks gives the results of the whole dispatch with every strategy, on both sites.
+    from virtualPMS import ResultsIO as RIO
+    from virtualPMS.Simulation import stream_chunk
+    if RIO._pyarrow() is not None:
+        import tempfile
+        cases = [(partial(CostStrat, ChargeUsingGridCost=0.1, forecast=True, forecast_period=48), df_TS, devices)]
+        for strat in ["lfe", "cce"]:
+            for strategy in [LFE_CCE_emergency_system, LFE_CCE_self_sufficiency]:
+                cases += [(partial(strategy, strat, SOClim=0.5, forecast=True, forecast_period=48), df_TS, devices),
+                          (partial(strategy, strat), df_TS_Off, devicesOff)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for k, (strategy, dfIn, devicesIn) in enumerate(cases):
+                dfResWhole, allSOCsWhole = strategy(dfIn, ActiveDevicesNormal, *deepcopy(devicesIn), dt)
+                with RIO.ArrowWriter(os.path.join(tmpdir, f"MAIN_{k}.arrows")) as writer:
+                    published = []
+                    def publish(dfPart, SOCsPart):
+                        writer.write(stream_chunk(dfPart))
+                        with RIO.read_arrow(writer.file_path) as table:
+                            published.append(table.num_rows)
+                    dfResStream, allSOCsStream = dispatch(strategy, dfIn, ActiveDevicesNormal, *deepcopy(devicesIn), dt, progress=DispatchProgress(), chunk_steps=700, on_part=publish)
+                pd.testing.assert_frame_equal(dfResWhole, dfResStream)
+                assert allSOCsWhole == allSOCsStream
+                assert published == [min(n * 700, num_steps) for n in range(1, len(published) + 1)] and published[-1] == num_steps
+                with RIO.read_arrow(writer.file_path) as table:
+                    dfRead = table.to_pandas()
+                assert np.allclose(dfRead["P_grid"], dfResWhole["P_grid"]) and dfRead["indic"].tolist() == dfResWhole["indic"].tolist()
+
     # only PV and Load
     # ----------------------------------------------
     PlotEmpty = False
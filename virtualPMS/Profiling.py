@@ -0,0 +1,484 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 11:48:02
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Profiling of a run (Simulation.py, python -m virtualPMS run) + test section.
+RunProfile records the wall time and the CPU time of every phase of a run (reading, verification, devices, dispatch, figures...), and can run
+the dispatch under cProfile. In memory mode, it also records the resident memory (RSS) and the peak of every phase, the peak of python
+allocations and the allocation sites (tracemalloc) whose memory grew the most during every phase, and the size in bytes of every column of the
+tables of the run (input, results, SOCs). Everything is saved in a JSON report per run; reports of several runs are gathered in one summary table.
+BranchCounters instruments the loop of a dispatching strategy : visits of every branch (from indic), time of a sample of the steps of
+every branch, and number of calls of the device methods (BatteryStock, DieselGenerator, Grid).
+output of a profiled run (prefix = {inputIdd}_{StratIdd}_{DevicesIdd}_F{forecast}) :
+    prefix_PROFILE.json        phases, run information, top functions of the dispatch
+    prefix_dispatch.pstats     cProfile statistics of the dispatch (snakeviz, gprof2dot, python -m pstats...)
+    prefix_dispatch.collapsed  the same as collapsed stacks ("f1;f2;f3 microseconds" lines) for flamegraph.pl, speedscope or inferno
+    profile_summary.csv        one row per profiled run, appended run after run
+'''
+#---------------------
+#%%
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import platform
+import tracemalloc
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+try:
+    import resource # peak memory of the process (not available on Windows)
+except ImportError:
+    resource = None
+
+CollapsedMaxDepth = 64 # depth of the stacks of the collapsed output
+TopAllocations = 10    # allocation sites listed per phase in memory mode
+# device methods counted by BranchCounters
+CountedMethods = {"BatteryStock": ["battery_stock_charge", "battery_stock_discharge", "get_SOC", "get_Pmax", "charge_cost", "discharge_cost"],
+                  "DieselGenerator": ["run_DG", "use_cost"],
+                  "Grid": ["sale_cost", "purchase_cost"]}
+
+def _cpu_times() -> tuple[float, float]:
+    """CPU time (user + system) of the process and of its finished child processes (figure workers), in seconds"""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+def _proc_status() -> dict:
+    """VmRSS and VmHWM (peak) of /proc/self/status in MB, empty if not available (not Linux)"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            return {line.split(":")[0]: int(line.split()[1]) / 2**10 for line in f if line.startswith(("VmRSS", "VmHWM"))}
+    except OSError:
+        return {}
+
+def _reset_peak_rss() -> bool:
+    """resets the peak resident memory of the process (Linux only), so that the next peak is the one of the phase. False if not possible"""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def rss_mb() -> tuple[float, float]:
+    """current and peak resident memory of the process in MB (None if unknown)"""
+    status = _proc_status()
+    peak = status.get("VmHWM")
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, kB on Linux
+    return status.get("VmRSS"), peak
+
+def _bytes(values) -> int:
+    """memory used by a column : numpy buffer, pandas column (with its python objects) or python list (the list and its distinct items)"""
+    if isinstance(values, pd.Series):
+        return int(values.memory_usage(index=False, deep=True))
+    if isinstance(values, np.ndarray):
+        return int(values.nbytes)
+    if isinstance(values, list):
+        return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in {id(v): v for v in values}.values())
+    return sys.getsizeof(values)
+
+def column_sizes(table, name: str) -> list[dict]:
+    """size in bytes of every column of a table
+
+    Args:
+        table (pd.DataFrame or dict): table of the run (dict of lists, arrays or Series, as allSOCs)
+        name (str): name of the table in the report
+
+    Returns:
+        list[dict]: one {"table", "column", "type", "rows", "bytes"} per column
+    """
+    rows = []
+    for col in table.keys():
+        values = table[col]
+        dtype = str(values.dtype) if hasattr(values, "dtype") else type(values).__name__
+        rows.append({"table": name, "column": str(col), "type": dtype, "rows": len(values) if hasattr(values, "__len__") else 1, "bytes": _bytes(values)})
+    return rows
+
+class RunProfile:
+    def __init__(self, enabled: bool = True, cprofile: bool = False, memory: bool = False):
+        """profile of one run. Phases follow one another : begin() ends the running phase and starts the next one.
+        A disabled profile records nothing and costs nothing, so that Simulation.py calls it the same way in every run.
+
+        Args:
+            enabled (bool, optional): records the phases. Defaults to True.
+            cprofile (bool, optional): runs the dispatch (see run()) under cProfile. Defaults to False.
+            memory (bool, optional): memory mode : RSS, peaks and allocation sites of every phase (tracemalloc slows the run down). Defaults to False.
+        """
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.memory = enabled and memory
+        self.phases = []   # {"phase", "wall_s", "cpu_s", "children_cpu_s"} (+ memory) in order of execution
+        self.info = {}     # description of the run
+        self.stats = None  # pstats.Stats of the dispatch
+        self.sizes = []    # size of the columns of the tables of the run (memory mode)
+        self.counters = BranchCounters() if enabled else None # hot-path counters of the dispatch, given to the strategy by Simulation.py
+        self._current = None
+        self._t0 = time.time()
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._snapshot = self._take_snapshot()
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def begin(self, phase: str):
+        """ends the running phase (if any) and starts *phase*"""
+        if not self.enabled:
+            return
+        self.end()
+        if self.memory:
+            self._peak_reset = _reset_peak_rss()
+            tracemalloc.reset_peak()
+            self._rss_start = rss_mb()[0]
+        self._current = (phase, time.perf_counter(), *_cpu_times())
+
+    def end(self):
+        """ends the running phase"""
+        if not self.enabled or self._current is None:
+            return
+        phase, wall, cpu, children = self._current
+        cpu_end, children_end = _cpu_times()
+        record = {"phase": phase, "wall_s": time.perf_counter() - wall, "cpu_s": cpu_end - cpu, "children_cpu_s": children_end - children}
+        if self.memory:
+            rss, peak = rss_mb()
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            # allocation sites whose memory grew the most during the phase (allocated and still alive at its end)
+            snapshot = self._take_snapshot()
+            growth = [stat for stat in snapshot.compare_to(self._snapshot, 'lineno') if stat.size_diff > 0][:TopAllocations]
+            self._snapshot = snapshot
+            # peak_rss_mb is the peak of the phase if it could be reset (Linux), the peak of the process since its start otherwise
+            record.update({"rss_start_mb": self._rss_start, "rss_end_mb": rss, "peak_rss_mb": peak, "peak_of_phase": self._peak_reset,
+                           "traced_mb": traced / 2**20, "traced_peak_mb": traced_peak / 2**20,
+                           "top_allocations": [{"site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                                                "file": stat.traceback[0].filename, "growth_mb": stat.size_diff / 2**20, "mb": stat.size / 2**20,
+                                                "blocks": stat.count} for stat in growth]})
+        self.phases.append(record)
+        self._current = None
+
+    def add_sizes(self, table, name: str):
+        """records the size of every column of a table of the run (memory mode only), see column_sizes()"""
+        if self.memory:
+            self.sizes += column_sizes(table, name)
+
+    def run(self, func, *args, **kwargs):
+        """calls func(*args, **kwargs), under cProfile if asked. The statistics of several calls (chunks of a dispatch) add up.
+
+        Returns:
+            the output of func
+        """
+        if not self.cprofile:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            self.stats = pstats.Stats(profiler) if self.stats is None else self.stats.add(profiler)
+
+    def report(self, top: int = 20) -> dict:
+        """structured report of the run
+
+        Args:
+            top (int, optional): number of functions of the dispatch listed (by cumulative time, if run under cProfile). Defaults to 20.
+
+        Returns:
+            dict: run (information), phases, total, top (cProfile only), sizes (memory mode only)
+        """
+        self.end()
+        total = {key: sum(p[key] for p in self.phases) for key in ["wall_s", "cpu_s", "children_cpu_s"]}
+        if self.memory:
+            total["peak_rss_mb"] = max((p["peak_rss_mb"] for p in self.phases if p["peak_rss_mb"] is not None), default=None)
+            total["traced_peak_mb"] = max((p["traced_peak_mb"] for p in self.phases), default=None)
+        out = {"run": {"date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._t0)), "python": platform.python_version(),
+                       "machine": platform.machine(), "argv": sys.argv, **self.info},
+               "phases": self.phases, "total": total}
+        if self.stats is not None:
+            rows = sorted(self.stats.stats.items(), key=lambda item: -item[1][3])[:top]
+            out["top"] = [{"function": _label(func), "ncalls": nc, "tottime_s": tt, "cumtime_s": ct} for func, (cc, nc, tt, ct, callers) in rows]
+        if self.memory:
+            out["sizes"] = self.sizes
+        if self.counters is not None and self.counters.indic:
+            out["branches"] = self.counters.branch_table().to_dict('records')
+            out["calls"] = self.counters.call_table().to_dict('records')
+        return out
+
+    def save(self, prefix: str, summary_path: str = None) -> dict:
+        """saves the report (prefix_PROFILE.json), the cProfile statistics of the dispatch (prefix_dispatch.pstats and .collapsed)
+        and appends the run to the summary table
+
+        Args:
+            prefix (str): path of the output files, without extension
+            summary_path (str, optional): summary table (.csv) the run is appended to. Defaults to None (no summary).
+
+        Returns:
+            dict: the report (None if the profile is disabled)
+        """
+        if not self.enabled:
+            return None
+        report = self.report()
+        with open(prefix + "_PROFILE.json", 'w', encoding="utf-8") as f:
+            json.dump(report, f, indent=1, default=str)
+        if self.stats is not None:
+            self.stats.dump_stats(prefix + "_dispatch.pstats")
+            write_collapsed(self.stats, prefix + "_dispatch.collapsed")
+        if summary_path is not None:
+            append_summary(report, summary_path)
+        print("profile saved at", prefix + "_PROFILE.json")
+        print(pd.DataFrame(report["phases"]).drop(columns=["top_allocations"], errors='ignore').to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        if self.memory:
+            dfSizes = pd.DataFrame(report["sizes"], columns=["table", "column", "type", "rows", "bytes"])
+            print(dfSizes.groupby("table")["bytes"].sum().div(2**20).rename("MB").to_string(float_format=lambda x: f"{x:.3f}"))
+        if "branches" in report:
+            print(pd.DataFrame(report["branches"]).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+            print(pd.DataFrame(report["calls"]).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        return report
+
+class BranchCounters:
+    def __init__(self, every: int = 16):
+        """hot-path counters of a dispatching strategy (argument counters of the strategies of DispatchingStrats).
+        Visits of every branch are counted from indic at the end of the run, one step out of *every* is timed, and the device methods
+        listed in CountedMethods are wrapped by counting functions during the run only (the classes are not modified).
+
+        Args:
+            every (int, optional): one step out of *every* is timed (1 = every step). Defaults to 16.
+        """
+        assert(every >= 1)
+        self.every = every
+        self.labels = {}                      # branch (indic value) -> description
+        self.indic = []                       # branch of every step
+        self.calls = defaultdict(int)         # 'Class.method' -> number of calls
+        self.sampled = defaultdict(list)      # branch -> durations of the timed steps (s)
+        self._attached = []
+        self._t = None
+
+    def begin(self, labels: dict, *devices):
+        """starts counting (called by the strategy before its loop)
+
+        Args:
+            labels (dict): description of the branches of the strategy (indic value -> text)
+            *devices: devices whose methods are counted (grid, battery stock, DG)
+        """
+        self.labels = labels
+        for device in devices:
+            for name in CountedMethods.get(type(device).__name__, []):
+                if not hasattr(device, name):
+                    continue
+                key = f"{type(device).__name__}.{name}"
+                def counted(*args, _method=getattr(device, name), _key=key, **kwargs):
+                    self.calls[_key] += 1
+                    return _method(*args, **kwargs)
+                setattr(device, name, counted) # instance attribute : hides the method of the class
+                self._attached.append((device, name))
+
+    def step_start(self, i: int):
+        """called at the start of step i : starts the timer of the sampled steps"""
+        self._t = time.perf_counter() if i % self.every == 0 else None
+
+    def step_end(self, branch: int):
+        """called at the end of a step, with the branch it went through"""
+        if self._t is not None:
+            self.sampled[branch].append(time.perf_counter() - self._t)
+
+    def finish(self, indic: list):
+        """stops counting (called by the strategy after its loop, even if it failed) : the devices get their methods back.
+        The branches of a dispatch stopped and resumed (see Progress) add up, call after call."""
+        for device, name in self._attached:
+            delattr(device, name)
+        self._attached = []
+        self.indic += list(indic)
+
+    def branch_table(self) -> pd.DataFrame:
+        """one row per branch : visits, share of the steps, mean length of the runs of consecutive steps in the branch (long runs
+        could be fast-forwarded), timed steps, mean time per step and estimated total time of the branch"""
+        indic = np.asarray(self.indic)
+        if len(indic) == 0:
+            return pd.DataFrame(columns=["branch", "label", "visits", "share", "mean_run", "timed", "us_per_step", "est_total_s"])
+        starts = np.flatnonzero(np.diff(indic, prepend=indic[0] - 1)) # first step of every run of the same branch
+        runs = pd.Series(np.diff(np.append(starts, len(indic)))).groupby(indic[starts]).mean()
+        rows = []
+        for branch in sorted(set(self.labels) | set(np.unique(indic).tolist())):
+            visits = int((indic == branch).sum())
+            timed = self.sampled.get(branch, [])
+            mean = float(np.mean(timed)) if timed else np.nan
+            rows.append({"branch": branch, "label": self.labels.get(branch, ""), "visits": visits, "share": visits / len(indic),
+                         "mean_run": float(runs.get(branch, 0)), "timed": len(timed), "us_per_step": mean * 1e6, "est_total_s": mean * visits})
+        return pd.DataFrame(rows)
+
+    def call_table(self) -> pd.DataFrame:
+        """one row per counted device method : calls and calls per step"""
+        steps = max(len(self.indic), 1)
+        return pd.DataFrame([{"method": key, "calls": n, "per_step": n / steps} for key, n in sorted(self.calls.items())], columns=["method", "calls", "per_step"])
+
+def _label(func: tuple) -> str:
+    """name of a function of pstats : 'file:line(name)' or the builtin name"""
+    file, line, name = func
+    return name if file == '~' else f"{os.path.basename(file)}:{line}({name})"
+
+def write_collapsed(stats: pstats.Stats, path: str):
+    """writes cProfile statistics as collapsed stacks ('root;caller;callee microseconds' lines, input of flamegraph.pl, speedscope, inferno).
+    cProfile only knows the caller -> callee edges, not the whole stacks : the time of a function called from several places is
+    shared between its callers in proportion of the time each caller spent in it.
+
+    Args:
+        stats (pstats.Stats): statistics (RunProfile.stats)
+        path (str): path of the .collapsed file
+    """
+    children = defaultdict(list)
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller in callers:
+            children[caller].append(func)
+    roots = [func for func, value in stats.stats.items() if not value[4]]
+    lines = defaultdict(float)
+
+    def walk(func, stack, ratio):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        stack = stack + [_label(func).replace(";", ":")]
+        lines[";".join(stack)] += tt * ratio
+        if len(stack) >= CollapsedMaxDepth:
+            return
+        for child in children[func]:
+            child_ct = stats.stats[child][3]
+            if child_ct <= 0 or _label(child).replace(";", ":") in stack: # recursion : already counted in the caller
+                continue
+            walk(child, stack, ratio * min(stats.stats[child][4][func][3] / child_ct, 1))
+
+    for root in roots:
+        walk(root, [], 1)
+    with open(path, 'w', encoding="utf-8") as f:
+        for stack, seconds in lines.items():
+            if round(seconds * 1e6) > 0:
+                f.write(f"{stack} {round(seconds * 1e6)}\n")
+
+def summary_row(report: dict) -> dict:
+    """one row of the summary table : run information, wall time of every phase and totals"""
+    row = {key: value for key, value in report["run"].items() if not isinstance(value, (list, dict))}
+    row.update({f"{p['phase']}_s": p["wall_s"] for p in report["phases"]})
+    row.update({f"{p['phase']}_peak_mb": p["peak_rss_mb"] for p in report["phases"] if "peak_rss_mb" in p})
+    row.update({f"total_{key}": value for key, value in report["total"].items()})
+    return row
+
+def append_summary(report: dict, summary_path: str) -> pd.DataFrame:
+    """appends a run to the summary table (.csv), adding the columns of new phases if needed
+
+    Returns:
+        pd.DataFrame: the summary table
+    """
+    dfRow = pd.DataFrame([summary_row(report)])
+    if os.path.isfile(summary_path):
+        dfSummary = pd.read_csv(summary_path)
+        if list(dfSummary.columns) == list(dfRow.columns):
+            dfRow.to_csv(summary_path, mode='a', header=False, index=False)
+            return pd.concat([dfSummary, dfRow], ignore_index=True)
+        dfRow = pd.concat([dfSummary, dfRow], ignore_index=True) # new columns : the table is written again
+    dfRow.to_csv(summary_path, index=False)
+    return dfRow
+
+def summary_table(report_paths: list[str]) -> pd.DataFrame:
+    """gathers JSON reports (prefix_PROFILE.json) of several runs in one table, one row per run"""
+    rows = []
+    for path in report_paths:
+        with open(path, encoding="utf-8") as f:
+            rows.append(summary_row(json.load(f)))
+    return pd.DataFrame(rows)
+
+#%% TEST SECTION
+if __name__ == "__main__":
+    import tempfile
+    print("\n --- testing Profiling ---\n")
+
+    def busy(n):
+        return sum(np.sqrt(i) for i in range(n))
+    def nested(n):
+        return busy(n) + busy(n // 2)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        summary_path = os.path.join(tmpdir, "profile_summary.csv")
+        for k in range(2):
+            profile = RunProfile(cprofile=True)
+            profile.info = {"input": "test", "steps": 1000}
+            profile.begin("read")
+            time.sleep(0.05)                      # wall time without CPU time
+            profile.begin("dispatch")
+            out = profile.run(nested, 20000)
+            profile.begin("extra" if k else "figures")
+            busy(1000)
+            report = profile.save(os.path.join(tmpdir, f"run{k}"), summary_path)
+            assert [p["phase"] for p in report["phases"]] == ["read", "dispatch", "extra" if k else "figures"]
+            read, dispatch = report["phases"][0], report["phases"][1]
+            assert read["wall_s"] >= 0.05 and read["cpu_s"] < read["wall_s"]
+            assert dispatch["cpu_s"] > 0 and abs(report["total"]["wall_s"] - sum(p["wall_s"] for p in report["phases"])) < 1e-12
+            assert any("busy" in f["function"] for f in report["top"])
+        # collapsed stacks : busy() is called under nested(), and the time of nested() is shared between its callees
+        with open(os.path.join(tmpdir, "run1_dispatch.collapsed"), encoding="utf-8") as f:
+            stacks = dict(line.rsplit(" ", 1) for line in f.read().splitlines())
+        assert any(s.split(";")[-1].endswith("(busy)") and "(nested)" in s for s in stacks)
+        assert abs(sum(int(v) for v in stacks.values()) / 1e6 - profile.stats.total_tt) < 0.01 * profile.stats.total_tt + 1e-3
+        # summary : one row per run, the new phase of the second run adds a column
+        dfSummary = pd.read_csv(summary_path)
+        assert len(dfSummary) == 2 and {"read_s", "dispatch_s", "figures_s", "extra_s"} <= set(dfSummary.columns)
+        assert np.isnan(dfSummary["extra_s"][0]) and np.isnan(dfSummary["figures_s"][1])
+        dfTable = summary_table([os.path.join(tmpdir, f"run{k}_PROFILE.json") for k in range(2)])
+        assert np.allclose(dfTable["dispatch_s"], dfSummary["dispatch_s"])
+        # disabled profile : nothing recorded
+        off = RunProfile(enabled=False)
+        off.begin("read")
+        assert off.run(busy, 10) == busy(10) and off.save(os.path.join(tmpdir, "off")) is None and not os.path.exists(os.path.join(tmpdir, "off_PROFILE.json"))
+        print(dfSummary.to_string())
+
+        # memory mode : peaks of every phase, allocation sites alive at the end of a phase, size of the columns of the tables
+        profile = RunProfile(memory=True)
+        profile.begin("lists")
+        kept = [float(i) for i in range(2 * 10**5)]              # alive at the end of the phase : top allocation site
+        profile.begin("temporary")
+        tmp = np.ones(25 * 2**20); tmp += 1; del tmp             # 200 MB freed before the end of the phase
+        profile.begin("after")
+        dfTable = pd.DataFrame({"P": np.zeros(1000), "Time": pd.date_range("2025-01-01", periods=1000, freq="h"), "name": ["bat"] * 1000})
+        profile.add_sizes(dfTable, "results")
+        profile.add_sizes({"bat_0": kept[:1000]}, "allSOCs")
+        report = profile.save(os.path.join(tmpdir, "mem"), summary_path)
+        lists, temporary, after = report["phases"]
+        assert lists["top_allocations"][0]["site"].startswith("Profiling.py") and lists["top_allocations"][0]["growth_mb"] > 4
+        assert temporary["traced_peak_mb"] >= 200 and temporary["traced_mb"] < 50
+        if temporary["peak_rss_mb"] is not None:
+            assert temporary["peak_rss_mb"] - temporary["rss_start_mb"] >= 150
+            if after["peak_of_phase"]:                                       # peak reset between phases (Linux)
+                assert after["peak_rss_mb"] < temporary["peak_rss_mb"] - 150
+        sizes = {(row["table"], row["column"]): row for row in report["sizes"]}
+        assert sizes[("results", "P")]["bytes"] == 8000 and pd.api.types.is_datetime64_dtype(np.dtype(sizes[("results", "Time")]["type"]))
+        assert sizes[("results", "name")]["bytes"] > 8000 and sizes[("allSOCs", "bat_0")]["bytes"] > 8000 + 24 * 1000
+        assert "temporary_peak_mb" in pd.read_csv(summary_path).columns
+        tracemalloc.stop()
+
+        # hot-path counters : branches from indic, timed steps, calls of the methods of the devices, methods given back at the end
+        class DieselGenerator:
+            def run_DG(self, P):
+                return min(P, 10)
+        dg = DieselGenerator()
+        counters = BranchCounters(every=2)
+        counters.begin({1: "excess", 2: "deficit", 3: "never"}, dg)
+        indic = []
+        for i, P in enumerate([5, 20, 30, -1, 40, -2]):
+            counters.step_start(i)
+            indic.append(1 if P < 0 else 2 if dg.run_DG(P) == 10 else 3)
+            counters.step_end(indic[-1])
+        counters.finish(indic)
+        assert "run_DG" not in vars(dg)
+        dfBranches = counters.branch_table().set_index("branch")
+        assert dfBranches["visits"].to_dict() == {1: 2, 2: 3, 3: 1} and dfBranches.loc[3, "label"] == "never"
+        assert dfBranches["mean_run"].to_dict() == {1: 1, 2: 1.5, 3: 1} and dfBranches["timed"].sum() == 3
+        assert counters.call_table().to_dict('records') == [{"method": "DieselGenerator.run_DG", "calls": 4, "per_step": 4 / 6}]
+        report = RunProfile()
+        report.counters = counters
+        assert [row["visits"] for row in report.report()["branches"]] == [2, 3, 1]
+        counters.begin({1: "excess", 2: "deficit", 3: "never"}, dg)    # resumed dispatch : the counts add up
+        dg.run_DG(5)
+        counters.finish([3])
+        assert counters.branch_table().set_index("branch")["visits"].to_dict() == {1: 2, 2: 3, 3: 2} and counters.calls["DieselGenerator.run_DG"] == 5
+# %%
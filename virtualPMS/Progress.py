@@ -0,0 +1,218 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 15:20:37
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Progress, ETA and budget of a dispatch (argument progress of the strategies of DispatchingStrats) + test section.
+Every *every* steps, the strategy calls DispatchProgress.tick : the callback gets the step, the throughput and the ETA, and the budget
+(seconds and/or steps) is checked. When the budget is spent, the strategy stops cleanly before the current step and returns the results
+of the steps done. All the state of a dispatch between two steps is in the devices (SOCs, fuel, DG runtime) : calling the strategy again
+with the same input, the same devices and the same DispatchProgress after resume() dispatches the remaining steps, and concat() joins the parts.
+dispatch() runs a strategy in chunks this way, and hands the results of every chunk to a function as soon as they are dispatched.
+Nothing is checked when the strategy is called without progress (progress=None).
+'''
+#---------------------
+#%%
+import sys
+import time
+import pandas as pd
+
+class DispatchProgress:
+    def __init__(self, callback=None, every: int = 1000, max_seconds: float = None, max_steps: int = None):
+        """progress and budget of a dispatch.
+
+        Args:
+            callback (function, optional): called every *every* steps and at the end with a dict (see info). Defaults to None (budget only).
+            every (int, optional): number of steps between two calls of the callback / checks of the budget. Defaults to 1000.
+            max_seconds (float, optional): the dispatch stops after this time, checked every *every* steps. Defaults to None (no limit).
+            max_steps (int, optional): the dispatch stops after this number of steps. Defaults to None (no limit).
+        """
+        assert every >= 1, "!!! every must be >= 1 !!!"
+        assert max_seconds is None or max_seconds >= 0, "!!! max_seconds must be >= 0 !!!"
+        assert max_steps is None or max_steps >= 0, "!!! max_steps must be >= 0 !!!"
+        self.callback = callback
+        self.every = every
+        self.max_seconds = max_seconds
+        self.max_steps = max_steps
+        self.start = 0        # first step of the current call of the strategy
+        self.stop = 0         # last step (excluded) allowed by max_steps
+        self.steps = 0        # number of steps of the whole input
+        self.next_step = 0    # first step not dispatched yet
+        self.reason = None    # None (finished), 'max_seconds' or 'max_steps'
+        self._t0 = None
+
+    @property
+    def stopped(self) -> bool:
+        """True when the budget stopped the dispatch before the end of the input"""
+        return self.next_step < self.steps
+
+    @property
+    def state(self) -> dict:
+        """state of the dispatch (saved with the partial results, for example in an index of runs)"""
+        return {"next_step": self.next_step, "steps": self.steps, "stopped": self.stopped, "reason": self.reason}
+
+    def begin(self, steps: int) -> tuple[int, int]:
+        """called by the strategy before its loop
+
+        Args:
+            steps (int): number of steps of the input
+
+        Returns:
+            int, int: first and last (excluded) steps of the loop
+        """
+        assert 0 <= self.next_step <= steps, "!!! the input has changed since the dispatch was stopped !!!"
+        self.steps = steps
+        self.start = self.next_step
+        self.stop = steps if self.max_steps is None else min(steps, self.start + self.max_steps)
+        self.reason = None
+        self._t0 = time.perf_counter()
+        return self.start, self.stop
+
+    def info(self, i: int) -> dict:
+        """progress at step i : step, steps, done (steps done by this call), elapsed_s, steps_per_s, eta_s (to the end of the input), fraction,
+        last (True for the call of the callback at the end of the strategy)"""
+        elapsed = time.perf_counter() - self._t0
+        done = i - self.start
+        rate = done / elapsed if done and elapsed > 0 else None
+        return {"step": i, "steps": self.steps, "done": done, "elapsed_s": elapsed, "steps_per_s": rate,
+                "eta_s": (self.steps - i) / rate if rate else None, "fraction": i / self.steps if self.steps else 1., "last": False}
+
+    def tick(self, i: int) -> bool:
+        """called by the strategy every *every* steps, before dispatching step i
+
+        Returns:
+            bool: False when the time budget is spent (the strategy stops before step i)
+        """
+        info = self.info(i)
+        if self.callback is not None:
+            self.callback(info)
+        if self.max_seconds is not None and info["elapsed_s"] >= self.max_seconds:
+            self.reason = 'max_seconds'
+            return False
+        return True
+
+    def finish(self, done: int):
+        """called by the strategy after its loop with the number of steps it dispatched"""
+        self.next_step = self.start + done
+        if self.next_step < self.steps and self.reason is None:
+            self.reason = 'max_steps'
+        if self.callback is not None:
+            self.callback(dict(self.info(self.next_step), last=True))
+
+    def resume(self):
+        """a new budget for the next call of the strategy, which will dispatch from next_step"""
+        assert self.stopped, "!!! nothing to resume : the dispatch is finished !!!"
+        self.reason = None
+
+def print_progress(info: dict):
+    """callback printing the progress on one line of stderr"""
+    rate = f"{info['steps_per_s']:.0f} steps/s" if info["steps_per_s"] else "- steps/s"
+    eta = f"ETA {info['eta_s']:.1f} s" if info["eta_s"] is not None else "ETA -"
+    print(f"\rstep {info['step']}/{info['steps']} ({info['fraction']:.0%})  {rate}  {eta}  ", end='\n' if info["last"] else '', file=sys.stderr, flush=True)
+
+def concat(parts: list[tuple[pd.DataFrame, dict]]) -> tuple[pd.DataFrame, dict]:
+    """joins the results of a dispatch stopped and resumed
+
+    Args:
+        parts (list): (dfOut_TS, allSOCs) returned by every call of the strategy, in order
+
+    Returns:
+        pd.DataFrame, dict: results of the whole dispatch
+    """
+    dfOut_TS = pd.concat([dfRes for dfRes, _ in parts])
+    allSOCs = {bat_name: [soc for _, SOCs in parts for soc in SOCs[bat_name]] for bat_name in parts[0][1]}
+    return dfOut_TS, allSOCs
+
+def dispatch(strategy, *args, progress: DispatchProgress, chunk_steps: int = None, on_part=None, **kwargs) -> tuple[pd.DataFrame, dict]:
+    """calls a strategy of DispatchingStrats chunk after chunk : at most chunk_steps steps per call, then resume() and the next call.
+    on_part gets the results of every chunk as soon as they are dispatched (to publish the results of a long dispatch while it goes on).
+    The budget of progress (max_seconds, max_steps) is the budget of the whole dispatch, not of one chunk.
+
+    Args:
+        strategy (function): strategy of DispatchingStrats (or a function calling it, like Profiling.RunProfile.run)
+        *args, **kwargs: arguments of strategy, progress excluded
+        progress (DispatchProgress): progress and budget of the whole dispatch
+        chunk_steps (int, optional): maximum number of steps of a chunk. Defaults to None (one chunk, unless the budget stops the dispatch).
+        on_part (function, optional): called with (dfOut_TS, allSOCs) of every chunk. Defaults to None.
+
+    Returns:
+        pd.DataFrame, dict: results of the steps dispatched (see concat())
+    """
+    assert chunk_steps is None or chunk_steps >= 1, "!!! chunk_steps must be >= 1 !!!"
+    max_seconds, max_steps = progress.max_seconds, progress.max_steps
+    t0, done, parts = time.perf_counter(), 0, []
+    try:
+        while True:
+            if max_seconds is not None: # what is left of the budget of the whole dispatch
+                progress.max_seconds = max(0., max_seconds - (time.perf_counter() - t0))
+            if chunk_steps is not None:
+                progress.max_steps = chunk_steps if max_steps is None else min(chunk_steps, max_steps - done)
+            parts.append(strategy(*args, progress=progress, **kwargs))
+            done += len(parts[-1][0])
+            if on_part is not None:
+                on_part(*parts[-1])
+            if not progress.stopped or progress.reason == 'max_seconds' or (max_steps is not None and done >= max_steps):
+                break
+            progress.resume()
+    finally:
+        progress.max_seconds, progress.max_steps = max_seconds, max_steps
+    return parts[0] if len(parts) == 1 else concat(parts)
+
+# test section
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+    # fake strategy using the protocol of DispatchingStrats
+    def strategy(values, progress=None):
+        out = []
+        start, stop = (0, len(values)) if progress is None else progress.begin(len(values))
+        for i in range(start, stop):
+            if progress is not None and (i - start) % progress.every == 0 and not progress.tick(i):
+                break
+            out.append(values[i] * 2)
+            time.sleep(0.001)
+        if progress is not None:
+            progress.finish(len(out))
+        return out
+
+    values = list(range(100))
+    assert strategy(values) == [v * 2 for v in values]
+    # step budget : 3 calls, the parts join into the whole result
+    infos = []
+    progress = DispatchProgress(infos.append, every=10, max_steps=40)
+    parts = [strategy(values, progress)]
+    assert progress.stopped and progress.reason == 'max_steps' and progress.state["next_step"] == 40
+    while progress.stopped:
+        progress.resume()
+        parts.append(strategy(values, progress))
+    assert [len(p) for p in parts] == [40, 40, 20] and sum(parts, []) == [v * 2 for v in values] and progress.reason is None
+    assert [info["step"] for info in infos[:5]] == [0, 10, 20, 30, 40] and infos[4]["eta_s"] > 0 and infos[4]["last"]
+    # time budget : stops at a multiple of every
+    progress = DispatchProgress(print_progress, every=5, max_seconds=0.02)
+    part = strategy(values, progress)
+    assert progress.reason == 'max_seconds' and len(part) % 5 == 0 and 0 < len(part) < 100
+    try:
+        DispatchProgress(every=5).resume()
+        raise RuntimeError("resume of a finished dispatch")
+    except AssertionError:
+        pass
+    # chunks of a dispatch : the parts are published as soon as they are dispatched, the budget is the budget of the whole dispatch
+    def frame_strategy(values, progress=None):
+        out = strategy(values, progress)
+        return pd.DataFrame({"P": out}, index=range(progress.start, progress.start + len(out))), {"bat_0": out}
+    published = []
+    progress = DispatchProgress(every=5)
+    dfRes, allSOCs = dispatch(frame_strategy, values, progress=progress, chunk_steps=30, on_part=lambda df, socs: published.append(len(df)))
+    assert published == [30, 30, 30, 10] and dfRes["P"].tolist() == allSOCs["bat_0"] == [v * 2 for v in values] and not progress.stopped
+    published = []
+    progress = DispatchProgress(every=5, max_steps=70)
+    dfRes, _ = dispatch(frame_strategy, values, progress=progress, chunk_steps=30, on_part=lambda df, socs: published.append(len(df)))
+    assert published == [30, 30, 10] and len(dfRes) == 70 and progress.stopped and progress.reason == 'max_steps' and progress.max_steps == 70
+    progress = DispatchProgress(every=5, max_seconds=0.05)
+    dfRes, _ = dispatch(frame_strategy, values, progress=progress, chunk_steps=10)
+    assert progress.reason == 'max_seconds' and 0 < len(dfRes) < 100 and dfRes.index.tolist() == list(range(len(dfRes)))
+    # concat of the results of a strategy
+    dfA, dfB = pd.DataFrame({"P": [1., 2.]}), pd.DataFrame({"P": [3.]}, index=[2])
+    dfRes, allSOCs = concat([(dfA, {"bat_0": [0.1, 0.2]}), (dfB, {"bat_0": [0.3]})])
+    assert dfRes["P"].tolist() == [1., 2., 3.] and dfRes.index.tolist() == [0, 1, 2] and allSOCs == {"bat_0": [0.1, 0.2, 0.3]}
+# %%
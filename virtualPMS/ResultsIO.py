@@ -0,0 +1,466 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-18 10:05:41
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Writing and reading of result time series (the data behind the figures of TimeSeriesAnalysis) + test section.
+
+    available formats (columns of the "outputFormat" sheet) :
+
+    - '.csv' : text, readable by any software. Slow and bulky for long time series, dates are saved as text.
+    - '.parquet' : columnar, zstd compression. Smallest files, dtypes are kept (needs pyarrow).
+    - '.feather' : columnar Arrow file, uncompressed : reloaded as a memory map, without any parsing (needs pyarrow).
+    - '.npz' : one numpy array per column, uncompressed : reloaded as memory maps, without any parsing (numpy only).
+    - '.arrow' : Arrow IPC file written in record batches : reloaded as a memory map by Arrow-based tools, without any parsing (needs pyarrow).
+
+    pyarrow is optional : if it is missing, '.parquet', '.feather' and '.arrow' results are saved as '.npz' instead.
+
+    ArrowWriter writes result time series incrementally, chunk after chunk, to an Arrow IPC file ('.arrow') or stream ('.arrows') :
+    a stream can be read while it is being written (partial results of a running simulation).
+
+    archive mode ("archive" parameter of the "main" sheet) : RunArchive saves every result of a run in a single .zip file
+    (time series, KPIs and run parameters), instead of one file per dataset and format.
+'''
+#---------------------
+#%%
+import os
+import json
+import contextlib
+import zipfile
+import numpy as np
+import pandas as pd
+
+DataFormats = ['.csv', '.parquet', '.feather', '.npz', '.arrow']
+ArrowChunkRows = 1 << 16 # rows of the record batches of Arrow IPC files
+
+def _pyarrow():
+    """imports pyarrow when it is needed (optional dependency), None if it is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.feather
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+def formats_from_sheet(outFSheet: pd.DataFrame, dataset: str, csv: bool = True) -> list[str]:
+    """data formats requested for one row of the "outputFormat" sheet
+
+    Args:
+        outFSheet (pd.DataFrame): output of inpReading.VerifoutFSheet()
+        dataset (str): row of the sheet ('mainVar', 'allVar', 'allSOCs', 'costs'...)
+        csv (bool, optional): False to leave out '.csv' (formats argument of the plot functions, whose .csv is requested by their csv flag). Defaults to True.
+
+    Returns:
+        list[str]: extensions among DataFormats, e.g. ['.csv', '.parquet']
+    """
+    return [fmt for fmt in DataFormats if fmt in outFSheet.columns and outFSheet[fmt][dataset] and (csv or fmt != '.csv')]
+
+def _npz_columns(dfResults: pd.DataFrame) -> dict:
+    """columns as numpy arrays that can be saved without pickle (object columns are saved as strings)"""
+    columns = {}
+    for col in dfResults.columns:
+        values = np.asarray(dfResults[col].to_numpy())
+        columns[str(col)] = values.astype(str) if values.dtype == object else values
+    return columns
+
+def write_results(dfResults: pd.DataFrame, file_name: str, formats: list[str]) -> list[str]:
+    """saves result time series in one or several formats
+
+    Args:
+        dfResults (pd.DataFrame): time series (dict of array-like also accepted)
+        file_name (str): path of the output files, without extension
+        formats (list[str]): extensions among DataFormats
+
+    Returns:
+        list[str]: paths of the saved files
+    """
+    dfResults = pd.DataFrame(dfResults)
+    saved = []
+    for fmt in formats:
+        assert fmt in DataFormats, f"!!! unknown result format {fmt} ({' | '.join(DataFormats)}) !!!"
+        if fmt in ['.parquet', '.feather', '.arrow'] and _pyarrow() is None:
+            print(f"!!! pyarrow is not installed : {os.path.basename(file_name)}{fmt} is saved as .npz instead !!!")
+            fmt = '.npz'
+        path = file_name + fmt
+        if path in saved:
+            continue
+        if fmt == '.csv':
+            dfResults.to_csv(path)
+        elif fmt == '.npz':
+            np.savez(path, **_npz_columns(dfResults)) # uncompressed : columns can be memory mapped by read_results()
+        elif fmt == '.arrow':
+            with ArrowWriter(path) as writer:
+                writer.write(dfResults)
+        else:
+            pa = _pyarrow()
+            table = pa.Table.from_pandas(dfResults, preserve_index=False)
+            if fmt == '.parquet':
+                pa.parquet.write_table(table, path, compression='zstd')
+            else:
+                pa.feather.write_feather(table, path, compression='uncompressed')
+        saved.append(path)
+    return saved
+
+def _member_memmap(file_path: str, f, info: zipfile.ZipInfo) -> np.ndarray:
+    """opens one uncompressed .npy member of a zip file (.npz, RunArchive) as a read-only memory map
+
+    Args:
+        file_path (str): path of the zip file
+        f (file): the zip file opened in binary mode
+        info (zipfile.ZipInfo): the member
+
+    Returns:
+        np.ndarray: memory map (empty arrays are returned as plain arrays)
+    """
+    assert info.compress_type == zipfile.ZIP_STORED, f"!!! {info.filename} is compressed and can't be memory mapped !!!"
+    f.seek(info.header_offset)
+    local_header = f.read(30)                                                   # zip local file header : name and extra field lenghts at bytes 26 and 28
+    f.seek(info.header_offset + 30 + int.from_bytes(local_header[26:28], 'little') + int.from_bytes(local_header[28:30], 'little'))
+    version = np.lib.format.read_magic(f)
+    read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(f)
+    if dtype.hasobject:
+        raise ValueError(f"!!! {info.filename} contains python objects and can't be memory mapped !!!")
+    if np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=f.tell(), shape=shape, order='F' if fortran_order else 'C')
+
+def npz_memmap(file_path: str) -> dict[str, np.memmap]:
+    """opens every array of an uncompressed .npz file as a read-only memory map (np.load would read them entirely)
+
+    Args:
+        file_path (str): path of the .npz file (saved with np.savez, not np.savez_compressed)
+
+    Returns:
+        dict[str, np.memmap]: {array name: memory map}
+    """
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as f:
+        return {info.filename[:-len('.npy')]: _member_memmap(file_path, f, info) for info in archive.infolist() if info.filename.endswith('.npy')}
+
+def read_results(file_path: str, columns: list[str] = None) -> pd.DataFrame:
+    """reloads result time series saved by write_results(). '.feather' and '.npz' files are memory mapped (no parsing, no copy).
+
+    Args:
+        file_path (str): path of the saved file, with its extension
+        columns (list[str], optional): columns to read. Defaults to None (all columns).
+
+    Returns:
+        pd.DataFrame: result time series
+    """
+    fmt = os.path.splitext(file_path)[1].lower()
+    assert fmt in DataFormats + ['.arrows'], f"!!! unknown result format {fmt} ({' | '.join(DataFormats + ['.arrows'])}) !!!"
+    if fmt == '.csv':
+        if columns is None:
+            dfResults = pd.read_csv(file_path, index_col=0)
+        else: # usecols can't mix the position of the index with column names
+            wanted = {pd.read_csv(file_path, nrows=0).columns[0], *columns}
+            dfResults = pd.read_csv(file_path, index_col=0, usecols=lambda col: col in wanted)[list(columns)]
+        if "TimeArray" in dfResults.columns:
+            dfResults["TimeArray"] = pd.to_datetime(dfResults["TimeArray"])
+        return dfResults
+    if fmt == '.npz':
+        arrays = npz_memmap(file_path)
+        return pd.DataFrame({col: arrays[col] for col in (arrays.keys() if columns is None else columns)}, copy=False)
+    pa = _pyarrow()
+    assert pa is not None, f"!!! pyarrow is needed to read {file_path} !!!"
+    if fmt == '.parquet':
+        return pa.parquet.read_table(file_path, columns=columns).to_pandas()
+    if fmt in ['.arrow', '.arrows']:
+        with read_arrow(file_path) as table:
+            return (table if columns is None else table.select(columns)).to_pandas()
+    return pa.feather.read_table(file_path, columns=columns, memory_map=True).to_pandas()
+
+class ArrowWriter:
+    """incremental writer of result time series to an Arrow IPC file ('.arrow') or stream ('.arrows'). Every chunk is written as record batches
+    as soon as it is given : nothing is kept in memory, and a stream can be read (read_arrow()) while it is still being written.
+    The columns and dtypes (schema) are set by the first chunk, the next chunks are converted to it.
+    """
+    def __init__(self, file_path: str, stream: bool = None, chunk_rows: int = ArrowChunkRows):
+        """opens an Arrow IPC file or stream
+
+        Args:
+            file_path (str): path of the output file
+            stream (bool, optional): True for the IPC stream format (readable while written), False for the IPC file format (random access, readable once closed).
+                                     Defaults to None (stream if the extension is '.arrows').
+            chunk_rows (int, optional): maximum number of rows of a record batch. Defaults to ArrowChunkRows.
+        """
+        self.pa = _pyarrow()
+        assert self.pa is not None, f"!!! pyarrow is needed to write {file_path} !!!"
+        self.file_path = file_path
+        self.stream = file_path.lower().endswith('.arrows') if stream is None else stream
+        self.chunk_rows = chunk_rows
+        self.sink = None
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, chunk):
+        """writes the next rows of the time series
+
+        Args:
+            chunk (pd.DataFrame): next rows (dict of array-like also accepted)
+        """
+        table = self.pa.Table.from_pandas(pd.DataFrame(chunk), preserve_index=False)
+        if self.writer is None:
+            self.sink = self.pa.OSFile(self.file_path, 'wb')
+            self.schema = table.schema
+            self.writer = (self.pa.ipc.new_stream if self.stream else self.pa.ipc.new_file)(self.sink, self.schema)
+        elif table.schema != self.schema:
+            table = table.cast(self.schema)
+        self.writer.write_table(table, max_chunksize=self.chunk_rows)
+        if self.stream:
+            self.sink.flush() # readers see every complete chunk
+        self.rows += table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+            self.writer = None
+
+@contextlib.contextmanager
+def read_arrow(file_path: str):
+    """opens an Arrow IPC file or stream written by ArrowWriter as a memory map (no parsing, no copy). A stream still being written
+    is read up to its last complete chunk. The memory map is closed, and the file released, at the end of the with block :
+    convert or copy the table inside it.
+
+    Args:
+        file_path (str): path of the '.arrow' or '.arrows' file
+
+    Yields:
+        pyarrow.Table: the time series (.to_pandas() for a DataFrame)
+    """
+    pa = _pyarrow()
+    assert pa is not None, f"!!! pyarrow is needed to read {file_path} !!!"
+    with pa.memory_map(file_path, 'r') as source:
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid: # stream format (no footer)
+            source.seek(0)
+            reader = pa.ipc.open_stream(source)
+            batches = []
+            try:
+                for batch in reader:
+                    batches.append(batch)
+            except (pa.ArrowInvalid, OSError): # chunk being written
+                pass
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+        yield table
+
+def write_figure_bundle(file_path: str, data: dict, spec: dict):
+    """saves a figure bundle : a zip file without compression holding one .npy file per column and the layout of the figure (layout.json)
+
+    Args:
+        file_path (str): path of the bundle (usually *plot name*.vfig)
+        data (dict): {column: array-like}
+        spec (dict): layout of the figure (json-compatible, see TimeSeriesAnalysis.draw_figure())
+    """
+    columns = _npz_columns(pd.DataFrame(data))
+    with zipfile.ZipFile(file_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as bundle:
+        bundle.writestr("layout.json", json.dumps({"version": 1, "columns": list(columns.keys()), "spec": spec}, indent=1))
+        for i, values in enumerate(columns.values()):
+            with bundle.open(f"data/{i}.npy", 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(values), allow_pickle=False)
+
+def read_figure_bundle(file_path: str) -> tuple[dict, dict[str, np.ndarray]]:
+    """opens a figure bundle saved by write_figure_bundle() : the columns are memory mapped, nothing is read before being plotted.
+
+    Args:
+        file_path (str): path of the bundle
+
+    Returns:
+        tuple[dict, dict[str, np.ndarray]]: layout of the figure, {column: memory map}
+    """
+    with zipfile.ZipFile(file_path) as bundle, open(file_path, 'rb') as f:
+        layout = json.loads(bundle.read("layout.json"))
+        data = {col: _member_memmap(file_path, f, bundle.getinfo(f"data/{i}.npy")) for i, col in enumerate(layout["columns"])}
+    return layout["spec"], data
+
+def _to_json(value):
+    """json-compatible copy of a run parameter (DataFrames and Series as 'split' tables)"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return json.loads(value.to_json(orient='split', date_format='iso', default_handler=str))
+    if isinstance(value, dict):
+        return {str(key): _to_json(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(val) for val in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+class RunArchive:
+    """single-file archive of one run : every result time serie, the KPIs and a copy of the run parameters.
+    It is a zip file without compression, holding one .npy file per column : the columns are read lazily, as memory maps.
+    archive layout :
+        manifest.json               names of the series and of their columns, KPIs
+        params.json                 run parameters (sheets of the input file, strategy...)
+        series/<name>/<i>.npy       i-th column of the serie <name>
+    """
+    def __init__(self, file_path: str, mode: str = 'r'):
+        """opens a run archive
+
+        Args:
+            file_path (str): path of the archive (usually output//*run name*.zip)
+            mode (str, optional): 'r' to read an archive, 'w' to create one. Defaults to 'r'.
+        """
+        assert mode in ['r', 'w']
+        self.file_path = file_path
+        self.mode = mode
+        self.zip = zipfile.ZipFile(file_path, mode, compression=zipfile.ZIP_STORED, allowZip64=True)
+        if mode == 'r':
+            self.manifest = json.loads(self.zip.read("manifest.json"))
+        else:
+            self.manifest = {"series": {}, "kpis": {}}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.zip.fp is None:
+            return
+        if self.mode == 'w':
+            self.zip.writestr("manifest.json", json.dumps(self.manifest, indent=1))
+        self.zip.close()
+
+    # --- writing ---
+    def add_series(self, name: str, dfResults: pd.DataFrame):
+        """saves a result time serie (one .npy file per column)
+
+        Args:
+            name (str): name of the serie in the archive ('MAIN', 'AllSOCs'...)
+            dfResults (pd.DataFrame): time series (dict of array-like also accepted)
+        """
+        assert self.mode == 'w' and name not in self.manifest["series"]
+        columns = _npz_columns(pd.DataFrame(dfResults))
+        for i, values in enumerate(columns.values()):
+            with self.zip.open(f"series/{name}/{i}.npy", 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(values), allow_pickle=False)
+        self.manifest["series"][name] = list(columns.keys())
+
+    def add_kpis(self, kpis: dict):
+        """saves key performance indicators (energy sums, costs...) : {name: value} or {name: {"value": value, "unit": unit}}"""
+        assert self.mode == 'w'
+        self.manifest["kpis"].update(_to_json(kpis))
+
+    def add_params(self, params: dict):
+        """saves a machine-readable copy of the run parameters : {name: value, DataFrame or Series}"""
+        assert self.mode == 'w'
+        self.zip.writestr("params.json", json.dumps(_to_json(params), indent=1))
+
+    # --- reading ---
+    @property
+    def series(self) -> list[str]:
+        """names of the saved time series"""
+        return list(self.manifest["series"].keys())
+
+    @property
+    def kpis(self) -> dict:
+        return self.manifest["kpis"]
+
+    @property
+    def params(self) -> dict:
+        return json.loads(self.zip.read("params.json")) if "params.json" in self.zip.namelist() else {}
+
+    def columns(self, name: str) -> list[str]:
+        """columns of a saved time serie"""
+        return self.manifest["series"][name]
+
+    def read(self, name: str, columns: list[str] = None) -> pd.DataFrame:
+        """opens a saved time serie : only the requested columns are mapped, nothing is read before being used.
+
+        Args:
+            name (str): name of the serie
+            columns (list[str], optional): columns to open. Defaults to None (all columns).
+
+        Returns:
+            pd.DataFrame: the time serie (read-only memory maps)
+        """
+        all_columns = self.manifest["series"][name]
+        columns = all_columns if columns is None else columns
+        with open(self.file_path, 'rb') as f:
+            return pd.DataFrame({col: _member_memmap(self.file_path, f, self.zip.getinfo(f"series/{name}/{all_columns.index(col)}.npy")) for col in columns}, copy=False)
+
+#%% TEST SECTION
+if __name__ == "__main__":
+    import time
+    import tempfile
+    print("\n --- testing write_results() and read_results() ---\n")
+    rng = np.random.default_rng(0)
+    TimeArray = np.arange(np.datetime64('2024-01-01T00:00'), np.datetime64('2025-01-01T00:00'), np.timedelta64(1, 'm')).astype("datetime64[ns]")
+    dfRes = pd.DataFrame({"TimeArray": TimeArray, "P_L": rng.random(len(TimeArray)) * 100, "indic": rng.integers(0, 8, len(TimeArray)),
+                          "SOC": rng.random(len(TimeArray))})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_name = os.path.join(tmpdir, "year_1min")
+        for fmt in DataFormats:
+            t0 = time.perf_counter()
+            saved = write_results(dfRes, file_name, [fmt])
+            t1 = time.perf_counter()
+            dfRead = read_results(saved[0])
+            t2 = time.perf_counter()
+            assert list(dfRead.columns) == list(dfRes.columns)
+            assert np.array_equal(dfRead["TimeArray"].to_numpy(), TimeArray) and np.array_equal(dfRead["indic"].to_numpy(), dfRes["indic"].to_numpy())
+            assert np.allclose(dfRead["P_L"].to_numpy(), dfRes["P_L"].to_numpy(), rtol=1e-12)
+            print(f"{os.path.basename(saved[0]):20} {round(os.path.getsize(saved[0]) / 1e6, 1):6} MB, written in {round(t1 - t0, 3)} s, read in {round(t2 - t1, 3)} s")
+        assert isinstance(npz_memmap(file_name + '.npz')["P_L"], np.memmap)
+        for fmt in ['.csv', '.npz']:
+            dfRead = read_results(file_name + fmt, columns=["SOC", "TimeArray"])
+            assert list(dfRead.columns) == ["SOC", "TimeArray"] and np.array_equal(dfRead["TimeArray"].to_numpy(), TimeArray)
+            assert np.allclose(dfRead["SOC"].to_numpy(), dfRes["SOC"].to_numpy(), rtol=1e-12)
+
+        print("\n --- testing RunArchive ---\n")
+        archive_path = os.path.join(tmpdir, "run.zip")
+        with RunArchive(archive_path, 'w') as archive:
+            archive.add_series("MAIN", dfRes)
+            archive.add_series("AllSOCs", {"TimeArray": TimeArray, "bat_1": dfRes["SOC"]})
+            archive.add_kpis({"Load Conso": {"value": 1234.5, "unit": "kWh"}, "Fuel Consumed": {"value": np.float64(0), "unit": "L"}})
+            archive.add_params({"strategy": "coststrat", "forecast": np.bool_(False), "sheet": dfRes.head(3)})
+        with RunArchive(archive_path) as archive:
+            assert archive.series == ["MAIN", "AllSOCs"] and archive.columns("AllSOCs") == ["TimeArray", "bat_1"]
+            dfSOC = archive.read("AllSOCs", columns=["bat_1"])
+            values, memmap = dfSOC["bat_1"].to_numpy(), dfSOC["bat_1"].to_numpy()
+            while memmap is not None and not isinstance(memmap, np.memmap):    # pandas may view the memory map through several arrays
+                memmap = memmap.base
+            assert memmap is not None and np.shares_memory(values, memmap) and os.path.samefile(memmap.filename, archive_path)
+            assert np.array_equal(dfSOC["bat_1"].to_numpy(), dfRes["SOC"].to_numpy())
+            assert np.array_equal(archive.read("MAIN")["TimeArray"].to_numpy(), TimeArray)
+            assert archive.kpis["Load Conso"]["value"] == 1234.5 and archive.params["forecast"] is False
+            assert archive.params["sheet"]["columns"] == list(dfRes.columns)
+        print(f"run archive : {round(os.path.getsize(archive_path) / 1e6, 1)} MB, 1 file")
+
+        if _pyarrow() is not None:
+            print("\n --- testing ArrowWriter (incremental Arrow IPC stream) ---\n")
+            stream_path = os.path.join(tmpdir, "MAIN.arrows")
+            chunk = len(dfRes) // 10
+            with ArrowWriter(stream_path, chunk_rows=10000) as writer:
+                for i in range(10):                                             # chunks of results produced during a simulation
+                    writer.write(dfRes.iloc[i * chunk:(i + 1) * chunk])
+                    if i == 4:
+                        with read_arrow(stream_path) as table:              # partial results, read while the stream is written
+                            assert table.num_rows == 5 * chunk
+            with read_arrow(stream_path) as table:
+                assert table.num_rows == 10 * chunk and table.num_rows == writer.rows and table.column_names == list(dfRes.columns)
+            assert np.array_equal(read_results(stream_path, columns=["P_L"])["P_L"].to_numpy(), dfRes["P_L"].to_numpy()[:10 * chunk])
+            with open(stream_path, 'rb') as f:
+                truncated = f.read(os.path.getsize(stream_path) - 1000)
+            with open(stream_path, 'wb') as f:                                  # last chunk still being written
+                f.write(truncated)
+            with read_arrow(stream_path) as table:
+                assert table.num_rows < 10 * chunk
+            os.remove(stream_path)                                              # the memory map is closed : the file can be deleted (Windows)
+            with ArrowWriter(os.path.join(tmpdir, "SOCs.arrow")) as writer:    # file format : casts the next chunks to the first schema
+                writer.write({"TimeArray": TimeArray[:10], "bat_1": np.arange(10, dtype=float)})
+                writer.write({"TimeArray": TimeArray[10:20], "bat_1": np.arange(10)})
+            assert read_results(os.path.join(tmpdir, "SOCs.arrow"))["bat_1"].dtype == float
+# %%
@@ -0,0 +1,416 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 16:05:12
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Run of the virtual PMS (command "run" of python -m virtualPMS) : reads an input file (inpParam.xlsx), where are defined the load and
+production power time series, components of the microgrids + results type, performs the dispatching and saves the results.
+'''
+#---------------------
+# %% Required dependencies and imports
+import os
+import json
+import argparse
+from contextlib import ExitStack
+
+from virtualPMS import inpReading as inpR
+from virtualPMS import DispatchingStrats as DS
+from virtualPMS import TimeSeriesAnalysis as TSA
+from virtualPMS import ResultsIO as RIO
+from virtualPMS import Profiling
+from virtualPMS import Progress
+from virtualPMS import Battery, BatteryStock, DieselGenerator, Grid
+
+import numpy as np
+import pandas as pd
+
+RootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) # folder of the project (source checkout) or site-packages (installed package)
+IntegerSeries = ["indic", "GridState"] # integer results : the other numeric results (RuntimeDG is in hours) are published as float64 (see --stream)
+
+def work_dir() -> str:
+    """folder of input// and output// : the current directory, or the folder of the project when the current directory has no input// folder and
+    the package runs from a source checkout (python main.py started from another folder). An installed package never writes in site-packages."""
+    if not os.path.isdir(os.path.join(os.getcwd(), "input")) and os.path.isfile(os.path.join(RootDir, "main.py")) and os.path.isdir(os.path.join(RootDir, "input")):
+        return RootDir
+    return os.getcwd()
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """arguments of a run (command "run" of python -m virtualPMS)"""
+    # this way you can save your inputs easily without changing their name for execution.
+    parser.add_argument("input", nargs='?', default='inpParam.xlsx', help="input file : a path, or a file under input// of the working directory (default inpParam.xlsx, see work_dir())")
+    parser.add_argument("--output", help="folder of the results (default output// of the working directory, see work_dir())")
+    parser.add_argument("--profile", action='store_true', help="wall and CPU time of every phase, saved in output//*_PROFILE.json and output//profile_summary.csv")
+    parser.add_argument("--cprofile", action='store_true', help="with --profile : runs the dispatch under cProfile (output//*_dispatch.pstats and .collapsed)")
+    parser.add_argument("--progress", type=int, metavar='K', help="prints the progress of the dispatch (step, steps/s, ETA) every K steps")
+    parser.add_argument("--memprofile", action='store_true', help="profile with the memory of every phase (RSS, peaks, top allocation sites) and the size of the columns of every table (slower)")
+    parser.add_argument("--max-seconds", type=float, help="time budget of the dispatch : when it is spent, the run stops and only saves the results of the steps dispatched "
+                                                          "(output//*_AllVar_PARTIAL.csv, *_AllSOCs_PARTIAL.csv) and the state to resume from (*_PARTIAL.json), "
+                                                          "with the profile of the run (*_PARTIAL_PROFILE.json, status 'stopped' in the summary table) if --profile")
+    parser.add_argument("--figure-workers", type=int, help="processes building the figures (default one per figure, at most one per CPU ; 1 : no process)")
+    parser.add_argument("--stream", type=int, metavar='STEPS', help="publishes the results during the dispatch : every STEPS steps, the new rows are appended to the Arrow IPC streams "
+                                                                   "output//*_MAIN.arrows, *_AllSOCs.arrows and *_Costs.arrows (CostStrat), readable by ResultsIO.read_arrow() while the run goes on")
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Virtual PMS : simulates the dispatch described by an input file of input//.")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+def cost_series(dfRes: pd.DataFrame, GridState, ActiveDevices: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """cost time series of CostStrat : costs of the energy needed (sale to the grid, battery charge) and of the energy remaining (purchase from the grid,
+    battery discharge, DG use)
+
+    Args:
+        dfRes (pd.DataFrame): results of CostStrat (all the time steps, or a chunk of them)
+        GridState (array-like): state of the grid at every time step of the input
+        ActiveDevices (dict): {"Grid": True/False, "Batteries": True/False, "DieselGenerator": True/False}
+
+    Returns:
+        pd.DataFrame, pd.DataFrame: costs of the energy needed, costs of the energy remaining (with TimeArray)
+    """
+    d_costs_needed = pd.DataFrame({"TimeArray":dfRes["TimeArray"]})
+    d_costs_remain = pd.DataFrame({"TimeArray":dfRes["TimeArray"]})
+
+    if ActiveDevices["Grid"]:
+        d_costs_needed["GridState"] = np.asarray(GridState)[dfRes.index.to_numpy()]
+        d_costs_needed["GridSaleCost"] = dfRes["GridSaleCost"]
+        d_costs_remain["GridPurchaseCost"] = dfRes["GridPurchaseCost"]
+    if ActiveDevices["Batteries"]:
+        d_costs_needed["BatteryChargeCost"] = dfRes["BatteryChargeCost"]
+        d_costs_remain["BatteryDischargeCost"] = dfRes["BatteryDischargeCost"]
+    if ActiveDevices["DieselGenerator"]:
+        d_costs_remain["DGUseCost"] = dfRes["DGUseCost"]
+    return d_costs_needed, d_costs_remain
+
+def stream_chunk(chunk) -> pd.DataFrame:
+    """chunk of results with the same dtypes in every chunk : a result built from python numbers can be int64 in a chunk and float64
+    in the next one (0 then 2040.65...), while the schema of an Arrow stream is set by its first chunk"""
+    chunk = pd.DataFrame(chunk)
+    return chunk.astype({col: float for col in chunk.columns if chunk[col].dtype.kind in "iub" and col not in IntegerSeries})
+
+def save_partial(prefix: str, dfRes: pd.DataFrame, allSOCs: dict, progress: Progress.DispatchProgress) -> str:
+    """saves the results of a dispatch stopped by its budget ({prefix}_AllVar_PARTIAL.csv, {prefix}_AllSOCs_PARTIAL.csv) and the state to resume
+    it from ({prefix}_PARTIAL.json) : state of the DispatchProgress (next_step : first step not dispatched), last time step dispatched and
+    state of the devices after it (SOC of every battery, SOC of the stock, fuel, DG runtime)
+
+    Returns:
+        str: path of the state (.json)
+    """
+    dfRes.to_csv(f"{prefix}_AllVar_PARTIAL.csv")
+    pd.DataFrame(dict({"TimeArray": dfRes["TimeArray"]}, **allSOCs), index=dfRes.index).to_csv(f"{prefix}_AllSOCs_PARTIAL.csv")
+    state = dict(progress.state, last_time=None, devices={})
+    if len(dfRes):
+        state["last_time"] = str(dfRes["TimeArray"].iloc[-1])
+        state["devices"] = {bat_name: float(SOCs[-1]) for bat_name, SOCs in allSOCs.items()}
+        state["devices"].update({col: float(dfRes[col].iloc[-1]) for col in ["SOC", "F_C", "RuntimeDG"] if col in dfRes.columns})
+    with open(f"{prefix}_PARTIAL.json", 'w', encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    return f"{prefix}_PARTIAL.json"
+
+def run(args: argparse.Namespace) -> dict:
+    """simulates the dispatch described by an input file and saves the results (see add_arguments() for args)
+
+    Returns:
+        dict: summary of the run : status ('ok', or 'stopped' when the time budget of the dispatch is spent), input, inputID, strategy,
+              devices, forecast, steps, prefix (path of the results without the dataset name), kpis ({"var (unit)": value}, see TSA.EnergySums()),
+              partial (stopped run only : path of the state to resume from, see save_partial())
+    """
+    Profile = Profiling.RunProfile(args.profile or args.memprofile, args.cprofile, args.memprofile)
+    # --------------------------------------------------------------------------------------------
+    # Read input//inpParam.xlsx
+    # --------------------------------------------------------------------------------------------
+    # --- locate entry file ---
+    inputName = args.input
+    ExcelPath = inputName if os.path.isfile(inputName) else os.path.join(work_dir(),'input',inputName)
+    OutDir = args.output or os.path.join(work_dir(), "output")
+    os.makedirs(OutDir, exist_ok=True)
+    print("Reading", ExcelPath)
+
+    # --- Download all sheets of the entry file ---
+    Profile.begin("read")
+    mainSheetRaw,TimeSeriesSheetRaw,GridPricesSheetRaw,GridScheduleSheetRaw,BattSheetRaw,DieselSheetRaw,outFSheetRaw=inpR.openxlsx(ExcelPath)
+    Profile.begin("verify")
+    # Verify and adapt the format
+    # print(mainSheetRaw.shape,TimeSeriesSheetRaw.shape,GridPricesSheetRaw.shape,GridScheduleSheetRaw.shape,BattSheetRaw.shape,DieselSheetRaw.shape,outFSheetRaw.shape)
+    mainSheet = inpR.VerifmainSheet(mainSheetRaw)
+    TimeSeriesSheet = inpR.VerifTimeSeriesSheet(TimeSeriesSheetRaw)
+    GridPricesSheet = inpR.VerifGridPricesSheet(GridPricesSheetRaw)
+    GridScheduleSheet = inpR.VerifGridScheduleSheet(GridScheduleSheetRaw)
+    BattSheet = inpR.VerifBattSheet(BattSheetRaw)
+    DieselSheet = inpR.VerifDieselSheet(DieselSheetRaw)
+    outFSheet = inpR.VerifoutFSheet(outFSheetRaw)
+    # sort the time series and fill missing time steps : every time step must have the same lenght
+    try:
+        GapPolicy = mainSheet["gap_policy"]
+    except: # by default, missing values are interpolated
+        GapPolicy = 'interpolate'
+    GapPolicy = GapPolicy if pd.notna(GapPolicy) else 'interpolate'
+    TimeSeriesSheet, GapReport = inpR.RepairTimeSeriesSheet(TimeSeriesSheet, policy=GapPolicy)
+    # archive mode : every time serie, KPI and parameter of the run is saved in one file, instead of one file per dataset and format
+    try:
+        Archive = mainSheet["archive"]
+    except: # by default, one file per dataset and format
+        Archive = "NO"
+    Archive = Archive == "YES"
+    # decimation of the curves of png figures : 'auto' (only figures that can't be zoomed in), 'minmax', 'lttb' or 'NO'
+    try:
+        Decimation = mainSheet["plot_decimation"]
+    except: # by default, png-only figures are decimated
+        Decimation = 'auto'
+    Decimation = Decimation if pd.notna(Decimation) else 'auto'
+    Decimation = None if Decimation == 'NO' else Decimation
+    # energy table per calendar period ('day', 'week', 'month' or 'year'), saved with the formats of the "energy" row of the outputFormat sheet
+    try:
+        EnergyPeriod = mainSheet["energy_period"]
+    except: # by default, only the totals over the simulation
+        EnergyPeriod = 'NO'
+    EnergyPeriod = EnergyPeriod if pd.notna(EnergyPeriod) and EnergyPeriod != 'NO' else None
+    # verification of the results : 'full' (every time step), 'sampled' (about 10000 time steps, for sweeps of many runs) or 'off'
+    try:
+        VerifLevel = mainSheet["verification"]
+    except: # by default, every time step is checked
+        VerifLevel = 'full'
+    VerifLevel = VerifLevel if pd.notna(VerifLevel) else 'full'
+    if Archive:
+        outFSheet.loc[:, [fmt for fmt in RIO.DataFormats if fmt in outFSheet.columns]] = False # data files are replaced by the archive, figures are kept
+    # print(mainSheet.shape,TimeSeriesSheet.shape,GridPricesSheet.shape,GridScheduleSheet.shape,BattSheet.shape,DieselSheet.shape,outFSheet.shape)
+
+    # --------------------------------------------------------------------------------------------
+    # %% Strategy
+    # --------------------------------------------------------------------------------------------
+    # choose between the following strategies, then precise specific parameters if needed
+    # Load Following : 'LFE' | Cycle Charging : 'CCE' | CostStrat : 'CostStrat'                                                                   # change value
+    # NB : CostStrat includes other parameters to define within the main script CostStrat.py
+    strat = mainSheet["strategy"].lower()
+    assert(strat in ['lfe', 'cce', 'coststrat'])
+
+    # --------------------------------------------------------------------------------------------
+    # INPUT time series (load demand, production and time arrays)
+    # --------------------------------------------------------------------------------------------
+    dt = (TimeSeriesSheet["Time"][1] - TimeSeriesSheet["Time"][0]).total_seconds() / 3600 # duration of a time step in hours ; every time step must have the same lenght
+    num_steps = min(len(TimeSeriesSheet["Time"]),len(TimeSeriesSheet["Load"]),len(TimeSeriesSheet["Green Prod"]))
+
+    # --------------------------------------------------------------------------------------------
+    # Electrical Components
+    # --------------------------------------------------------------------------------------------
+    ActiveDevices = {"Grid": True if mainSheet["Grid"]=="YES" else False, 
+                     "Batteries": True if mainSheet["Batteries"]=="YES" else False,
+                     "DieselGenerator": True if mainSheet["DieselGenerator"]=="YES" else False}
+
+    # --- grid ---
+    Profile.begin("devices")
+    if ActiveDevices["Grid"]:
+        GridState = TimeSeriesSheet["Grid State"].to_numpy()
+    else: # grid disconnected
+        GridState = [0] * len(TimeSeriesSheet)
+    grid_1 = Grid(GridState, GridPricesSheet, GridScheduleSheet)
+
+    # --- batteries ---
+    BattList = []
+    if ActiveDevices["Batteries"]:
+        for batt in BattSheet.keys():
+            BattDict = BattSheet[batt].to_dict()
+            BattList.append(Battery(BattDict))
+    else: # batteries disconnected
+        BattList = [Battery({
+                            "capacity":1,
+                            "SOC":0,
+                            "SOCmin":0,
+                            "SOCmax":0,
+                            "eta":0,
+                            "Pmax_ch":0,
+                            "Pmax_disch":0,
+                            "lifetime":1,
+                            "ReplacementCost":0,
+                            "MaintenanceCost":0
+                            })]
+    BattStock = BatteryStock(BattList)
+
+    # --- diesel generator ---
+    if ActiveDevices["DieselGenerator"]:
+        DieselDict = DieselSheet.to_dict()
+    else: # DG disconnected
+        DieselDict = {
+                      "Pmax":1,
+                      "Pnom":1,
+                      "Pmin":0,
+                      "TankCapacity":1,
+                      "FuelRate":0,
+                      "f_r_min":0,
+                      "lifetime":0,
+                      "ReplacementCost":0,
+                      "MaintenanceCost":0,
+                      "FuelPrice":0,
+                      "MinimumRuntime":0
+                      }
+    DG_1 = DieselGenerator(DieselDict)
+    Profile.begin("find_DG_coeffs")
+    DG_1.find_DG_coeffs()
+    Profile.begin("parameters")
+
+    # --------------------------------------------------------------------------------------------
+    # Results Parameters
+    # --------------------------------------------------------------------------------------------
+
+    # specific parameters
+    # ----------------------------------------------
+    # forecast : [boolean] If True, future data will be used to dispatch power.
+    #                      If False, only current and past data will be used.
+    forecast = mainSheet["forecast"]
+    # ForecastPeriod : [int] will only be used when forecast == True. based on the duration of battery charging and forecast abilities, 
+    # it represents the future period of time the function is allowed to look at in order to anticipate dispatching, IN HOURS.
+    try:
+        ForecastPeriod = mainSheet["forecast_charac_period"]
+    except: # default to 3 days
+        ForecastPeriod = 24 * 3
+    ForecastPeriod = ForecastPeriod if pd.notna(ForecastPeriod) else 0
+
+    #  ONLY FOR CostStrat :
+    # ----------------------------------------------
+    # ChargeUsingGridCost [float] : if the cost of 1kWh purchased from the grid is less than this, it will be used to charge batteries
+    try:
+        ChargeUsingGridCost = mainSheet["ChargeUsingGridCost"]
+    except: # default to minimum grid price
+        ChargeUsingGridCost = GridPricesSheet["Buying price (euros/kWh)"][1]
+
+    #  ONLY FOR LFE_CCE :
+    # ----------------------------------------------
+    # under this SOC, batteries will be charged by the grid (when the grid is reliable).
+    # NB : if you don't want to charge the batteries with the grid power at all, just enter SOClim = 0.
+    try:
+        SOClim = mainSheet["SOClim"]
+    except: # by default, batteries are not charged by the grid
+        SOClim = 0
+
+    # the self sufficiency mode prioritizes the batteries to the DG to the grid in case of energy lack
+    # the emergency system mode prioritizes the grid to the batteries to the DG in case of energy lack
+    priority = mainSheet["priority"]
+    assert(priority in  ['Self Sufficiency', 'Emergency System'])
+
+    # output file names
+    # ----------------------------------------------
+    inputIdd = mainSheet["inputID"]
+    DevicesIdd = f"{"G"if ActiveDevices['Grid'] else "-"}{"B"if ActiveDevices['Batteries'] else "-"}{"D"if ActiveDevices['DieselGenerator'] else "-"}"
+    StratIdd = "LF" if strat=="lfe" else "CC" if strat=="cce" else "CostStrt"
+    PrioIdd = "SelSu" if priority=='Self Sufficiency' else "EmSys"
+    if strat in ["lfe","cce"]:
+        StratIdd += '-' + PrioIdd
+    Summary = {"status": "ok", "input": ExcelPath, "inputID": inputIdd, "strategy": StratIdd, "devices": DevicesIdd, "forecast": forecast,
+               "steps": num_steps, "prefix": os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}"), "kpis": {}}
+
+    # --------------------------------------------------------------------------------------------
+    # %% Simulation, time series generation
+    # --------------------------------------------------------------------------------------------
+    Profile.begin("dispatch")
+    DispatchProgress = None
+    if args.progress or args.max_seconds is not None or args.stream:
+        DispatchProgress = Progress.DispatchProgress(Progress.print_progress if args.progress else None, args.progress or 1000, args.max_seconds)
+    if strat in ["lfe","cce"] and priority == 'Self Sufficiency':
+        Strategy, StratArgs = DS.LFE_CCE_self_sufficiency, (strat,TimeSeriesSheet, ActiveDevices, grid_1, BattStock, DG_1, dt, SOClim, forecast, ForecastPeriod)
+    elif strat in ["lfe","cce"] and priority == 'Emergency System':
+        Strategy, StratArgs = DS.LFE_CCE_emergency_system, (strat,TimeSeriesSheet, ActiveDevices, grid_1, BattStock, DG_1, dt, SOClim, forecast, ForecastPeriod)
+    elif strat == "coststrat":
+        Strategy, StratArgs = DS.CostStrat, (TimeSeriesSheet, ActiveDevices, grid_1, BattStock, DG_1, dt, ChargeUsingGridCost, forecast, ForecastPeriod)
+    if DispatchProgress is None:
+        dfRes, allSOCs = Profile.run(Strategy, *StratArgs, counters=Profile.counters)
+    else:
+        with ExitStack() as streams:
+            publish = None
+            if args.stream: # every chunk of the dispatch is appended to the streams as soon as it is dispatched
+                writers = {dataset: streams.enter_context(RIO.ArrowWriter(f"{Summary['prefix']}_{dataset}.arrows"))
+                           for dataset in ["MAIN", "AllSOCs"] + (["Costs"] if strat == "coststrat" else [])}
+                def publish(dfPart, SOCsPart):
+                    writers["MAIN"].write(stream_chunk(dfPart))
+                    SOCsPart = dict({"TimeArray": dfPart["TimeArray"]}, **SOCsPart)
+                    if ActiveDevices["Batteries"]:
+                        SOCsPart["all_bat"] = dfPart["SOC"]
+                    writers["AllSOCs"].write(stream_chunk(SOCsPart))
+                    if "Costs" in writers:
+                        d_costs_needed, d_costs_remain = cost_series(dfPart, GridState, ActiveDevices)
+                        writers["Costs"].write(stream_chunk(pd.concat([d_costs_needed, d_costs_remain.drop("TimeArray", axis=1)], axis=1)))
+                print("results published during the dispatch in", ", ".join(writer.file_path for writer in writers.values()))
+            dfRes, allSOCs = Progress.dispatch(Profile.run, Strategy, *StratArgs, progress=DispatchProgress, chunk_steps=args.stream, on_part=publish, counters=Profile.counters)
+    Profile.add_sizes(TimeSeriesSheet, "input")
+    Profile.add_sizes(dfRes, "results")
+    Profile.add_sizes(allSOCs, "allSOCs")
+    if DispatchProgress is not None and DispatchProgress.stopped:
+        Summary.update(status="stopped", steps=DispatchProgress.next_step, partial=save_partial(Summary["prefix"], dfRes, allSOCs, DispatchProgress))
+        print(f"!!! time budget of the dispatch spent after {DispatchProgress.next_step}/{num_steps} steps : partial results and resume state saved at {Summary['partial']} !!!")
+        Profile.info = {"status": "stopped", "input": ExcelPath, "inputID": inputIdd, "strategy": StratIdd, "devices": DevicesIdd, "forecast": forecast,
+                        "steps": len(dfRes), "dt_h": dt, "batteries": len(BattStock.battery_stock), "partial": Summary["partial"]}
+        Profile.save(Summary["prefix"] + "_PARTIAL", os.path.join(OutDir,"profile_summary.csv"))
+        return Summary
+    Profile.begin("VerifTimeSeries")
+    TSA.VerifTimeSeries(dfRes, ActiveDevices, BattStock, DG_1, level=VerifLevel)
+    Profile.begin("results")
+
+    # --------------------------------------------------------------------------------------------
+    # Save files
+    # --------------------------------------------------------------------------------------------
+
+    FigureJobs = [] # figures are built at the end of the run, in parallel (see TSA.render_figures())
+
+    # --- main results ---
+    TSA.plot_compact(dfRes, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_MAIN"),
+                       outFSheet[".csv"]["mainVar"],outFSheet[".png"]["mainVar"],outFSheet[".pkl"]["mainVar"],outFSheet["plot"]["mainVar"],
+                       RIO.formats_from_sheet(outFSheet, "mainVar", csv=False), Decimation, FigureJobs)
+
+    df_energysums = TSA.EnergySums(dfRes, DG_1)
+    Summary["kpis"] = {f"{var} ({unit})": value for var, value, unit in zip(df_energysums["var"], df_energysums["value"], df_energysums["unit"])}
+    if outFSheet[".csv"]["energy"]:
+        energy_file_path = os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_TradedEnergy.csv")
+        df_energysums.to_csv(energy_file_path, index=False)
+    if EnergyPeriod is not None and RIO.formats_from_sheet(outFSheet, "energy"):
+        RIO.write_results(TSA.EnergySums(dfRes, DG_1, period=EnergyPeriod),
+                          os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_Energy_{EnergyPeriod}"),
+                          RIO.formats_from_sheet(outFSheet, "energy"))
+
+    # --- debug & details ---
+    print(inputIdd, StratIdd, DevicesIdd, str(forecast).lower())
+    TSA.plot_separately(dfRes, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_AllVar"),
+                        outFSheet[".csv"]["allVar"],outFSheet[".png"]["allVar"],outFSheet[".pkl"]["allVar"],outFSheet["plot"]["allVar"],
+                        RIO.formats_from_sheet(outFSheet, "allVar", csv=False), Decimation, FigureJobs)
+
+    allSOCs["TimeArray"] = dfRes["TimeArray"]
+    if ActiveDevices["Batteries"]:
+        allSOCs["all_bat"] = dfRes["SOC"] # add general SOC to SOCs
+    TSA.plot_group(allSOCs, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_AllSOCs"), '',
+                   outFSheet[".csv"]["allSOCs"],outFSheet[".png"]["allSOCs"],outFSheet[".pkl"]["allSOCs"],outFSheet["plot"]["allSOCs"],
+                   RIO.formats_from_sheet(outFSheet, "allSOCs", csv=False), Decimation, FigureJobs)
+
+    if strat == "coststrat": # costs results
+        d_costs_needed, d_costs_remain = cost_series(dfRes, GridState, ActiveDevices)
+        d_costs_full = pd.concat([d_costs_needed,d_costs_remain.drop("TimeArray", axis = 1)], axis=1)
+
+        TSA.plot_group(d_costs_needed, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_CostsEnergNeeded"), '',
+                    False,outFSheet[".png"]["costs"],outFSheet[".pkl"]["costs"],outFSheet["plot"]["costs"], decimation=Decimation, jobs=FigureJobs)
+        TSA.plot_group(d_costs_remain, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_CostsEnergRem"), '',
+                    False,outFSheet[".png"]["costs"],outFSheet[".pkl"]["costs"],outFSheet["plot"]["costs"], decimation=Decimation, jobs=FigureJobs)
+        TSA.plot_group(d_costs_full, os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_CostsEnergAll"),
+                    csv=outFSheet['.csv']["costs"], formats=RIO.formats_from_sheet(outFSheet, "costs", csv=False))
+
+    if Archive:
+        Profile.begin("archive")
+        archive_path = os.path.join(OutDir,f"{inputIdd}_{StratIdd}_{DevicesIdd}_F{str(forecast).lower()}_RUN.zip")
+        with RIO.RunArchive(archive_path, 'w') as archive:
+            archive.add_series("MAIN", dfRes)
+            archive.add_series("AllSOCs", allSOCs)
+            if strat == "coststrat":
+                archive.add_series("Costs", d_costs_full)
+            if EnergyPeriod is not None:
+                archive.add_series(f"Energy_{EnergyPeriod}", TSA.EnergySums(dfRes, DG_1, period=EnergyPeriod))
+            archive.add_kpis({var: {"value": value, "unit": unit} for var, value, unit in zip(df_energysums["var"], df_energysums["value"], df_energysums["unit"])})
+            archive.add_params({"input": ExcelPath, "strategy": strat, "priority": priority, "forecast": forecast, "ForecastPeriod": ForecastPeriod,
+                                "ChargeUsingGridCost": ChargeUsingGridCost, "SOClim": SOClim, "dt": dt, "ActiveDevices": ActiveDevices, "GapReport": GapReport,
+                                "main": mainSheet, "GridPrices": GridPricesSheet, "GridSchedule": GridScheduleSheet, "Batteries": BattSheet, "DieselGenerator": DieselSheet})
+        print("run archive saved at", archive_path)
+
+    # --- figures ---
+    if FigureJobs:
+        Profile.begin("figures")
+        TSA.render_figures(FigureJobs, args.figure_workers)
+    Profile.info = {"status": "ok", "input": ExcelPath, "inputID": inputIdd, "strategy": StratIdd, "devices": DevicesIdd, "forecast": forecast,
+                    "steps": len(dfRes), "dt_h": dt, "batteries": len(BattStock.battery_stock)}
+    Profile.save(Summary["prefix"], os.path.join(OutDir,"profile_summary.csv"))
+    return Summary
+# %%
@@ -9,105 +9,536 @@
     it includes the following operations :
 
     - plot a dictionnary of array-like elements on the same graph or on different graphs on the same fig (.png) : plot_on_same_graph() and png_graphs()
-    - save dictionaries or array-like elements within a tabular (.csv) : save_dict_to_csv()
-    - adjust and make constant the sampling period of a time serie : adjust_time_serie()
-    - typical behavior of a period : you have 10 years of data and you want to vizualise it on one averaged-year data ? calculate_typical_behavior()
-    - comparison of time series : relative_error()
+    - save dictionaries or array-like elements within a tabular (.csv) or a columnar file (.parquet, .feather, .npz, see ResultsIO) : formats argument of the plot functions
+    - adjust and make constant the sampling period of a time serie (irregular inputs, energy-conserving averages, gap policy) : adjust_time_serie()
+    - typical behavior of a period (day, week or year, grouped by calendar fields) : you have 10 years of data and you want to vizualise it on one averaged-year data ? calculate_typical_behavior()
+    - comparison of time series : relative_error(), and relative_errors() for many pairs of series at once
+    - decimation of long time series before plotting them (min/max envelope or LTTB) : decimate()
+    - parallel rendering of the figures in worker processes : render_figures()
+    - bounded memory of the figures : saved figures are built on reused figure templates and released after being saved (figure_context())
+    matplotlib is imported when the first figure is built (_pyplot()) : a process that only dispatches or saves data doesn't pay for it.
 '''
 #---------------------
 # %%
 import os
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+if __name__ == "__main__": # test section run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
 
 from virtualPMS import Battery, BatteryStock, DieselGenerator
+from virtualPMS import ResultsIO as RIO
 
-import pickle
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 from datetime import datetime
-import matplotlib.pyplot as plt
 
-def generalized_func(abs_array,ord_array,x): # unused
+def _pyplot():
+    """imports matplotlib when the first figure is built (about half of the import time of the package)"""
+    import matplotlib.pyplot as plt
+    return plt
+
+def _hours(time) -> tuple[np.ndarray, object]:
+    """converts a time array into hours elapsed since its first element.
+
+    Args:
+        time (array-like): datetime objects, np.datetime64 or numbers (already in hours)
+
+    Returns:
+        tuple[np.ndarray, object]: time in hours (float), origin of time (np.datetime64, or None if time was already numeric)
+    """
+    time = np.asarray(time)
+    if time.dtype.kind in "fiu":
+        return time.astype(float), None
+    time = np.asarray(pd.to_datetime(time), dtype="datetime64[ns]")
+    return (time - time[0]) / np.timedelta64(1, 'h'), time[0]
+
+def _wall_clock(TimeArray) -> np.ndarray:
+    """local clock time of a time array (datetime64[ns]) : time-zone-aware times keep their local fields instead of being converted to UTC"""
+    t = pd.DatetimeIndex(pd.to_datetime(TimeArray))
+    if t.tz is not None:
+        t = t.tz_localize(None)
+    return t.to_numpy(dtype="datetime64[ns]")
+
+def generalized_func(abs_array,ord_array,x):
     '''
     PURPOSE :
         given 2 lists reprenting a function and an abscissa x, evaluate f(x) by joining linearly every point of the function.
     INPUT :
         :abs_array: np.array of shape (1,n). sorted list of abscissas we have values for the function
         :ord_array: np.array of shape (1,n). list of values taken by the function at the abs_array points
-        :x: point you want the function to be evaluated
+        :x: point (or np.array of points) you want the function to be evaluated
     OUTPUT :
-        :f(x): where f is the piecewise linear function represented by abs_array and ord_array'''
+        :f(x): where f is the piecewise linear function represented by abs_array and ord_array (-9999 outside of the definition domain)'''
     assert(len(abs_array)==len(ord_array))
+    x = np.asarray(x, dtype=float)
+    fx = np.interp(x, abs_array, ord_array)
+    out_of_domain = (x < abs_array[0]) | (abs_array[-1] < x)
+    if np.any(out_of_domain):
+        print("!! the value you are trying to reach is not in the definition domain of the function !!")
+        fx = np.where(out_of_domain, -9999, fx)
+    return fx[()] # float if x is a float
 
-    if abs_array[-1] < x:
-        print("!! the value you are trying to reach is not in the definition domain of the function !! (lower than the first element)")
-        return -9999
-    elif x < abs_array[0]:
-        print("!! the value you are trying to reach is not in the definition domain of the function !! (higher than the last element)")
-        return -9999
-    else: # linear approximation f(x) = ax+b between abs_array[i] and abs_array[i+1]
-        for i in range(len(abs_array)-1):
-            if abs_array[i]<=x and x<=abs_array[i+1]:
-                index = i
-                break
-        a = (ord_array[index+1]-ord_array[index])/(abs_array[index+1]-abs_array[index])
-        b = ord_array[index]-abs_array[index]*a
-        return a*x+b
-
-def adjust_time_serie(time,results,fixed_sampling_period): # unused
-    '''
-    PURPOSE :
-        sort out a time serie by fixing its sampling period.
-    INPUT :
-        :results: pd.DataFrameionnary of arrays of size (1,n). it represents time series of same sampling rate, constant.
-        :fixed_sampling_period: float. if the sampling period of the result is variable, 
-                                it will be approached by a fixed sampling period time serie using the linear estimation implemented in generalized_func().
-    OUTPUT :
-        :formatted_results: time serie representing the same data than the input 'results' but with fixed sampling period
-    '''
-    # Initialize dictionary to store the formatted results
-    formatted_results = {key: [] for key in results.keys()}
-
-    for data in results.keys():
-        nb_samples = len(results[data])//fixed_sampling_period
-        for i in range(nb_samples):
-            formatted_results[data].append(generalized_func(time,results[data],time[0]+i*fixed_sampling_period))
-            if formatted_results[data][-1] == -9999:
-                print('!! data not found for',data,len(formatted_results[data]),sep=' ')
-        
-        # in order not to loose the last value of the results, we copy it in the end of the formatted time serie
-        if len(data)%fixed_sampling_period != 0:
-            formatted_results[data].append(results[data][-1])
-        print(data,formatted_results[data][:10])
+def adjust_time_serie(time, results, fixed_sampling_period: float, method: str = 'mean', gap_policy: str = 'interpolate', max_gap: float = None) -> pd.DataFrame:
+    """sort out a time serie by fixing its sampling period. Every column is processed at once (vectorized, O(N log N)).
+
+    Args:
+        time (array-like): time of every sample (datetime objects or np.datetime64, or numbers in hours). Can be irregular, unsorted and have duplicates.
+        results (dict or pd.DataFrame): time series (array-like of the same lenght than time) to resample
+        fixed_sampling_period (float): sampling period of the output, in hours
+        method (str, optional): 'mean' for energy-conserving averages over every output time step [t, t+dt[
+                                (integral of the piecewise linear input divided by dt : energies in kWh are preserved),
+                                'interp' for the value of the piecewise linear input at every output time. Defaults to 'mean'.
+        gap_policy (str, optional): what to do with the output time steps overlapping a gap of the input
+                                    'interpolate' : join linearly both sides of the gap,
+                                    'hold' : keep the last value before the gap,
+                                    'zero' : 0,
+                                    'nan' : np.nan. Defaults to 'interpolate'.
+        max_gap (float, optional): 2 consecutive samples further apart than max_gap (hours) define a gap. Defaults to None (1.5 * median sampling period of the input).
+
+    Returns:
+        pd.DataFrame: "TimeArray" (output time, same type than the input time) + resampled time series
+    """
+    assert(method in ['mean', 'interp'])
+    assert(gap_policy in ['interpolate', 'hold', 'zero', 'nan'])
+    assert(fixed_sampling_period > 0)
+    dt = fixed_sampling_period
+
+    th, t_origin = _hours(time)
+    keys = [key for key in results.keys() if key != "TimeArray"]
+    Y = np.column_stack([np.asarray(results[key], dtype=float) for key in keys])
+    assert(len(th) == Y.shape[0] >= 2)
+
+    # sorted, without duplicates (the first sample of duplicated times is kept)
+    order = np.argsort(th, kind='stable')
+    th, Y = th[order], Y[order]
+    keep = np.concatenate(([True], np.diff(th) > 0))
+    th, Y = th[keep], Y[keep]
+
+    # output time steps
+    nb_steps = int(np.floor((th[-1] - th[0]) / dt + 1e-9))
+    if method == 'interp':
+        t_out = th[0] + np.arange(nb_steps + 1) * dt
+        idx = np.clip(np.searchsorted(th, t_out, side='right') - 1, 0, len(th) - 2)
+        w = ((t_out - th[idx]) / (th[idx + 1] - th[idx]))[:, None]
+        Y_out = Y[idx] * (1 - w) + Y[idx + 1] * w
+        a_out, b_out = t_out, t_out
+    else:
+        # cumulative integral (trapezoidal = exact for piecewise linear functions) evaluated at the edges of the output steps
+        edges = th[0] + np.arange(nb_steps + 1) * dt
+        dth = np.diff(th)
+        slope = np.diff(Y, axis=0) / dth[:, None]
+        cumul = np.concatenate((np.zeros((1, Y.shape[1])), np.cumsum(0.5 * (Y[1:] + Y[:-1]) * dth[:, None], axis=0)))
+        idx = np.clip(np.searchsorted(th, edges, side='right') - 1, 0, len(th) - 2)
+        h = (edges - th[idx])[:, None]
+        cumul_edges = cumul[idx] + Y[idx] * h + 0.5 * slope[idx] * h**2
+        Y_out = np.diff(cumul_edges, axis=0) / dt
+        t_out = edges[:-1]
+        a_out, b_out = edges[:-1], edges[1:]
+
+    # gaps
+    dth = np.diff(th)
+    max_gap = 1.5 * np.median(dth) if max_gap is None else max_gap
+    gap_idx = np.flatnonzero(dth > max_gap)
+    if len(gap_idx) > 0 and gap_policy != 'interpolate':
+        gap_start, gap_end = th[gap_idx], th[gap_idx + 1]
+        first = np.searchsorted(gap_end, a_out, side='right')   # first gap ending after the start of every output step
+        stop = np.searchsorted(gap_start, b_out, side='left')   # gaps starting before its end
+        in_gap = stop > first                                   # any gap of [first, stop[ overlaps the step (several gaps if the step is long)
+        if gap_policy == 'hold':
+            Y_out[in_gap] = Y[gap_idx[stop[in_gap] - 1]]        # last value before the last gap of the step
+        else:
+            Y_out[in_gap] = 0 if gap_policy == 'zero' else np.nan
+    if len(gap_idx) > 0:
+        print(f"!! {len(gap_idx)} gap(s) longer than {round(max_gap,4)}h found in the time serie, filled using gap_policy = '{gap_policy}' !!")
+
+    if t_origin is None:
+        TimeOut = t_out
+    else:
+        TimeOut = t_origin + np.round(t_out * 3600e9).astype('timedelta64[ns]')
+    formatted_results = pd.DataFrame(Y_out, columns=keys)
+    formatted_results.insert(0, "TimeArray", TimeOut)
     return formatted_results
 
-def calculate_typical_behavior(formatted_results,sample_lenght): # unused
-    '''
-    INPUT :
-        :formatted_results: time serie with fixed sampling period.
-        :sample_lenght: int. typically 24 if you want hourly value over a representative day, or 365 if you want daily value over a representative year.
-                          ! be consistent with the sampling_period !
-    OUTPUT :
-        :period_results: dictionnary of arrays of size (1,n). Typical behavior of the time serie over the chosen period, for a given sample lenght.
-    '''
-    # Initialize dictionary to store the averaged results
-    period_results = {key: [] for key in formatted_results.keys()}
+def calendar_groups(TimeArray, period: str = 'day', dt: float = None) -> tuple[np.ndarray, pd.DataFrame]:
+    """assigns every time step to a slot of a typical period, using the calendar fields of the time array (wall-clock time, local time of
+    a time-zone-aware array). Leap years and DST are handled : Feb 29th has its own slot in the typical year, and a day that lasts 23 or 25 hours does not shift the following ones.
+
+    Args:
+        TimeArray (array-like): datetime objects or np.datetime64
+        period (str, optional): 'day' (slots = time of day), 'week' (slots = weekday and time of day) or 'year' (slots = day of year). Defaults to 'day'.
+        dt (float, optional): duration of a slot of the typical day/week, in hours. Defaults to None (median sampling period of TimeArray).
 
-    # Calculate the average behavior for each hour of the day over the period
-    for key in formatted_results.keys():
-        # Split the data into two periods
-        period_data = formatted_results[key]
+    Returns:
+        tuple[np.ndarray, pd.DataFrame]: slot index of every time step (int), description of every slot (one row per slot index)
+    """
+    assert(period in ['day', 'week', 'year'])
+    t = _wall_clock(TimeArray)
+    days = t.astype("datetime64[D]")
+    if period == 'year':
+        years = t.astype("datetime64[Y]")
+        year = years.astype(np.int64) + 1970
+        month = t.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        doy = (days - years.astype("datetime64[D]")).astype(np.int64)
+        groups = doy + ((~leap) & (month > 2))                                  # day of year in a leap year (Feb 29th = 59)
+        slots = np.arange(366)
+        labels = pd.DataFrame({"day of year": np.datetime_as_string(np.datetime64('2000-01-01') + slots)}, index=slots)
+        labels["day of year"] = labels["day of year"].str[5:]                   # 'MM-DD'
+        return groups, labels
 
-        # Group the data by congruency modulo sample_lenght and calculate the mean for each group
-        period_avg = np.array([np.mean(period_data[i::sample_lenght]) for i in range(sample_lenght)])
+    dt = np.median(np.diff(t[:10001])) / np.timedelta64(1, 'h') if dt is None else dt # the head of the time array is enough to find the sampling period
+    slots_per_day = int(round(24 / dt))
+    tod = np.floor((t - days) / np.timedelta64(1, 'h') / dt + 1e-9).astype(np.int64)  # time of day slot
+    slots = np.arange(slots_per_day)
+    labels = pd.DataFrame({"time of day": pd.to_timedelta(slots * dt, unit='h')}, index=slots)
+    if period == 'day':
+        return tod, labels
+    weekday = (days.astype(np.int64) + 3) % 7                                    # 0 = Monday (1970-01-01 was a Thursday)
+    slots = np.arange(7 * slots_per_day)
+    labels = pd.DataFrame({"weekday": slots // slots_per_day, "time of day": pd.to_timedelta((slots % slots_per_day) * dt, unit='h')}, index=slots)
+    return weekday * slots_per_day + tod, labels
 
-        # Store the result of each variable
-        period_results[key] = period_avg
+def calculate_typical_behavior(formatted_results, sample_lenght: int = None, period: str = 'day', stats: tuple = ('mean',), dt: float = None) -> pd.DataFrame:
+    """Typical behavior of time series over a period : you have 10 years of data and you want to vizualise it on one averaged-year data.
+    Every column is processed in one pass (sort by slot once, then np.add.reduceat), so that multi-year results take less than a second.
 
+    Args:
+        formatted_results (dict or pd.DataFrame): time series. Must contain 'TimeArray', the time vector, unless sample_lenght is given.
+        sample_lenght (int, optional): if given, time steps are grouped by congruency modulo sample_lenght (typically 24 for hourly values over a representative day).
+                                       ! be consistent with the sampling period ! Defaults to None (calendar grouping, see period).
+        period (str, optional): 'day', 'week' or 'year', see calendar_groups(). Defaults to 'day'.
+        stats (tuple, optional): statistics calculated for every slot among 'mean', 'min', 'max', 'std' and percentiles 'pXX' (ex: 'p10', 'p50', 'p90').
+                                 Defaults to ('mean',).
+        dt (float, optional): duration of a slot of the typical day/week, in hours. Defaults to None (median sampling period).
+
+    Returns:
+        pd.DataFrame: one row per slot of the typical period (empty slots are dropped). Slot description columns, then one column per time serie and statistic :
+                      *name* for 'mean', *name*_*stat* otherwise.
+    """
+    keys = [key for key in formatted_results.keys() if key != "TimeArray"]
+    Y = np.column_stack([np.asarray(formatted_results[key], dtype=float) for key in keys])
+    if sample_lenght is not None:
+        groups = np.arange(Y.shape[0]) % sample_lenght
+        labels = pd.DataFrame({"sample": np.arange(sample_lenght)})
+    else:
+        groups, labels = calendar_groups(formatted_results["TimeArray"], period, dt)
+
+    # sort by slot once for every column (stable sort of small integers = radix sort)
+    groups = groups.astype(np.int16 if groups.max() < 2**15 else np.int64)
+    order = np.argsort(groups, kind='stable')
+    groups_sorted, Y_sorted = groups[order], Y[order]
+    starts = np.flatnonzero(np.concatenate(([True], groups_sorted[1:] != groups_sorted[:-1])))
+    counts = np.diff(np.concatenate((starts, [len(groups_sorted)])))[:, None]
+    sums = np.add.reduceat(Y_sorted, starts, axis=0)
+
+    period_results = labels.loc[groups_sorted[starts]].reset_index(drop=True)
+    Y_ranked = None
+    for stat in stats:
+        if stat == 'mean':
+            values = sums / counts
+        elif stat == 'min':
+            values = np.minimum.reduceat(Y_sorted, starts, axis=0)
+        elif stat == 'max':
+            values = np.maximum.reduceat(Y_sorted, starts, axis=0)
+        elif stat == 'std':
+            values = np.sqrt(np.maximum(np.add.reduceat(Y_sorted**2, starts, axis=0) / counts - (sums / counts)**2, 0))
+        elif stat[0] == 'p':
+            if Y_ranked is None: # values sorted within every slot, for every column (one row per column) : sort by value, then (stable) by slot
+                YT = np.ascontiguousarray(Y.T)
+                by_value = np.argsort(YT, axis=1)
+                by_slot = np.argsort(groups[by_value], axis=1, kind='stable')
+                Y_ranked = np.take_along_axis(np.take_along_axis(YT, by_value, axis=1), by_slot, axis=1).T
+            pos = starts[:, None] + float(stat[1:]) / 100 * (counts - 1)        # linear interpolation between closest ranks (same as np.percentile)
+            low = np.floor(pos).astype(np.int64)
+            high = np.minimum(low + 1, starts[:, None] + counts - 1)
+            frac = pos - low
+            values = Y_ranked[low[:, 0]] * (1 - frac) + Y_ranked[high[:, 0]] * frac
+        else:
+            raise ValueError(f"unknown statistic {stat}, choose among 'mean', 'min', 'max', 'std' or 'pXX'")
+        for j, key in enumerate(keys):
+            period_results[key if stat == 'mean' else f"{key}_{stat}"] = values[:, j]
     return period_results
 
-def plot_separately(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False):
+def _minmax_indices(values: np.ndarray, n_out: int) -> np.ndarray:
+    """indices of the minimum and of the maximum of every bucket (n_out // 2 buckets), in time order. Keeps every peak and every edge (outages...)."""
+    N = len(values)
+    bucket = -(-N // max(1, n_out // 2))                                        # ceil
+    nb_buckets = -(-N // bucket)
+    padded = np.full(nb_buckets * bucket, np.nan)
+    padded[:N] = values
+    padded = padded.reshape(nb_buckets, bucket)
+    valid = ~np.all(np.isnan(padded), axis=1)                                   # buckets full of NaN are skipped
+    start = np.arange(nb_buckets)[valid] * bucket
+    idx = np.concatenate((start + np.nanargmin(padded[valid], axis=1), start + np.nanargmax(padded[valid], axis=1), [0, N - 1]))
+    return np.unique(idx)
+
+def _lttb_indices(values: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest Triangle Three Buckets (S. Steinarsson, 2013) : keeps, in every bucket, the point forming the largest triangle with the point kept in the
+    previous bucket and the average of the next bucket. Visually closer to the original curve than min/max, for the same number of points."""
+    N = len(values)
+    x = np.arange(N, dtype=float)
+    y = np.nan_to_num(np.asarray(values, dtype=float))
+    edges = np.linspace(1, N - 1, n_out - 1).astype(np.int64)                  # n_out - 2 buckets between the first and the last point
+    sums = np.add.reduceat(y[:-1], edges[:-1])                                 # sum of every bucket [edges[i], edges[i+1])
+    counts = np.diff(edges)
+    next_mean_y = np.append(sums[1:] / np.maximum(counts[1:], 1), y[-1])        # average of the next bucket (last point after the last bucket)
+    next_mean_x = np.append((edges[1:-1] + edges[2:] - 1) / 2, N - 1)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, N - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        areas = np.abs((x[a] - next_mean_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_mean_y[i] - y[a]))
+        a = lo + int(np.argmax(areas))
+        idx[i + 1] = a
+    return np.unique(idx)
+
+def decimate(TimeArray, values, n_out: int, method: str = 'minmax') -> tuple[np.ndarray, np.ndarray]:
+    """reduces a time serie to about n_out points before plotting it (a curve can't show more than 2 points per pixel column anyway).
+
+    Args:
+        TimeArray (array-like): time vector (datetime or float), regularly sampled
+        values (array-like): values of the time serie
+        n_out (int): maximum number of points kept, usually twice the width of the axes in pixels
+        method (str, optional): 'minmax' : minimum and maximum of every bucket, keeps every peak and every outage edge
+                                'lttb' : Largest Triangle Three Buckets, one point per bucket, closer to the shape of smooth curves.
+                                Defaults to 'minmax'.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: decimated time and values (unchanged if they already have less than n_out points)
+    """
+    assert(method in ['minmax', 'lttb'])
+    TimeArray, values = np.asarray(TimeArray), np.asarray(values)
+    if len(values) <= max(n_out, 3):
+        return TimeArray, values
+    idx = _minmax_indices(values.astype(float), n_out) if method == 'minmax' else _lttb_indices(values, max(n_out, 3))
+    return TimeArray[idx], values[idx]
+
+def _decimation_points(decimation: str, plot: bool, width_px: float) -> tuple[str, int]:
+    """decimation method and number of points of the curves of one axes (None if the curves are plotted entirely)"""
+    assert(decimation in ['auto', 'minmax', 'lttb', None])
+    if decimation == 'auto': # only figures that will never be zoomed in are decimated (figure bundles are decimated again on zoom by pkl_plot)
+        decimation = 'minmax' if not plot else None
+    return decimation, max(3, int(2 * width_px))
+
+def _plot_line(ax, TimeArray, values, decimation: tuple[str, int], **kwargs):
+    """ax.plot() of a (decimated) time serie"""
+    method, n_out = decimation
+    if method is not None:
+        TimeArray, values = decimate(TimeArray, values, n_out, method)
+    return ax.plot(TimeArray, values, **kwargs)
+
+_FigureTemplates = OrderedDict() # saved figures, emptied and reused by figure_context() (least recently used first)
+FigureTemplatesMax = 4           # number of figure templates kept between two figures
+
+def _figure_key(spec: dict) -> str:
+    """figures with the same key have the same axes, at the same place"""
+    return repr((spec["figsize"], spec["grid"], len(spec["axes"]), spec.get("subplots_adjust")))
+
+def _new_figure(spec: dict, interactive: bool) -> "Figure":
+    """empty figure with the axes of a layout : managed by pyplot if it is shown, a standalone Agg figure (unknown to pyplot) otherwise"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    nb_rows, nb_cols = spec["grid"]
+    if interactive:
+        fig, axes = _pyplot().subplots(nb_rows, nb_cols, figsize=tuple(spec["figsize"]))
+    else:
+        fig = Figure(figsize=tuple(spec["figsize"]))
+        FigureCanvasAgg(fig)
+        axes = fig.subplots(nb_rows, nb_cols)
+    axes = np.array(axes).reshape(-1)  # Flatten for easy indexing
+    for j in range(len(spec["axes"]), len(axes)):
+        fig.delaxes(axes[j])     # Hide unused subplots
+    return fig
+
+@contextmanager
+def figure_context(spec: dict, interactive: bool = False):
+    """owner of the figures of the plot functions : gives an empty figure with the axes of a layout, and releases it at the end of the block.
+    Saved figures are taken from a small cache of templates (same figsize and axes), emptied after being saved and reused by the next figure
+    with the same layout : repeated runs neither create nor keep figures. Shown figures (interactive) are pyplot figures, closed once shown.
+
+    Args:
+        spec (dict): layout of the figure (see draw_figure())
+        interactive (bool, optional): True if the figure is shown (plt.show()). Defaults to False.
+
+    Yields:
+        matplotlib.figure.Figure: the figure, to be filled with draw_figure(..., fig=fig)
+    """
+    key = _figure_key(spec)
+    fig = _FigureTemplates.pop(key, None) if not interactive else None
+    if fig is None:
+        fig = _new_figure(spec, interactive)
+    try:
+        yield fig
+    finally:
+        if interactive:
+            _pyplot().close(fig)
+        else:
+            for ax in fig.axes:
+                ax.clear()   # drops the curves : the template keeps no reference to the time series
+            fig.subplots_adjust(**{param: _pyplot().rcParams["figure.subplot." + param] for param in ["left", "right", "bottom", "top", "wspace", "hspace"]}) # undoes tight_layout()
+            _FigureTemplates[key] = fig
+            while len(_FigureTemplates) > FigureTemplatesMax:
+                _FigureTemplates.popitem(last=False)
+
+def draw_figure(spec: dict, data, decimation: str = 'minmax', interactive: bool = False, fig: "Figure" = None):
+    """builds a figure from its layout (see _spec_compact(), _spec_separately(), _spec_group()) and its time series.
+
+    Args:
+        spec (dict): layout of the figure : figsize, grid of axes, curves of every axes (column of data, label, color...), titles...
+        data (pd.DataFrame | dict): time series, with a 'TimeArray' column
+        decimation (str, optional): 'minmax', 'lttb' or None (see decimate()). Defaults to 'minmax'.
+        interactive (bool, optional): if True, the curves are decimated again (full resolution of the visible window) every time the user zooms or pans. Defaults to False.
+        fig (matplotlib.figure.Figure, optional): empty figure given by figure_context(). Defaults to None (new pyplot figure, to be closed by the caller).
+
+    Returns:
+        matplotlib.figure.Figure: the figure
+    """
+    nb_rows, nb_cols = spec["grid"]
+    if fig is None:
+        fig = _new_figure(spec, interactive=True)
+    decim = _decimation_points(decimation, False, fig.get_figwidth() * fig.dpi / nb_cols)
+    TimeArray = np.asarray(data["TimeArray"])
+    for ax, ax_spec in zip(fig.axes, spec["axes"]):
+        if ax_spec is None: # empty subplot
+            continue
+        lines = [(_plot_line(ax, TimeArray, np.asarray(data[line["column"]]), decim, **{key: val for key, val in line.items() if key != "column"})[0], line["column"])
+                 for line in ax_spec["lines"]]
+        if ax_spec.get("hline") is not None:
+            ax.axhline(0, **ax_spec["hline"])  # Add y=0 axis
+        if ax_spec.get("xlim"):
+            ax.set_xlim(TimeArray[0], TimeArray[-1])
+        if ax_spec.get("title"):
+            ax.set_title(ax_spec["title"])
+        if ax_spec.get("xlabel"):
+            ax.set_xlabel(ax_spec["xlabel"])
+        if ax_spec.get("ylabel"):
+            ax.set_ylabel(ax_spec["ylabel"])
+        ax.legend()
+        ax.grid(True)
+        ax.tick_params(axis='x', rotation=ax_spec.get("rotation", 0))
+        if interactive and decim[0] is not None:
+            _ZoomDecimator(ax, TimeArray, {column: np.asarray(data[column]) for _, column in lines}, lines, decim)
+    fig.tight_layout()
+    if spec.get("subplots_adjust"):
+        fig.subplots_adjust(**spec["subplots_adjust"])  # Adjust spacing
+    return fig
+
+class _ZoomDecimator:
+    """re-decimates the curves of one axes to its visible window, every time its x limits change (zoom, pan)"""
+    def __init__(self, ax, TimeArray: np.ndarray, values: dict, lines: list, decimation: tuple[str, int]):
+        self.TimeArray, self.values, self.lines, self.decimation = TimeArray, values, lines, decimation
+        import matplotlib.dates as mdates
+        self.x = mdates.date2num(TimeArray) if np.issubdtype(TimeArray.dtype, np.datetime64) else TimeArray.astype(float)
+        ax._zoom_decimator = self                                                # the callback only keeps a weak reference
+        ax.callbacks.connect('xlim_changed', self.update)
+
+    def update(self, ax):
+        x_min, x_max = ax.get_xlim()
+        lo = max(0, int(np.searchsorted(self.x, x_min)) - 1)                    # one point outside the window on each side
+        hi = min(len(self.x), int(np.searchsorted(self.x, x_max, side='right')) + 1)
+        method, n_out = self.decimation
+        for line, column in self.lines:
+            line.set_data(*decimate(self.TimeArray[lo:hi], self.values[column][lo:hi], n_out, method))
+
+def save_figure_bundle(spec: dict, dfResults, file_name: str) -> str:
+    """saves a figure as a bundle : its time series (uncompressed columns) and its layout (JSON). Much smaller and faster than a pickled
+    matplotlib figure, and independant of the matplotlib version. Open it with pkl_plot (or show_figure_bundle()).
+
+    Args:
+        spec (dict): layout of the figure (see draw_figure())
+        dfResults (pd.DataFrame | dict): time series, with a 'TimeArray' column
+        file_name (str): path of the bundle, without extension
+
+    Returns:
+        str: path of the bundle (*file_name*.vfig)
+    """
+    columns = ["TimeArray"] + list(dict.fromkeys(line["column"] for ax_spec in spec["axes"] if ax_spec is not None for line in ax_spec["lines"]))
+    RIO.write_figure_bundle(file_name + '.vfig', {col: dfResults[col] for col in columns}, spec)
+    return file_name + '.vfig'
+
+def show_figure_bundle(file_path: str, decimation: str = 'minmax'):
+    """interactive viewer of a figure bundle : the time series are memory mapped, and only the visible window is plotted at full resolution.
+
+    Args:
+        file_path (str): path of the .vfig file
+        decimation (str, optional): 'minmax', 'lttb' or None (see decimate()). Defaults to 'minmax'.
+    """
+    spec, data = RIO.read_figure_bundle(file_path)
+    draw_figure(spec, data, decimation, interactive=True)
+    _pyplot().show()
+
+def _save_figure(spec: dict, dfResults, plot_name: str, png: bool, pkl: bool, plot: bool, decimation: str):
+    """saves and/or shows a figure of the plot functions"""
+    if pkl:
+        save_figure_bundle(spec, dfResults, plot_name)
+    if png or plot:
+        method = _decimation_points(decimation, plot, 0)[0]
+        with figure_context(spec, interactive=plot) as fig:
+            draw_figure(spec, dfResults, method, interactive=plot, fig=fig)
+            if png:
+                fig.savefig(plot_name + '.png', bbox_inches='tight')  # Save with reduced empty space
+            if plot:
+                _pyplot().show()
+
+def _export(dfResults, plot_name: str, func, args: tuple, csv: bool, png: bool, pkl: bool, plot: bool, formats: list[str], decimation: str, jobs: list) -> bool:
+    """data export common to the plot functions. Returns True if the figure must be built now"""
+    assert '.csv' not in (formats or []), "!!! the .csv file is requested by the csv flag, not by formats !!!"
+    if csv or formats: # data is saved first : no figure is built if only data is requested
+        RIO.write_results(dfResults, plot_name, (['.csv'] if csv else []) + list(formats or []))
+    if not (png or pkl or plot):
+        return False
+    if jobs is not None and not plot: # the figure is built later, in parallel with the other ones (see render_figures())
+        jobs.append((func, args, {"png": png, "pkl": pkl, "decimation": decimation})) # module-level function : pickled by reference
+        return False
+    return True
+
+def _spec_separately(dfResults) -> dict:
+    """layout of plot_separately() : one axes per time serie"""
+    nb_fig = len(dfResults.keys())
+    nb_cols = max(2, min(3, nb_fig // 4))  # 2 <= nb_cols <= 3
+    nb_rows = (nb_fig + nb_cols - 1) // nb_cols  # Compute required rows
+    colors = ['green', 'red', 'blue', 'orange', 'purple', 'grey', 'pink']
+    axes = [None if name == "TimeArray" else
+            {"lines": [{"column": name, "label": name, "color": colors[i % len(colors)]}],
+             "hline": {"color": 'black', "linewidth": 0.2}, "xlim": True, "title": f'{name} over time', "ylabel": name, "rotation": 30}
+            for i, name in enumerate(dfResults.keys())]
+    return {"figsize": [6 * nb_cols, 3 * nb_rows], "grid": [nb_rows, nb_cols], "axes": axes, "subplots_adjust": {"hspace": 0.5, "wspace": 0.3}}
+
+def _spec_compact(dfResults) -> dict:
+    """layout of plot_compact() : 4 axes (load and production, controllable supply, power deltas, SOC and fuel)"""
+    curves = [# 1. Load and Renewable Energy Production
+              ('Load Demand and Renewable Power', 'power (kW)',
+               [('P_green', 'greenpower', 'green', 1), ('P_L', 'input loadpower', 'purple', 0.8), ('P_L_modif', 'clipped loadpower', 'red', 0.5)]),
+              # 3. Controllable Power Supply
+              ('Controllable Power Supply', 'power (kW)',
+               [('P_grid', 'Grid', 'blue', 1), ('P_bat', 'Battery', 'green', 0.7), ('P_diesel', 'Diesel', 'red', 0.6)]),
+              # 2. Power Deltas
+              ('Excess And Deficit Power', 'power (kW)',
+               [('P_net_modif', 'P_net_modif = P_green - P_L_modif', 'blue', 1), ('P_resistor', 'P_resistor', 'orange', 0.7)]),
+              # 4. SOC and Fuel Amount
+              ('State Of Charge (SOC) of batteries (%) and Fuel Rate (%)', 'SOC, Fuel Rate',
+               [('SOC', 'overall SOC', 'green', 1), ('F_C', 'fuel tank', 'red', 1)])]
+    axes = [{"lines": [{"column": col, "label": label, "color": color, "alpha": alpha} for col, label, color, alpha in lines if col in dfResults.keys()],
+             "hline": {"color": 'black', "linewidth": 0.5}, "xlim": True, "title": title, "ylabel": ylabel, "rotation": 15}
+            for title, ylabel, lines in curves]
+    return {"figsize": [20, 6], "grid": [2, 2], "axes": axes}
+    #       width --^   ^-- height
+
+def _spec_group(dfResults, plot_name: str, title: str) -> dict:
+    """layout of plot_group() : every time serie on the same axes"""
+    colors = ['black','blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'gray']
+    keys = list(dfResults.keys())
+    lines = [{"column": dataset, "label": dataset, "color": colors[i % len(colors)], "linewidth": 1, "alpha": 1 - 0.5 * i / len(keys)}
+             for i, dataset in enumerate(keys) if dataset != "TimeArray"]
+    return {"figsize": [10, 5], "grid": [1, 1],  # Set figure size for better visibility
+            "axes": [{"lines": lines, "hline": {"color": 'black', "linestyle": '--', "linewidth": 1}, "xlabel": 'time', "rotation": 30,
+                      "title": title if title != '' else plot_name + ' over time'}]}
+
+def plot_separately(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False, formats: list[str] = None, decimation: str = 'auto', jobs: list = None):
     """Quickly plot a bunch of time series on one PNG file with an elongated layout.
        Saves the figure into a png file showing all graphs with a long horizontal format.
 
@@ -117,55 +548,17 @@ def plot_separately(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png
         plot_name (str): name of the output file (without extension)
         csv (bool, optional): if True, saves the time series under output//*plot_name*.csv. Defaults to False.
         png (bool, optional): if True, saves the figure under output//*plot_name*.png. Defaults to False.
-        pkl (bool, optional): if True, saves the figure under output//*plot_name*.pkl. This file can be read by pkl_plot. Defaults to False.
+        pkl (bool, optional): if True, saves the figure bundle under output//*plot_name*.vfig (time series + layout, see save_figure_bundle()). This file can be read by pkl_plot. Defaults to False.
         plot (bool, optional): if True, shows the figure. Defaults to False.
+        formats (list[str], optional): other data formats of the time series, among ResultsIO.DataFormats ('.parquet', '.feather', '.npz', '.arrow' : not '.csv', see csv). Defaults to None.
+        decimation (str, optional): reduction of the curves to about 2 points per pixel before plotting (see decimate()) : 'minmax', 'lttb' or None (every point is plotted).
+                                    Defaults to 'auto' ('minmax' unless the figure is shown with plot=True and can be zoomed in).
+        jobs (list, optional): if given, the figure isn't built now but added to this list, to be rendered by render_figures() (figures shown with plot=True are built now). Defaults to None.
     """
-    TS_len = dfResults.shape[0] # lenght of the time series
-
-    nb_fig = dfResults.shape[1]
-    nb_cols = max(2, min(3, nb_fig // 4))  # 2 <= nb_cols <= 3
-    nb_rows = (nb_fig + nb_cols - 1) // nb_cols  # Compute required rows
-
-    fig, axes = plt.subplots(nb_rows, nb_cols, figsize=(6 * nb_cols, 3 * nb_rows))
-    axes = np.array(axes).reshape(-1)  # Flatten for easy indexing
-
-    colors = ['green', 'red', 'blue', 'orange', 'purple', 'grey', 'pink']
-    
-    for i, (name, data) in enumerate(dfResults.items()):
-        if name != "TimeArray":
-            ax = axes[i]
-            ax.plot(dfResults["TimeArray"], data, label=name, color=colors[i % len(colors)])
-            ax.axhline(0, color='black', linewidth=0.2)  # Add y=0 axis
-            ax.set_xlim(dfResults["TimeArray"].head(1), dfResults["TimeArray"][TS_len-1])
-            ax.set_title(f'{name} over time')
-            ax.set_ylabel(name)
-            ax.legend()
-            ax.grid(True)
-
-            # Format X-axis to avoid overlap
-            # ax.xaxis.set_major_locator(mdates.AutoDateLocator())  # Auto-ajuste les ticks
-            # ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))  # Formatte les dates
-            # plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha="right")  # Rotation pour lisibilite
-            ax.tick_params(axis='x', rotation=30)
-        
-    for j in range(i + 1, len(axes)):
-        fig.delaxes(axes[j])     # Hide unused subplots
-
-    plt.tight_layout()
-    plt.subplots_adjust(hspace=0.5, wspace=0.3)  # Adjust spacing
+    if _export(dfResults, plot_name, plot_separately, (dfResults, plot_name), csv, png, pkl, plot, formats, decimation, jobs):
+        _save_figure(_spec_separately(dfResults), dfResults, plot_name, png, pkl, plot, decimation)
 
-    if csv:
-        dfResults = pd.DataFrame(dfResults)
-        dfResults.to_csv(plot_name + '.csv')
-    if png:
-        plt.savefig(plot_name + '.png', bbox_inches='tight')  # Save with reduced empty space
-    if pkl:
-        with open(plot_name + ".pkl", "wb") as f:
-            pickle.dump(fig, f)        
-    if plot:
-        plt.show()
-
-def plot_compact(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False):
+def plot_compact(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False, formats: list[str] = None, decimation: str = 'auto', jobs: list = None):
     """Especially created for showing important time series generated by handmade PMSs LFE_CCE_emergency_system.py, LFE_CCE_self_sufficiency.py and cost_strat.py
 
     Args:
@@ -174,95 +567,17 @@ def plot_compact(dfResults : pd.DataFrame, plot_name: str,csv: bool=False,png: b
         plot_name (str): name of the output file (without extension)
         csv (bool, optional): if True, saves the time series under output//*plot_name*.csv. Defaults to False.
         png (bool, optional): if True, saves the figure under output//*plot_name*.png. Defaults to False.
-        pkl (bool, optional): if True, saves the figure under output//*plot_name*.pkl. This file can be read by pkl_plot. Defaults to False.
+        pkl (bool, optional): if True, saves the figure bundle under output//*plot_name*.vfig (time series + layout, see save_figure_bundle()). This file can be read by pkl_plot. Defaults to False.
         plot (bool, optional): if True, shows the figure. Defaults to False.
+        formats (list[str], optional): other data formats of the time series, among ResultsIO.DataFormats ('.parquet', '.feather', '.npz', '.arrow' : not '.csv', see csv). Defaults to None.
+        decimation (str, optional): reduction of the curves to about 2 points per pixel before plotting (see decimate()) : 'minmax', 'lttb' or None (every point is plotted).
+                                    Defaults to 'auto' ('minmax' unless the figure is shown with plot=True and can be zoomed in).
+        jobs (list, optional): if given, the figure isn't built now but added to this list, to be rendered by render_figures() (figures shown with plot=True are built now). Defaults to None.
     """
-    plt.close('all') # cleaning of previous plots
-
-    TS_len = len(dfResults["TimeArray"]) # lenght of the time series
-
-    fig, axes = plt.subplots(2, 2, figsize=(20, 6))
-    #                               width --^   ^-- height
-    axes = axes.flatten()
-
-    # 1. Load and Renewable Energy Production
-    if 'P_green' in dfResults.keys():
-        axes[0].plot(dfResults["TimeArray"], dfResults['P_green'], label='greenpower', color='green')
-    if 'P_L' in dfResults.keys():
-        axes[0].plot(dfResults["TimeArray"], dfResults['P_L'], label='input loadpower', color='purple', alpha=0.8)
-    if 'P_L_modif' in dfResults.keys():
-        axes[0].plot(dfResults["TimeArray"], dfResults['P_L_modif'], label='clipped loadpower', color='red', alpha=0.5)
-    axes[0].set_xlim(dfResults["TimeArray"].head(1), dfResults["TimeArray"][TS_len-1])
-    axes[0].set_title('Load Demand and Renewable Power')
-    axes[0].set_ylabel('power (kW)')
-    # axes[0].set_xlabel('time')
-    axes[0].legend()
-    axes[0].grid(True)
-    axes[0].axhline(0, color='black', linewidth=0.5)  # Add y=0 axis
-    axes[0].tick_params(axis='x', rotation=15)
-
-    # 3. Controllable Power Supply
-    if 'P_grid' in dfResults.keys():
-        axes[1].plot(dfResults["TimeArray"], dfResults['P_grid'], label='Grid', color='blue')
-    if 'P_bat' in dfResults.keys():
-        axes[1].plot(dfResults["TimeArray"], dfResults['P_bat'], label='Battery', color='green', alpha=0.7)
-    if 'P_diesel' in dfResults.keys():
-        axes[1].plot(dfResults["TimeArray"], dfResults['P_diesel'], label='Diesel', color='red', alpha=0.6)
-    axes[1].set_xlim(dfResults["TimeArray"].head(1), dfResults["TimeArray"][TS_len-1])
-    axes[1].set_title('Controllable Power Supply')
-    # axes[1].set_xlabel('time')
-    axes[1].set_ylabel('power (kW)')
-    axes[1].legend()
-    axes[1].grid(True)
-    axes[1].axhline(0, color='black', linewidth=0.5)  # Add y=0 axis
-    axes[1].tick_params(axis='x', rotation=15)
-
-    # 2. Power Deltas
-    if 'P_net_modif' in dfResults.keys():
-        axes[2].plot(dfResults["TimeArray"], dfResults['P_net_modif'], label='P_net_modif = P_green - P_L_modif', color='blue')
-    if 'P_resistor' in dfResults.keys():
-        axes[2].plot(dfResults["TimeArray"], dfResults['P_resistor'], label='P_resistor', color='orange', alpha=0.7)
-    axes[2].set_xlim(dfResults["TimeArray"].head(1), dfResults["TimeArray"][TS_len-1])
-    axes[2].set_title('Excess And Deficit Power')
-    # axes[2].set_xlabel('time')
-    axes[2].set_ylabel('power (kW)')
-    axes[2].legend()
-    axes[2].grid(True)
-    axes[2].axhline(0, color='black', linewidth=0.5)  # Add y=0 axis
-    axes[2].tick_params(axis='x', rotation=15)
-
-    # 4. SOC and Fuel Amount
-    if 'SOC' in dfResults.keys():
-        axes[3].plot(dfResults["TimeArray"], dfResults['SOC'], label='overall SOC', color='green')
-    if 'F_C' in dfResults.keys():
-        axes[3].plot(dfResults["TimeArray"], dfResults['F_C'], label='fuel tank', color='red')
-    axes[3].set_xlim(dfResults["TimeArray"].head(1), dfResults["TimeArray"][TS_len-1])
-    axes[3].set_title('State Of Charge (SOC) of batteries (%) and Fuel Rate (%)')
-    # axes[3].set_xlabel('time')
-    axes[3].set_ylabel('SOC, Fuel Rate')
-    axes[3].legend()
-    axes[3].grid(True)
-    axes[3].axhline(0, color='black', linewidth=0.5)  # Add y=0 axis
-    axes[3].tick_params(axis='x', rotation=15)
-
-    # # 5 & 6 : Empty → optionally hide them
-    # for ax in axes[4:]:
-    #     fig.delaxes(ax)
-
-    plt.tight_layout()
-
-    if csv:
-        dfResults = pd.DataFrame(dfResults)
-        dfResults.to_csv(plot_name + '.csv')
-    if png:
-        plt.savefig(plot_name + '.png', bbox_inches='tight')  # Save with reduced empty space
-    if pkl:
-        with open(plot_name + ".pkl", "wb") as f:
-            pickle.dump(fig, f)        
-    if plot:
-        plt.show()
+    if _export(dfResults, plot_name, plot_compact, (dfResults, plot_name), csv, png, pkl, plot, formats, decimation, jobs):
+        _save_figure(_spec_compact(dfResults), dfResults, plot_name, png, pkl, plot, decimation)
 
-def plot_group(dfResults : pd.DataFrame, plot_name: str, title: str = '',csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False):
+def plot_group(dfResults : pd.DataFrame, plot_name: str, title: str = '',csv: bool=False,png: bool=False,pkl: bool=False,plot: bool=False, formats: list[str] = None, decimation: str = 'auto', jobs: list = None):
     """Plot multiple time series on the same graph with a common time axis.
 
     Args:
@@ -272,41 +587,99 @@ def plot_group(dfResults : pd.DataFrame, plot_name: str, title: str = '',csv: bo
         title (str, optional): title of the graph. Defaults to '' for no title.
         csv (bool, optional): if True, saves the time series under *plot_name*.csv. Defaults to False.
         png (bool, optional): if True, saves the figure under *plot_name*.png. Defaults to False.
-        pkl (bool, optional): if True, saves the figure under *plot_name*.pkl. This file can be read by pkl_plot. Defaults to False.
+        pkl (bool, optional): if True, saves the figure bundle under *plot_name*.vfig (time series + layout, see save_figure_bundle()). This file can be read by pkl_plot. Defaults to False.
         plot (bool, optional): if True, shows the figure. Defaults to False.
+        formats (list[str], optional): other data formats of the time series, among ResultsIO.DataFormats ('.parquet', '.feather', '.npz', '.arrow' : not '.csv', see csv). Defaults to None.
+        decimation (str, optional): reduction of the curves to about 2 points per pixel before plotting (see decimate()) : 'minmax', 'lttb' or None (every point is plotted).
+                                    Defaults to 'auto' ('minmax' unless the figure is shown with plot=True and can be zoomed in).
+        jobs (list, optional): if given, the figure isn't built now but added to this list, to be rendered by render_figures() (figures shown with plot=True are built now). Defaults to None.
     """
-    fig = plt.figure(figsize=(10, 5))  # Set figure size for better visibility
-    
-    colors = ['black','blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'gray']
+    if _export(dfResults, plot_name, plot_group, (dfResults, plot_name, title), csv, png, pkl, plot, formats, decimation, jobs):
+        _save_figure(_spec_group(dfResults, plot_name, title), dfResults, plot_name, png, pkl, plot, decimation)
 
-    for i, dataset in enumerate(dfResults.keys()):
-        if dataset != "TimeArray":
-            plt.plot(dfResults["TimeArray"], dfResults[dataset], label=dataset, color=colors[i % len(colors)], linewidth=1, alpha=1 - 0.5 * i / len(dfResults.keys()))
+def _agg_backend():
+    """initializer of the figure workers : non interactive backend (figures are only saved)"""
+    _pyplot().switch_backend('Agg')
 
-    plt.axhline(0, color='black', linestyle='--', linewidth=1)  # Add y=0 axis
-    plt.xlabel('time')
-    plt.tick_params(axis='x', rotation=30)
+def _render_job(job: tuple) -> str:
+    """builds and saves one figure of render_figures() (in a worker process)"""
+    func, args, kwargs = job
+    func(*args, **kwargs)
+    _pyplot().close('all')
+    return args[1]
 
-    if title != '':
-        plt.title(title)
-    else:
-        plt.title(plot_name + ' over time')
-    plt.legend()
-    plt.grid(True)
-    
-    if csv:
-        dfResults = pd.DataFrame(dfResults)
-        dfResults.to_csv(plot_name + '.csv')
-    if png:
-        plt.savefig(plot_name + '.png', bbox_inches='tight')  # Save with reduced empty space
-    if pkl:
-        with open(plot_name + ".pkl", "wb") as f:
-            pickle.dump(fig, f)        
-    if plot:
-        plt.show()
+def render_figures(jobs: list, workers: int = None) -> list[str]:
+    """builds and saves the figures deferred by plot_compact(), plot_separately() and plot_group() (jobs argument), in parallel processes using the Agg backend.
+    NB : on Windows and macOS, worker processes import the main script again : it must be protected by if __name__ == "__main__".
+
+    Args:
+        jobs (list): figures to build, filled by the plot functions
+        workers (int, optional): number of processes. Defaults to None (one per figure, at most one per CPU). 1 builds the figures one after another, without any process.
+
+    Returns:
+        list[str]: names of the rendered figures (without extension)
+    """
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_agg_backend) as pool:
+        return list(pool.map(_render_job, jobs))
+
+RelErrorMethods = ['reference_f', 'reference_g', 'maximum', 'average']
+BatchCells = 1 << 22 # values processed at once by relative_errors() (runs x time steps), bounds the memory of the intermediate arrays
+
+def _stack_series(values, names: list = None) -> tuple[np.ndarray, list]:
+    """2D float array (series x time) and names of the series, from a 2D array or a dict of series"""
+    if isinstance(values, dict):
+        names = list(values.keys()) if names is None else names
+        return np.vstack([np.asarray(values[name], dtype=float) for name in names]), names
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    return values, list(range(len(values))) if names is None else names
+
+def _lp_norm(hours: np.ndarray, values: np.ndarray, p: float) -> np.ndarray:
+    """Lp norm of every row of values (series x time) : integral over time (trapezoidal rule), or maximum for p = inf"""
+    if p == float('inf'):
+        return np.max(np.abs(values), axis=-1)
+    return np.trapezoid(np.abs(values)**p, hours, axis=-1)**(1/p)
+
+def relative_errors(TimeArray, f_values, g_values, p=2, method: str = 'reference_f') -> pd.DataFrame:
+    """batched relative_error() : relative differences between many pairs of time series sharing the same time array (e.g. every variable of
+    hundreds of runs against the exports of a reference tool), computed with array operations, without any figure.
+
+    Args:
+        TimeArray (array-like): time list (datetime objects, np.datetime64 or hours)
+        f_values (np.ndarray | dict): reference series : 2D array (series x time) or dict {name: values}
+        g_values (np.ndarray | dict): compared series, same shape (or same names) as f_values
+        p (float | list, optional): Lp norm parameter(s) (power): 0 < p <= inf. Several norms can be computed at once, e.g. [1, 2, float('inf')]. Defaults to 2.
+        method (str, optional): Calculation method of relative difference (see relative_error()). Defaults to 'reference_f'.
+
+    Returns:
+        pd.DataFrame: one row per pair of series and per p : series (name or row), p, norm_diff, norm_f, norm_g, rel_error
+    """
+    if method not in RelErrorMethods:
+        raise ValueError("Methode invalide. Choisissez 'reference_f', 'reference_g', 'maximum' ou 'average'")
+    F, names = _stack_series(f_values)
+    G, _ = _stack_series(g_values, names if isinstance(g_values, dict) else None)
+    if F.shape != G.shape or F.shape[1] != len(TimeArray):
+        raise ValueError("Les tableaux TimeArray, f_values et g_values doivent avoir la même taille")
+    hours = _hours(TimeArray)[0]
+    norms = {"norm_diff": [], "norm_f": [], "norm_g": []}
+    ps = list(p) if np.ndim(p) else [p]
+    rows = max(1, BatchCells // max(1, F.shape[1]))
+    for start in range(0, len(F), rows): # blocks of series
+        f, g = F[start:start + rows], G[start:start + rows]
+        d = f - g
+        for key, values in [("norm_diff", d), ("norm_f", f), ("norm_g", g)]:
+            norms[key].append(np.stack([_lp_norm(hours, values, p_i) for p_i in ps], axis=1))  # (series x p)
+    norm_diff, norm_f, norm_g = [np.concatenate(norms[key]).reshape(-1) for key in ["norm_diff", "norm_f", "norm_g"]]
+    reference = {'reference_f': norm_f, 'reference_g': norm_g, 'maximum': np.maximum(norm_f, norm_g), 'average': (norm_f + norm_g) / 2}[method]
+    rel_error = np.divide(norm_diff, reference, out=np.where(norm_diff > 0, np.inf, 0.), where=reference != 0)
+    return pd.DataFrame({"series": np.repeat(np.array(names, dtype=object), len(ps)), "p": np.tile(np.array(ps, dtype=float), len(names)),
+                         "norm_diff": norm_diff, "norm_f": norm_f, "norm_g": norm_g, "rel_error": rel_error})
 
 def relative_error(TimeArray: np.ndarray, f_values: np.ndarray, g_values: np.ndarray, p: int = 2, method: str = 'reference_f', plot: bool = False, png_name: str = "") -> tuple[float, dict]:
-    """Calculates the relative difference between two functions of time f and g, using the Lp norm (p can be defined precisely)
+    """Calculates the relative difference between two functions of time f and g, using the Lp norm (p can be defined precisely).
+    See relative_errors() to compare many pairs of series at once.
 
     Args:
         TimeArray (np.ndarray): time list (np.array of datetime objects)
@@ -327,91 +700,20 @@ def relative_error(TimeArray: np.ndarray, f_values: np.ndarray, g_values: np.nda
     # Verification des dimensions
     if len(TimeArray) != len(f_values) or len(TimeArray) != len(g_values):
         raise ValueError("Les tableaux TimeArray, f_values et g_values doivent avoir la même taille")
-    
-    # nettoyage des precedents plots
-    plt.close('all')
+    dfError = relative_errors(TimeArray, [f_values], [g_values], p, method)
+    norm_diff, norm_f, norm_g, rel_error = [dfError[key][0] for key in ["norm_diff", "norm_f", "norm_g", "rel_error"]]
+
+    # Creation des graphiques (seulement si demandes)
+    if plot or png_name != "":
+        f_values, g_values = np.asarray(f_values, dtype=float), np.asarray(g_values, dtype=float)
+        dfPlot = {"TimeArray": TimeArray if np.asarray(TimeArray).dtype.kind in "fiu" else np.asarray(pd.to_datetime(TimeArray), dtype="datetime64[ns]"),
+                  "f": f_values, "g": g_values, "|f-g|": np.abs(f_values - g_values)}
+        spec = {"figsize": [12, 8], "grid": [2, 1],
+                "axes": [{"lines": [{"column": "f", "label": 'f_HOMER', "color": 'b'},
+                                    {"column": "g", "label": 'g_myPMS', "color": 'r', "linestyle": '--', "alpha": 0.7}], "title": 'Comparaison des fonctions'},
+                         {"lines": [{"column": "|f-g|", "label": '|f-g|', "color": 'g'}], "title": 'Difference absolue |f-g|'}]}
+        _save_figure(spec, dfPlot, png_name, png_name != "", False, plot, 'auto')
 
-    # Conversion des datetimes en heures depuis le premier point pour l'integration
-    if isinstance(TimeArray[0], datetime):
-        time_hours = np.array([(t - TimeArray[0]).total_seconds() / 3600 for t in TimeArray])
-    else:
-        time_hours = TimeArray  # Supposer que c'est deja dans un format numerique
-    
-    # Calcul de la difference
-    diff = np.abs(f_values - g_values)
-    
-    # Calcul des normes Lp
-    if p == float('inf'):
-        # Norme L∞ (norme uniforme)
-        norm_diff = np.max(diff)
-        norm_f = np.max(np.abs(f_values))
-        norm_g = np.max(np.abs(g_values))
-    else:
-        # Pour les autres normes Lp, nous utilisons l'integration numerique (methode des trapezes)
-        diff_power_p = diff**p
-        f_power_p = np.abs(f_values)**p
-        g_power_p = np.abs(g_values)**p
-        
-        # Integration
-        integral_diff = np.trapz(diff_power_p, time_hours)
-        integral_f = np.trapz(f_power_p, time_hours)
-        integral_g = np.trapz(g_power_p, time_hours)
-        
-        # Normes Lp
-        norm_diff = integral_diff**(1/p)
-        norm_f = integral_f**(1/p)
-        norm_g = integral_g**(1/p)
-    
-    # Calcul de l'ecart relatif selon la methode choisie
-    if method == 'reference_f':
-        if norm_f == 0:
-            rel_error = float('inf') if norm_diff > 0 else 0
-        else:
-            rel_error = norm_diff / norm_f
-    elif method == 'reference_g':
-        if norm_g == 0:
-            rel_error = float('inf') if norm_diff > 0 else 0
-        else:
-            rel_error = norm_diff / norm_g
-    elif method == 'maximum':
-        max_norm = max(norm_f, norm_g)
-        if max_norm == 0:
-            rel_error = float('inf') if norm_diff > 0 else 0
-        else:
-            rel_error = norm_diff / max_norm
-    elif method == 'average':
-        avg_norm = (norm_f + norm_g) / 2
-        if avg_norm == 0:
-            rel_error = float('inf') if norm_diff > 0 else 0
-        else:
-            rel_error = norm_diff / avg_norm
-    else:
-        raise ValueError("Methode invalide. Choisissez 'reference_f', 'reference_g', 'maximum' ou 'average'")
-    
-    # Creation des graphiques
-    plt.figure(figsize=(12, 8))
-    
-    # Sous-graphique pour les fonctions
-    plt.subplot(2, 1, 1)
-    plt.plot(TimeArray, f_values, 'b-', label='f_HOMER')
-    plt.plot(TimeArray, g_values, 'r--', label='g_myPMS', alpha=0.7)
-    plt.legend()
-    plt.title(f'Comparaison des fonctions')
-    plt.grid(True)
-    
-    # Sous-graphique pour la difference
-    plt.subplot(2, 1, 2)
-    plt.plot(TimeArray, diff, 'g-', label='|f-g|')
-    plt.legend()
-    plt.title(f'Difference absolue |f-g|')
-    plt.grid(True)
-    
-    plt.tight_layout()
-    if plot:
-        plt.show()
-    if png_name != "":
-        plt.savefig(png_name, bbox_inches='tight')
-    
     # Renvoyer l'ecart relatif et les normes intermediaires
     return rel_error, {
         'norm_diff': norm_diff,
@@ -421,110 +723,171 @@ def relative_error(TimeArray: np.ndarray, f_values: np.ndarray, g_values: np.nda
         'method': method
     }
 
-def VerifTimeSeries(dfResults: pd.DataFrame, ActiveDevices : dict, BattStock: BatteryStock, DG_1: DieselGenerator):
+VerifLevels = ['off', 'sampled', 'full']
+
+def _check(name: str, excess: np.ndarray, idx: np.ndarray, tol: float) -> dict:
+    """one row of the report of VerifTimeSeries() : *excess* is the amount by which every checked time step *idx* breaks the invariant (<= 0 when it holds)"""
+    bad = excess > tol
+    count = int(np.count_nonzero(bad))
+    return {"check": name, "checked": len(idx), "violations": count,
+            "max_violation": float(excess.max()) if count else 0.0,
+            "first_index": int(idx[np.argmax(bad)]) if count else -1}
+
+def VerifTimeSeries(dfResults: pd.DataFrame, ActiveDevices : dict, BattStock: BatteryStock, DG_1: DieselGenerator,
+                    level: str = 'full', sample_size: int = 10000, tol: float = 1e-9, strict: bool = True) -> pd.DataFrame:
     """Make sure the results have the good format and that they are technically correct (fuel rate > fuel rate min, P_balance = 0 for energy conservation...) .
+    Every invariant is evaluated on every checked time step at once, and reported even if another one fails :
+    energy balance, SOC within [SOCmin, SOCmax], fuel rate >= f_r_min, load, resistor and diesel powers >= 0,
+    SOC trajectory consistent with P_bat (charge : dSOC = -P_bat.dt/capacity, discharge : dSOC = -P_bat.dt/(capacity.eta)).
     
     Args:
         dfResults (pd.DataFrame) : every time series generated by the chosen dispatching strategy (stands for DataFrame_TimeSeries)
         ActiveDevices (dict): {"Grid": True/False, "Batteries": True/False, "DieselGenerator": True/False} : type True for using the device, False to disable it.
         BattStock (BatteryStock) : the battery stock used during simulation
         DG_1 (DieselGenerator) : the diesel generator used during simulation
+        level (str, optional): 'off' (nothing is checked), 'sampled' (about *sample_size* evenly spaced time steps, for sweeps of many runs) or 'full'. Defaults to 'full'.
+        sample_size (int, optional): number of time steps checked by the 'sampled' level. Defaults to 10000.
+        tol (float, optional): violations smaller than tol (kW, SOC or fuel rate) are ignored (rounding errors). Defaults to 1e-9.
+        strict (bool, optional): if True, an AssertionError showing the report is raised when an invariant is broken. Defaults to True.
+
+    Returns:
+        pd.DataFrame: one row per invariant : check, checked (number of time steps), violations (number of time steps), max_violation, first_index (-1 if none). None if level is 'off'.
     """
+    assert(level in VerifLevels)
+    if level == 'off':
+        return None
     dt = (dfResults["TimeArray"][1] - dfResults["TimeArray"][0]).total_seconds() / 3600 # duration of a time step in hours
-    # print(len(dfResults["P_green"]),len(dfResults["P_L"]),len(dfResults["P_resistor"]),len(dfResults["P_L_modif"]))
-    # print(len(dfResults["TimeArray"]),len(dfResults["P_diff"]),len(dfResults["P_diesel"]),len(dfResults["P_bat"]),len(dfResults["SOC"]),len(dfResults["F_C"]),len(indic),len(P_net),len(grid_state))
     TA_len = len(dfResults["TimeArray"])
     assert(TA_len==len(dfResults["P_green"])==len(dfResults["P_L_modif"])==len(dfResults["P_resistor"])==len(dfResults["P_diff"]))
-     
-    P_balance = dfResults["P_green"] - dfResults["P_L_modif"] - dfResults["P_resistor"] # validation of energy conservation
-    
+    for device, columns in [("Batteries", ["P_bat", "SOC"]), ("DieselGenerator", ["P_diesel", "F_C"]), ("Grid", ["P_grid"])]:
+        if ActiveDevices[device]:
+            assert(all(TA_len==len(dfResults[col]) for col in columns))
+    if "GridSaleCost_list" in dfResults.keys() and "BatteryChargeCost_list" in dfResults.keys() and "GridPurchaseCost_list" in dfResults.keys() and "BatteryDischargeCost_list" in dfResults.keys() and "DGUseCost_list" in dfResults.keys():
+        assert(TA_len==len(dfResults["GridSaleCost_list"])==len(dfResults["BatteryChargeCost_list"])==len(dfResults["GridPurchaseCost_list"])==len(dfResults["BatteryDischargeCost_list"])==len(dfResults["DGUseCost_list"]))
+
+    idx = np.arange(TA_len) if level == 'full' else np.arange(0, TA_len, max(1, -(-TA_len // sample_size)))   # checked time steps
+    col = lambda name: np.asarray(dfResults[name], dtype=float)[idx]
+    checks = []
+
+    P_balance = col("P_green") - col("P_L_modif") - col("P_resistor") # validation of energy conservation
+    for device, name in [("Batteries", "P_bat"), ("DieselGenerator", "P_diesel"), ("Grid", "P_grid")]:
+        if ActiveDevices[device]:
+            P_balance += col(name)
+    checks.append(_check("energy balance", np.abs(P_balance), idx, tol))
+    checks.append(_check("load >= 0", -col("P_L_modif"), idx, tol))       # Load is positive
+    checks.append(_check("resistor >= 0", -col("P_resistor"), idx, tol))  # Excess Power is positive
+
     if ActiveDevices["Batteries"]:
-        assert(TA_len==len(dfResults["P_bat"]))
-        assert(len(dfResults["SOC"][dfResults["SOC"] < BattStock.get_SOC('min') - 10**(-14)]) == 0)
-        P_balance += dfResults["P_bat"]
+        SOC = col("SOC")
+        checks.append(_check("SOC bounds", np.maximum(BattStock.get_SOC('min') - SOC, SOC - BattStock.get_SOC('max')), idx, tol))
+        # SOC[i] is the state before the power P_bat[i] is applied : it leads to SOC[i+1]
+        pairs = idx[idx < TA_len - 1]
+        SOC_all, P_bat = np.asarray(dfResults["SOC"], dtype=float), np.asarray(dfResults["P_bat"], dtype=float)[pairs]
+        dSOC = SOC_all[pairs + 1] - SOC_all[pairs]
+        capacity = BattStock.get_var('capacity')
+        etas = [batt.eta for batt in BattStock.battery_stock]
+        charge = -np.minimum(P_bat, 0) * dt / capacity                                    # charge : the whole power is stored
+        disch = np.maximum(P_bat, 0) * dt / capacity                                      # discharge : the stored energy drops by P_bat.dt/eta
+        low = charge - disch / min(etas)                                                  # batteries of different eta : between the two extremes
+        high = charge - disch / max(etas)
+        checks.append(_check("SOC trajectory", np.maximum(low - dSOC, dSOC - high), pairs, tol))
     if ActiveDevices["DieselGenerator"]:
-        assert(TA_len==len(dfResults["P_diesel"]))
-        assert(len(dfResults["P_diesel"][dfResults["P_diesel"] < -10**(-14)]) == 0)
-        assert(len(dfResults["F_C"][dfResults["F_C"] < DG_1.f_r_min - 10**(-14)]) == 0)
-        P_balance += dfResults["P_diesel"]
-    if ActiveDevices["Grid"]:
-        assert(TA_len==len(dfResults["P_grid"]))
-        P_balance += dfResults["P_grid"]
+        checks.append(_check("diesel >= 0", -col("P_diesel"), idx, tol))
+        checks.append(_check("fuel >= f_r_min", DG_1.f_r_min - col("F_C"), idx, tol))
 
-    if "GridSaleCost_list" in dfResults.keys() and "BatteryChargeCost_list" in dfResults.keys() and "GridPurchaseCost_list" in dfResults.keys() and "BatteryDischargeCost_list" in dfResults.keys() and "DGUseCost_list" in dfResults.keys():
-        assert(TA_len==len(dfResults["GridSaleCost_list"])==len(dfResults["BatteryChargeCost_list"])==len(dfResults["GridPurchaseCost_list"])==len(dfResults["BatteryDischargeCost_list"])==len(dfResults["DGUseCost_list"]))
+    report = pd.DataFrame(checks)
+    print(report.to_string(index=False), '\n')
+    assert not (strict and report["violations"].any()), f"!!! the results break {int((report['violations'] > 0).sum())} invariant(s), see the report above !!!"
+    return report
+
+EnergyVars = [# var,             printed name, power column, part of the power that is integrated (None : all of it), unit
+              ("Load Conso",     "e_load",     "P_L",        None,  "kWh"),  # energy consumed
+              ("Renewable Prod", "e_green",    "P_green",    None,  "kWh"),  # renewable energy produced
+              ("Sales",          "e_sold",     "P_grid",     "neg", "kWh"),  # energy sold during the simulation
+              ("Purchases",      "e_bought",   "P_grid",     "pos", "kWh"),  # energy bought
+              ("Lack",           "e_lack",     "P_diff",     "neg", "kWh"),  # energy that was needed but couldn't be produced neither bought
+              ("Unused",         "e_unused",   "P_resistor", None,  "kWh"),  # energy that couldn't be used neither sold
+              ("Battery Supply", "e_bat",      "P_bat",      "pos", "kWh"),  # energy supplied by batteries
+              ("Diesel",         "e_diesel",   "P_diesel",   None,  "kWh")]  # energy produced by the DG
 
-    assert(len(dfResults["P_L_modif"][dfResults["P_L_modif"] < -10**(-14)]) == 0) # Load is positive
-    assert(len(dfResults["P_resistor"][dfResults["P_resistor"] < -10**(-14)]) == 0) # Excess Power is positive
+def _power_part(power, part: str) -> np.ndarray:
+    """power (None), its positive part ('pos') or its negative part as a positive value ('neg')"""
+    power = np.asarray(power, dtype=float)
+    if part == "pos":
+        return np.maximum(power, 0)
+    if part == "neg":
+        return np.maximum(-power, 0)
+    return power
 
-    e_balance = round(np.trapz(np.abs(P_balance), x=None, dx=dt),10)
-    print('e_balance    =', e_balance,'\n')
-    assert(e_balance <= len(P_balance) * 10**(-14)) # P_balance has to be the zero function so its integral is near the machine approx
+def _period_starts(TimeArray, period: str) -> np.ndarray:
+    """start (time step index) of every calendar period of a time array"""
+    assert(period in ['day', 'week', 'month', 'year'])
+    t = _wall_clock(TimeArray)
+    days = t.astype("datetime64[D]")
+    if period == 'day':
+        keys = days
+    elif period == 'week':
+        keys = days - (days.astype(np.int64) + 3) % 7                           # monday of the week (1970-01-01 was a Thursday)
+    else:
+        keys = t.astype("datetime64[M]" if period == 'month' else "datetime64[Y]")
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
 
-def EnergySums(dfResults: pd.DataFrame, DG_1: DieselGenerator) -> pd.DataFrame:
-    """Calculates energy variables over the given period by integration of Power time series.
+def EnergySums(dfResults: pd.DataFrame, DG_1: DieselGenerator, period: str = None) -> pd.DataFrame:
+    """Calculates energy variables over the given period by integration of Power time series (trapezoidal rule).
     
     Args:
         dfResults (pd.DataFrame): every time series generated by the chosen dispatching strategy (stands for DataFrame_TimeSeries)
         DG_1 (DieselGenerator): the diesel generator used during simulation
+        period (str, optional): 'day', 'week', 'month' or 'year' for one row of energies per calendar period. The interval between two time steps
+                                belongs to the period of its first time step : the sum of the periods is the total over the simulation. Defaults to None (totals).
     
     Returns:
-        pd.DataFrame: energy and fuel consumption.
+        pd.DataFrame: energy and fuel consumption. Totals : one row per variable (var, value, unit).
+                      Per period : one row per period ('period' = start of the period) and one column per variable ('Load Conso (kWh)'...), missing variables are left out.
     """
     TS_len = len(dfResults["TimeArray"])
     dt = (dfResults["TimeArray"][1] - dfResults["TimeArray"][0]).total_seconds() / 3600 # duration of a time step in hours
+    if period is not None:
+        return _energy_periods(dfResults, DG_1, period, dt)
 
-    if "P_L" in dfResults.keys():
-        e_load = round(np.trapz(dfResults["P_L"], x=None, dx=dt),5)                                              # energy consumed (kWh)
-        print('e_load    =', e_load,'kWh')
-    else:
-        e_load = 'NotFound'
-    if "P_green" in dfResults.keys():
-        e_green = round(np.trapz(dfResults["P_green"], x=None, dx=dt),5)                                         # renewable energy produced (kWh)
-        print('e_green   =', e_green,'kWh')
-    else:
-        e_green = 'NotFound'
-    if "P_grid" in dfResults.keys():
-        e_sold = round(np.trapz(np.array([max(0, - pow) for pow in dfResults["P_grid"]]), x=None, dx=dt),5)      # energy sold during the simulation (kWh)
-        e_bought = round(np.trapz(np.array([max(0,pow) for pow in dfResults["P_grid"]]), x=None, dx=dt),5)       # energy bought (kWh)
-        print('e_sold    =', e_sold, 'kWh')
-        print('e_bought  =', e_bought,'kWh')
-    else:
-        e_sold, e_bought = 'NotFound', 'NotFound'
-    if "P_diff" in dfResults.keys():
-        e_lack = round(np.trapz(np.array([max(0,-pow) for pow in dfResults["P_diff"]]), x=None, dx=dt),5)        # energy that was needed but couldn't be produced neither bought (kWh)
-        print('e_lack    =', e_lack,'kWh')
-    else:
-        e_lack = 'NotFound'
-    if "P_resistor" in dfResults.keys():
-        e_unused = round(np.trapz(dfResults["P_resistor"], x=None, dx=dt),5)                                     # energy that couldn't be used neither sold (kWh)
-        print('e_unused  =', e_unused,'kWh')
-    else:
-        e_unused = 'NotFound'
-    if "P_bat" in dfResults.keys():
-        e_bat = round(np.trapz(np.array([max(0,pow) for pow in dfResults["P_bat"]]), x=None, dx=dt),5)           # energy supplied by batteries (kWh)
-        print('e_bat     =', e_bat,'kWh')
-    else:
-        e_bat = 'NotFound'
-    if "P_diesel" in dfResults.keys():
-        e_diesel = round(np.trapz(dfResults["P_diesel"], x=None, dx=dt),5)                                       # energy produced by the DG (kWh)
-        print('e_diesel  =', e_diesel,'kWh')
-    else:
-        e_diesel = 'NotFound'
+    values = []
+    for var, name, column, part, unit in EnergyVars:
+        if column in dfResults.keys():
+            value = round(np.trapezoid(_power_part(dfResults[column], part), dx=dt),5)                     # (kWh)
+            print(f'{name:<9} =', value, unit)
+        else:
+            value = 'NotFound'
+        values.append(value)
     try:
-        fuel_conso = round((dfResults["F_C"][0] - dfResults["F_C"][TS_len-1]) * DG_1.TankCapacity,5)                    # total amount of fuel consumed during the simulation (L)
+        F_C = np.asarray(dfResults["F_C"])
+        fuel_conso = round((F_C[0] - F_C[TS_len-1]) * DG_1.TankCapacity,5)                    # total amount of fuel consumed during the simulation (L)
         print('fuel_cons =', str(fuel_conso),'L')
     except:
         fuel_conso = 'NotFound'
         
-    dfEnergy = pd.DataFrame({"var"  :["Load Conso","Renewable Prod","Sales","Purchases","Lack","Unused","Battery Supply","Diesel","Fuel Consumed"],
-                             "value":[e_load,      e_green,         e_sold, e_bought,   e_lack,e_unused,e_bat,           e_diesel,fuel_conso],
-                             "unit" :["kWh" ,      "kWh",           "kWh",  "kWh",      "kWh", "kWh",   "kWh",           "kWh",   "L"]})
+    dfEnergy = pd.DataFrame({"var"  :[var for var, _, _, _, _ in EnergyVars] + ["Fuel Consumed"],
+                             "value":values + [fuel_conso],
+                             "unit" :[unit for _, _, _, _, unit in EnergyVars] + ["L"]})
     dfEnergy.set_index("var")
     return dfEnergy
 
+def _energy_periods(dfResults: pd.DataFrame, DG_1: DieselGenerator, period: str, dt: float) -> pd.DataFrame:
+    """EnergySums() per calendar period : the trapezoids of every interval are summed per period in one pass (np.add.reduceat)"""
+    TimeArray = pd.DatetimeIndex(pd.to_datetime(dfResults["TimeArray"]))
+    starts = _period_starts(TimeArray[:-1], period)                             # periods of the intervals (a last period without interval is left out)
+    dfPeriods = pd.DataFrame({"period": TimeArray[starts]})                      # in the time zone of the input
+    for var, _, column, part, unit in EnergyVars:
+        if column in dfResults.keys():
+            power = _power_part(dfResults[column], part)
+            dfPeriods[f"{var} ({unit})"] = np.add.reduceat((power[:-1] + power[1:]) * (dt / 2), starts)
+    if "F_C" in dfResults.keys() and DG_1 is not None:
+        F_C = np.asarray(dfResults["F_C"], dtype=float)
+        dfPeriods["Fuel Consumed (L)"] = np.add.reduceat(F_C[:-1] - F_C[1:], starts) * DG_1.TankCapacity
+    return dfPeriods
+
 if __name__ == "__main__":
     from datetime import datetime, timedelta
+    import matplotlib.pyplot as plt
     print("\n --- testing the relative_error() comparison function ---\n")
 
     # Simuler des donnees avec numpy
@@ -552,6 +915,142 @@ if __name__ == "__main__":
     rel_error_linf, _ = relative_error(TimeArray, f_values, g_values, p=float('inf'), method='reference_f')
     print(f"ecart relatif L∞ (reference f): {rel_error_linf:.6f}")
 
+    print("\n --- testing the batched relative_errors() ---\n")
+    import time
+    import tempfile
+    rng = np.random.default_rng(0)
+    TimeBatch = np.arange(np.datetime64('2025-01-01T00:00'), np.datetime64('2025-01-08T00:00'), np.timedelta64(1, 'm'))   # one week, 1-minute
+    F = rng.random((300, len(TimeBatch))) * 100                                 # 300 runs of the reference tool
+    G = F + rng.normal(size=F.shape)
+    G[7] = F[7]                                                                 # identical series
+    F[11], G[11] = 0, 1                                                         # null reference
+    open_figures = plt.get_fignums()
+    t0 = time.perf_counter()
+    dfErrors = relative_errors(TimeBatch, F, G, p=[1, 2, float('inf')], method='maximum')
+    t1 = time.perf_counter()
+    for run in [0, 7, 11, 299]:
+        for p_norm in [1, 2, float('inf')]:
+            rel, details = relative_error(TimeBatch, F[run], G[run], p=p_norm, method='maximum')
+            row = dfErrors[(dfErrors["series"] == run) & (dfErrors["p"] == p_norm)].iloc[0]
+            assert(np.isclose(row["rel_error"], rel) and np.isclose(row["norm_f"], details["norm_f"]))
+    t2 = time.perf_counter()
+    print(f"300 runs x 3 norms : {round(t1 - t0, 3)} s | 12 calls of relative_error() : {round(t2 - t1, 3)} s")
+    assert(len(dfErrors) == 900 and plt.get_fignums() == open_figures)      # no figure is built
+    assert(dfErrors["rel_error"][7 * 3 + 1] == 0 and dfErrors["rel_error"][11 * 3 + 1] == 1)
+    dfNamed = relative_errors(list(TimeBatch.astype(datetime)), {"P_L": F[0], "SOC": F[1]}, {"SOC": G[1], "P_L": G[0]}, p=2) # datetime objects, dict of series
+    assert(list(dfNamed["series"]) == ["P_L", "SOC"] and np.allclose(dfNamed["rel_error"], relative_errors(TimeBatch, F[:2], G[:2])["rel_error"]))
+    assert(relative_errors(TimeBatch, {"zero": np.zeros(len(TimeBatch))}, {"zero": np.ones(len(TimeBatch))})["rel_error"][0] == float('inf'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        relative_error(TimeBatch, F[0], G[0], png_name=os.path.join(tmpdir, "compare"))                                 # figure on request only
+        assert(os.listdir(tmpdir) == ["compare.png"] and plt.get_fignums() == open_figures)
+
+
+    print("\n --- testing the adjust_time_serie() resampler ---\n")
+    t_irreg = np.concatenate(([0], np.sort(rng.uniform(0, 240, 5000)), [240]))        # irregular sampling over 10 days, in hours
+    P_irreg = 100 + 50 * np.sin(t_irreg / 24 * 2 * np.pi)
+    Time_irreg = np.datetime64('2025-01-01T00:00') + np.round(t_irreg * 3600e9).astype('timedelta64[ns]')
+    dfAdjusted = adjust_time_serie(Time_irreg, {"P": P_irreg}, 0.25, max_gap=1)
+    e_in, e_out = np.trapezoid(P_irreg, t_irreg), np.sum(dfAdjusted["P"]) * 0.25       # energy conservation
+    print('resampled lenght =', len(dfAdjusted), '| energy in =', round(e_in,6), 'kWh | energy out =', round(e_out,6), 'kWh')
+    assert(len(dfAdjusted) == 960 and abs(e_in - e_out) < 1e-6)
+    dfAdjusted = adjust_time_serie(Time_irreg, {"P": P_irreg}, 0.25, method='interp', max_gap=1)
+    assert(np.allclose(dfAdjusted["P"], np.interp(t_irreg[0] + np.arange(len(dfAdjusted)) * 0.25, t_irreg, P_irreg)))
+    t_gap = np.concatenate((np.arange(0, 10, 0.5), np.arange(15, 20, 0.5)))              # 5 hours missing
+    dfAdjusted = adjust_time_serie(t_gap, {"P": np.ones(len(t_gap))}, 1, gap_policy='nan')
+    assert(np.isnan(dfAdjusted["P"]).sum() == 6 and np.nansum(dfAdjusted["P"]) == len(dfAdjusted) - 6)
+    t_gaps = np.setdiff1d(np.arange(0, 12.25, 0.25), [4.5, 4.75, 5.75, 6])                # 2 short gaps inside the output step [4, 8[
+    P_gaps = t_gaps.copy()
+    for policy, expected in [('nan', np.nan), ('zero', 0), ('hold', 5.5)]:
+        dfAdjusted = adjust_time_serie(t_gaps, {"P": P_gaps}, 4, gap_policy=policy, max_gap=0.3)
+        assert(np.allclose(dfAdjusted["P"], [2, expected, 10], equal_nan=True))
+
+    print("\n --- testing calculate_typical_behavior() ---\n")
+    TimeYears = np.arange(np.datetime64('2023-01-01T00:00'), np.datetime64('2025-01-01T00:00'), np.timedelta64(15, 'm')) # includes a leap year
+    hours = (TimeYears - TimeYears.astype('datetime64[D]')) / np.timedelta64(1, 'h')
+    dfYears = pd.DataFrame({"TimeArray": TimeYears, "P_L": hours, "P_green": rng.normal(size=len(TimeYears))})
+    dfTypDay = calculate_typical_behavior(dfYears, period='day', stats=('mean', 'p50', 'max'))
+    assert(len(dfTypDay) == 96 and np.allclose(dfTypDay["P_L"], np.arange(96) / 4) and np.allclose(dfTypDay["P_L_p50"], dfTypDay["P_L"]))
+    slot_5 = dfYears["P_green"][np.arange(len(TimeYears)) % 96 == 5]
+    assert(np.isclose(dfTypDay["P_green_p50"][5], np.percentile(slot_5, 50)) and np.isclose(dfTypDay["P_green_max"][5], slot_5.max()))
+    dfTypYear = calculate_typical_behavior(dfYears, period='year')
+    print('typical year :', len(dfTypYear), 'days | typical week :', len(calculate_typical_behavior(dfYears, period='week')), 'slots')
+    assert(len(dfTypYear) == 366 and dfTypYear["day of year"][59] == '02-29' and dfTypYear["day of year"][365] == '12-31')
+    assert(np.allclose(calculate_typical_behavior(dfYears, sample_lenght=96)["P_L"], dfTypDay["P_L"]))
+    TimeParis = pd.date_range('2024-03-29', '2024-11-01', freq='15min', tz='Europe/Paris', inclusive='left') # 23-hour day (03-31), 25-hour day (10-27)
+    groups, _ = calendar_groups(TimeParis, period='day')
+    assert(groups[0] == 0 and np.array_equal(groups, TimeParis.hour * 4 + TimeParis.minute // 15))        # local clock time, not UTC
+    groups, _ = calendar_groups(TimeParis, period='week')
+    assert(np.array_equal(groups // 96, TimeParis.weekday) and (calendar_groups(TimeParis, period='year')[0][0] == 88))
+    dfParis = calculate_typical_behavior({"TimeArray": TimeParis, "P_L": TimeParis.hour.to_numpy(float)})
+    assert(len(dfParis) == 96 and np.allclose(dfParis["P_L"], np.arange(96) // 4))
+
+    print("\n --- testing decimate() ---\n")
+    N = 525600                                                                  # one year, 1-minute
+    TimeArray = np.arange(N).astype('datetime64[m]').astype('datetime64[ns]')
+    values = np.sin(np.arange(N) / 1000) + 0.1 * rng.standard_normal(N)
+    values[123457] = 50                                                         # isolated peak
+    state = np.ones(N)
+    state[300000:300003] = 0                                                    # 3-minute outage
+    for method in ['minmax', 'lttb']:
+        t_dec, v_dec = decimate(TimeArray, values, 2000, method)
+        _, s_dec = decimate(TimeArray, state, 2000, method)
+        assert(len(v_dec) <= 2002 and v_dec.max() == 50 and s_dec.min() == 0)  # peaks and outage edges are kept
+        assert(np.all(np.diff(t_dec) > np.timedelta64(0)) and t_dec[0] == TimeArray[0] and t_dec[-1] == TimeArray[-1])
+    assert(len(decimate(TimeArray[:100], values[:100], 2000)[1]) == 100)       # short series are unchanged
+
+    print("\n --- testing the deferred figures and render_figures() ---\n")
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dfPlot = pd.DataFrame({"TimeArray": TimeArray[:1000], "P_L": values[:1000], "SOC": state[:1000]})
+        jobs, open_figures = [], plt.get_fignums()
+        plot_group(dfPlot, os.path.join(tmpdir, "only_data"), csv=True, jobs=jobs)   # no figure is built
+        assert(jobs == [] and plt.get_fignums() == open_figures and os.listdir(tmpdir) == ["only_data.csv"])
+        plot_group(dfPlot, os.path.join(tmpdir, "group"), 'test', png=True, jobs=jobs)
+        plot_compact(dfPlot, os.path.join(tmpdir, "compact"), png=True, pkl=True, jobs=jobs)
+        assert(len(jobs) == 2 and plt.get_fignums() == open_figures and jobs[0][0] is plot_group)
+        render_figures(jobs, workers=2)
+        assert(sorted(os.listdir(tmpdir)) == ["compact.png", "compact.vfig", "group.png", "only_data.csv"])
+
+        print("\n --- testing figure bundles and the zoom-aware viewer ---\n")
+        dfLong = pd.DataFrame({"TimeArray": TimeArray, "P_L": values, "SOC": state})  # one year, 1-minute
+        plot_compact(dfLong, os.path.join(tmpdir, "long"), pkl=True)
+        spec, data = RIO.read_figure_bundle(os.path.join(tmpdir, "long.vfig"))
+        assert(list(data.keys()) == ["TimeArray", "P_L", "SOC"] and np.array_equal(data["P_L"], values))
+        fig = draw_figure(spec, data, 'minmax', interactive=True)
+        line = fig.axes[0].get_lines()[0]
+        assert(len(line.get_xdata()) <= 2002)                                   # decimated to the width of the axes
+        fig.axes[0].set_xlim(TimeArray[123000], TimeArray[124000])             # zoom on 1000 minutes : full resolution
+        assert(len(line.get_xdata()) == 1003 and np.max(line.get_ydata()) == 50)
+        plt.close(fig)
+        print(f"bundle of {N} time steps : {round(os.path.getsize(os.path.join(tmpdir, 'long.vfig')) / 1e6, 1)} MB")
+
+        print("\n --- testing the figure lifecycle (figure_context()) ---\n")
+        import gc
+        import tracemalloc
+        import warnings
+        _FigureTemplates.clear()
+        plot_group(dfPlot, os.path.join(tmpdir, "fresh"), 'test', png=True)           # new figure
+        plot_group(dfPlot, os.path.join(tmpdir, "reused"), 'test', png=True)          # same figure, emptied and reused
+        assert(np.array_equal(plt.imread(os.path.join(tmpdir, "fresh.png")), plt.imread(os.path.join(tmpdir, "reused.png"))))
+        assert(plt.get_fignums() == open_figures and len(_FigureTemplates) == 1)
+        def plotting_round():                                                   # the plot functions of a run, figures saved as .png
+            plot_group(dfPlot, os.path.join(tmpdir, "lifecycle_group"), 'test', png=True)
+            plot_separately(dfPlot, os.path.join(tmpdir, "lifecycle_separately"), png=True)
+            plot_compact(dfPlot, os.path.join(tmpdir, "lifecycle_compact"), png=True)
+        tracemalloc.start()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")                                     # legend of the empty axes of plot_compact()
+            for call in range(20):
+                plotting_round()
+                if call == 4:                                                   # after the warm-up of the caches of matplotlib
+                    gc.collect()
+                    mem_start = tracemalloc.get_traced_memory()[0]
+                assert(plt.get_fignums() == open_figures)
+        gc.collect()
+        mem_growth = tracemalloc.get_traced_memory()[0] - mem_start
+        tracemalloc.stop()
+        print(f"memory growth over the last 45 of 60 calls of plot_group(), plot_separately() and plot_compact() : {round(mem_growth / 1e3, 1)} kB")
+        assert(mem_growth < 1e5 and plt.get_fignums() == open_figures and len(_FigureTemplates) <= FigureTemplatesMax)
 
     print("\n --- testing VerifTimeSeries() and EnergySums() ---\n")
     ActiveDevices = {"Grid": True, "Batteries": True, "DieselGenerator": True}
@@ -602,4 +1101,51 @@ if __name__ == "__main__":
     dfEnergy = EnergySums(dfRes, DG_test_1)
     for sum in dfEnergy["value"]:
         assert(sum == 0)
+
+    print("\n --- testing the invariants of VerifTimeSeries() ---\n")
+    n_steps, dt_test = 14400, 1 / 60                                            # 10 days, 1-minute
+    P_bat = 50 * np.sin(2 * np.pi * np.arange(n_steps) / 1440)                  # discharge then charge, every day
+    capacity, eta = BattStock.get_var('capacity'), BattStock.get_var('eta')
+    dSOC = np.where(P_bat > 0, - P_bat * dt_test / (capacity * eta), - P_bat * dt_test / capacity)
+    SOC = 0.7 + np.concatenate(([0], np.cumsum(dSOC[:-1])))                      # SOC[i] : before P_bat[i] is applied
+    Vnull = np.zeros(n_steps)
+    dfVerif = pd.DataFrame({"TimeArray": pd.date_range(start_date, periods=n_steps, freq='min'), "P_green": Vnull, "P_L_modif": Vnull.copy(),
+                            "P_resistor": Vnull, "P_diff": Vnull, "P_bat": P_bat, "SOC": SOC, "P_grid": - P_bat, "P_diesel": Vnull, "F_C": np.full(n_steps, 0.5)})
+    report = VerifTimeSeries(dfVerif, ActiveDevices, BattStock, DG_test_1)
+    assert(report["violations"].sum() == 0 and report["checked"][0] == n_steps)
+    dfVerif.loc[5000, "SOC"] += 0.01                                            # breaks the trajectory before and after step 5000
+    dfVerif.loc[7000, "P_L_modif"] = -1                                         # negative load, unbalanced
+    dfVerif.loc[9000, "F_C"] = -0.1                                             # fuel rate under f_r_min
+    report = VerifTimeSeries(dfVerif, ActiveDevices, BattStock, DG_test_1, strict=False).set_index("check")
+    assert(list(report["violations"][["SOC trajectory", "load >= 0", "energy balance", "fuel >= f_r_min", "SOC bounds"]]) == [2, 1, 1, 1, 0])
+    assert(list(report["first_index"][["SOC trajectory", "load >= 0", "energy balance", "fuel >= f_r_min"]]) == [4999, 7000, 7000, 9000])
+    assert(np.isclose(report["max_violation"]["SOC trajectory"], 0.01) and report["max_violation"]["fuel >= f_r_min"] == 0.1)
+    try:
+        VerifTimeSeries(dfVerif, ActiveDevices, BattStock, DG_test_1)
+        raise RuntimeError("broken invariants must stop the run")
+    except AssertionError:
+        pass
+    report = VerifTimeSeries(dfVerif, ActiveDevices, BattStock, DG_test_1, level='sampled', sample_size=1000, strict=False)
+    assert(900 < report["checked"][0] <= 1000 and VerifTimeSeries(dfVerif, ActiveDevices, BattStock, DG_test_1, level='off') is None)
+
+    print("\n --- testing EnergySums() per calendar period ---\n")
+    n_years = len(TimeYears)                                                    # 2 years, 15-minute
+    dfYearsRes = pd.DataFrame({"TimeArray": pd.to_datetime(TimeYears), "P_L": np.full(n_years, 10.), "P_green": rng.random(n_years) * 20,
+                               "P_grid": rng.normal(size=n_years) * 50, "F_C": np.linspace(1, 0.2, n_years)})
+    t0 = time.perf_counter()
+    dfTotals = EnergySums(dfYearsRes, DG_test_1)
+    t1 = time.perf_counter()
+    dfMonths = EnergySums(dfYearsRes, DG_test_1, period='month')
+    t2 = time.perf_counter()
+    print(f"{n_years} time steps : totals in {round(t1 - t0, 3)} s, 24 months in {round(t2 - t1, 3)} s")
+    assert(len(dfMonths) == 24 and dfMonths["period"][1] == pd.Timestamp('2023-02-01') and "Lack (kWh)" not in dfMonths.columns)
+    assert(dfMonths["Load Conso (kWh)"][0] == 31 * 24 * 10 and dfMonths["Load Conso (kWh)"][13] == 29 * 24 * 10)   # leap year
+    totals = dict(zip(dfTotals["var"], dfTotals["value"]))
+    for var, unit in [("Load Conso", "kWh"), ("Renewable Prod", "kWh"), ("Sales", "kWh"), ("Purchases", "kWh"), ("Fuel Consumed", "L")]:
+        assert(np.isclose(dfMonths[f"{var} ({unit})"].sum(), totals[var]))   # the periods add up to the totals
+    assert(len(EnergySums(dfYearsRes, DG_test_1, period='week')) == 106 and len(EnergySums(dfYearsRes, DG_test_1, period='year')) == 2) # 2023-01-01 is a Sunday : first week of one day
+    TimeParis = pd.date_range('2024-03-30', '2024-04-02', freq='15min', tz='Europe/Paris')   # the day of 03-31 lasts 23 hours
+    dfDays = EnergySums(pd.DataFrame({"TimeArray": TimeParis, "P_L": np.full(len(TimeParis), 10.)}), DG_test_1, period='day')
+    assert(dfDays["period"].tolist() == list(pd.date_range('2024-03-30', '2024-04-01', freq='D', tz='Europe/Paris')))
+    assert(np.allclose(dfDays["Load Conso (kWh)"], [240, 230, 240]))                  # local days, the short day included
 # %%
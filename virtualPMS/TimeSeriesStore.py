@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-18 09:12:05
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Local content-addressed store of input time series, shared between runs and workbooks + test section.
+Every time serie is saved once, as one .npy file per column, under the sha256 hash of its content. It is then read as a read-only
+memory map : several processes running the same series share the same pages of memory, and nothing is parsed twice.
+The raw source (time series sheet of an .xlsx file, external .csv/.npz file) is also hashed, so that a known source is
+resolved without being parsed at all.
+store layout :
+    root/series/<series hash>/columns.txt   names of the columns
+    root/series/<series hash>/<i>.npy       one file per column (datetime64[ns] and numeric columns only)
+    root/aliases/<source hash>              text file containing the series hash of a raw source
+'''
+#---------------------
+#%%
+import os
+import re
+import uuid
+import shutil
+import hashlib
+import zipfile
+import numpy as np
+import pandas as pd
+
+class TimeSeriesStore:
+    HashChunk = 1 << 20 # bytes read at once while hashing a file
+
+    def __init__(self, root: str):
+        """content-addressed store of time series
+
+        Args:
+            root (str): folder of the store (created if missing), usually input//.tsstore
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, "series"), exist_ok=True)
+        os.makedirs(os.path.join(root, "aliases"), exist_ok=True)
+
+    @staticmethod
+    def hash_arrays(dfTS: pd.DataFrame) -> str:
+        """sha256 of the content of a time serie : column names, dtypes, shapes and raw bytes.
+
+        Args:
+            dfTS (pd.DataFrame): time series with datetime64 or numeric columns only
+
+        Returns:
+            str: hexadecimal hash
+        """
+        h = hashlib.sha256()
+        for col in dfTS.columns:
+            values = np.ascontiguousarray(dfTS[col].to_numpy())
+            assert values.dtype != object, f"!!! column {col} must be converted to a numeric or datetime type before being stored !!!"
+            h.update(f"{col}|{values.dtype.str}|{values.shape}|".encode())
+            h.update(values.view(np.uint8).data if values.ndim == 1 and len(values) else values.tobytes())
+        return h.hexdigest()
+
+    @classmethod
+    def hash_file(cls, FilePath: str) -> str:
+        """sha256 of the bytes of a raw source file (.csv, .npz...)"""
+        h = hashlib.sha256(b"file|")
+        with open(FilePath, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HashChunk), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def hash_xlsx_sheet(ExcelPath: str, SheetName: str) -> str:
+        """sha256 of one sheet of an .xlsx file, without parsing it : the raw XML of the sheet and the shared strings table
+        (texts of the cells) are read from the zip container. Two workbooks holding the same time series sheet have the same hash,
+        whatever their other sheets are, as long as the texts they contain are the same.
+
+        Args:
+            ExcelPath (str): path of the excel file
+            SheetName (str): name of the sheet
+
+        Returns:
+            str: hexadecimal hash, None if the sheet can't be located
+        """
+        try:
+            with zipfile.ZipFile(ExcelPath) as xlsx:
+                workbook = xlsx.read("xl/workbook.xml").decode("utf-8")
+                rels = xlsx.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+                name = SheetName.replace("&", "&amp;")
+                sheet = re.search(r'<sheet\b[^>]*name="' + re.escape(name) + r'"[^>]*/>', workbook).group(0)
+                rId = re.search(r'r:id="([^"]+)"', sheet).group(1)
+                rel = re.search(r'<Relationship\b[^>]*Id="' + re.escape(rId) + r'"[^>]*/>', rels).group(0)
+                target = re.search(r'Target="([^"]+)"', rel).group(1).lstrip("/")
+                target = target if target.startswith("xl/") else "xl/" + target
+                h = hashlib.sha256(b"xlsx|" + SheetName.encode())
+                h.update(xlsx.read(target))
+                if "xl/sharedStrings.xml" in xlsx.namelist():
+                    h.update(xlsx.read("xl/sharedStrings.xml"))
+        except (KeyError, AttributeError, zipfile.BadZipFile):
+            return None
+        return h.hexdigest()
+
+    def _series_dir(self, key: str) -> str:
+        return os.path.join(self.root, "series", key)
+
+    def _alias_path(self, SourceKey: str) -> str:
+        return os.path.join(self.root, "aliases", SourceKey)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.isdir(self._series_dir(key))
+
+    def put(self, dfTS: pd.DataFrame) -> str:
+        """saves a time serie (if it isn't already in the store)
+
+        Args:
+            dfTS (pd.DataFrame): time series with datetime64 or numeric columns only
+
+        Returns:
+            str: hash of the time serie, to be used with get()
+        """
+        key = self.hash_arrays(dfTS)
+        if key in self:
+            return key
+        # written in a temporary folder then renamed : concurrent runs never read a half-written serie
+        tmp_dir = os.path.join(self.root, "series", f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "columns.txt"), 'w', encoding="utf-8") as f:
+            f.write("\n".join(dfTS.columns))
+        for i, col in enumerate(dfTS.columns):
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), np.ascontiguousarray(dfTS[col].to_numpy()))
+        try:
+            os.rename(tmp_dir, self._series_dir(key))
+        except OSError: # saved by another process meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return key
+
+    def get(self, key: str) -> pd.DataFrame:
+        """opens a stored time serie. Columns are read-only memory maps : nothing is read from the disk before being used.
+
+        Args:
+            key (str): hash of the time serie (output of put())
+
+        Returns:
+            pd.DataFrame: the time serie
+        """
+        folder = self._series_dir(key)
+        with open(os.path.join(folder, "columns.txt"), encoding="utf-8") as f:
+            columns = f.read().split("\n")
+        return pd.DataFrame({col: np.load(os.path.join(folder, f"{i}.npy"), mmap_mode='r') for i, col in enumerate(columns)}, copy=False)
+
+    def resolve(self, SourceKey: str) -> str:
+        """hash of the time serie of a known raw source, None if the source has never been stored"""
+        if SourceKey is None:
+            return None
+        try:
+            with open(self._alias_path(SourceKey), encoding="utf-8") as f:
+                key = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return key if key in self else None
+
+    def link(self, SourceKey: str, key: str):
+        """remembers that a raw source contains the time serie key"""
+        if SourceKey is None:
+            return
+        tmp_path = self._alias_path(f".tmp-{uuid.uuid4().hex}")
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp_path, self._alias_path(SourceKey))
+
+    def load(self, SourceKey: str, parser) -> pd.DataFrame:
+        """returns the time serie of a raw source : from the store if the source is known, parsed and stored otherwise.
+
+        Args:
+            SourceKey (str): hash of the raw source (hash_file() or hash_xlsx_sheet()), None to always parse
+            parser (callable): function without argument that parses the raw source into a DataFrame with datetime64 or numeric columns
+
+        Returns:
+            pd.DataFrame: the time serie (read-only memory maps)
+        """
+        key = self.resolve(SourceKey)
+        if key is None:
+            key = self.put(parser())
+            self.link(SourceKey, key)
+        return self.get(key)
+
+#%% TEST SECTION
+if __name__ == "__main__":
+    import tempfile
+    import time
+    print("\n --- testing TimeSeriesStore ---\n")
+    TimeArray = np.arange(np.datetime64('2024-01-01T00:00'), np.datetime64('2025-01-01T00:00'), np.timedelta64(1, 'm')).astype("datetime64[ns]")
+    rng = np.random.default_rng(0)
+    dfTS = pd.DataFrame({"Time": TimeArray, "Load": rng.random(len(TimeArray)) * 100, "Green Prod": rng.random(len(TimeArray)) * 50,
+                         "Grid State": np.ones(len(TimeArray), dtype=np.int64)})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = TimeSeriesStore(tmpdir)
+        calls = []
+        def parser():
+            calls.append(1)
+            return dfTS
+        t0 = time.perf_counter()
+        dfFirst = store.load("source_A", parser)
+        t1 = time.perf_counter()
+        dfSecond = store.load("source_A", parser)                  # known source : not parsed again
+        dfThird = store.load("source_B", parser)                   # same content, other source : stored once
+        t2 = time.perf_counter()
+        assert len(calls) == 2 and len(os.listdir(os.path.join(tmpdir, "series"))) == 1
+        values, memmap = dfSecond["Load"].to_numpy(), dfSecond["Load"].to_numpy()
+        while memmap is not None and not isinstance(memmap, np.memmap):    # pandas may view the memory map through several arrays
+            memmap = memmap.base
+        assert memmap is not None and np.shares_memory(values, memmap) and os.path.realpath(memmap.filename).startswith(os.path.realpath(tmpdir))
+        for dfRead in [dfFirst, dfSecond, dfThird]:
+            assert list(dfRead.columns) == list(dfTS.columns)
+            assert all(np.array_equal(dfRead[col].to_numpy(), dfTS[col].to_numpy()) for col in dfTS.columns)
+        assert not dfSecond["Load"].to_numpy().flags.writeable   # shared series are read-only
+        print(f"{len(dfTS)} rows : stored in {round(t1 - t0, 3)} s, reopened twice in {round(t2 - t1, 3)} s")
+# %%
@@ -8,15 +8,26 @@
 '''
 #---------------------
 #%%
+import importlib
 
 from .Grid import Grid
 from .Battery import Battery
 from .BatteryStock import BatteryStock
 from .DieselGenerator import DieselGenerator
-from . import DispatchingStrats
-from . import TimeSeriesAnalysis
-from . import inpReading
+from .TimeSeriesStore import TimeSeriesStore
 
-__all__ = ["Battery", "BatteryStock", "DieselGenerator", "Grid", "DispatchingStrats", "TimeSeriesAnalysis", "inpReading"]
+# modules imported on first use (virtualPMS.TimeSeriesAnalysis, from virtualPMS import inpReading...) : a process that only dispatches
+# doesn't pay for the plotting and reading modules (see benchmarks//bench_import.py)
+LazyModules = ["DispatchingStrats", "TimeSeriesAnalysis", "inpReading", "ResultsIO", "Profiling", "Progress", "Simulation", "Batch"]
+
+__all__ = ["Battery", "BatteryStock", "DieselGenerator", "Grid", "DispatchingStrats", "TimeSeriesAnalysis", "inpReading", "TimeSeriesStore", "ResultsIO", "Profiling", "Progress", "Simulation", "Batch"]
+
+def __getattr__(name: str):
+    if name in LazyModules:
+        return importlib.import_module("." + name, __name__) # the import adds the module to the package : __getattr__ is called once
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
 
 # %%
@@ -0,0 +1,32 @@
+# -*- coding:utf-8 -*-
+'''
+:Created: 2026-10-19 16:05:12
+:Project: virtual PMS for microgrids
+:Version: 1.0
+:Author: Mathieu Lafitte
+:Description: Command line of the virtual PMS : python -m virtualPMS <command> (or virtualPMS <command> once the package is installed).
+    run [input] [options]   simulates the dispatch described by an input file (see Simulation.py), python -m virtualPMS run -h for the options
+    batch inputs [options]  runs many input files on a pool of worker processes, and writes an index of the runs (see Batch.py).
+                            The exit code is 1 if a run failed or was stopped.
+'''
+#---------------------
+#%%
+import sys
+import argparse
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m virtualPMS", description="Virtual PMS for microgrids.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    from virtualPMS import Simulation, Batch # the modules of the commands are only imported by the command line
+    Simulation.add_arguments(commands.add_parser("run", help="simulates the dispatch described by an input file of input//"))
+    Batch.add_arguments(commands.add_parser("batch", help="runs many input files on a pool of worker processes, with an index of the runs"))
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        Simulation.run(args)
+    elif args.command == "batch":
+        dfIndex = Batch.run(args)
+        sys.exit(0 if (dfIndex["status"] == "ok").all() else 1)
+
+if __name__ == "__main__": # worker processes (see TimeSeriesAnalysis.render_figures()) may import this module again : the simulation must not run then
+    main()
+# %%
@@ -8,10 +8,40 @@
 '''
 #---------------------
 #%%
+import os
+import sys
+if __name__ == "__main__": # test section run as a script
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
+import numpy as np
 import pandas as pd
 
+from virtualPMS.TimeSeriesStore import TimeSeriesStore
+from virtualPMS.ResultsIO import DataFormats
+
+def read_time_series(FilePath: str)-> pd.DataFrame:
+    """reads input time series saved outside of the excel file (see create_input.py). Much faster than the "Green&LoadTimeSeries" sheet for long time series.
+
+    Args:
+        FilePath (str): '.csv' (same columns as the "Green&LoadTimeSeries" sheet, second line = units) or '.npz' (one array per column)
+
+    Returns:
+        pd.DataFrame: same format as the "Green&LoadTimeSeries" sheet (without the unit line and the notes)
+    """
+    ext = os.path.splitext(FilePath)[1].lower()
+    assert ext in ['.csv', '.npz'], f"!!! unknown time series format {ext} (.csv | .npz) !!!"
+    if ext == '.npz':
+        with np.load(FilePath) as npz:
+            TimeSeriesSheet = pd.DataFrame({col: npz[col] for col in npz.files})
+    else:
+        TimeSeriesSheet = pd.read_csv(FilePath, skiprows=[1], engine='c')
+    return TimeSeriesSheet.drop("notes", axis=1, errors="ignore")
+
 def openxlsx(ExcelPath: 'str')-> tuple[pd.DataFrame]:
     """reads the input excel file and returns one dataframe per sheet. Also delete unused columns.
+    If the optional parameter "TimeSeriesFile" of the "main" sheet is given, the time series are read from this file instead of the "Green&LoadTimeSeries" sheet.
+    If the optional parameter "TimeSeriesStore" of the "main" sheet is given ('YES' for .tsstore next to the excel file, or a folder relative to it), the time series
+    are resolved through a TimeSeriesStore : a time serie that was already read by a previous run, from this workbook or from another one, is not parsed again
+    but memory-mapped from the store. Nothing is written next to the excel file without this parameter.
     
     Args:
         ExcelPath (str): path of the input excel file (usually input//inpParam.xlsx)
@@ -19,28 +49,47 @@ def openxlsx(ExcelPath: 'str')-> tuple[pd.DataFrame]:
     Returns:
         tuple[pd.DataFrame]: input parameters (components, timeseries, output settings...) as DataFrames
     """
-    sheets_dict = pd.read_excel(ExcelPath, sheet_name=None)
+    ExcelDir = os.path.dirname(os.path.abspath(ExcelPath))
+    with pd.ExcelFile(ExcelPath) as xlsx:
+        # ColsToDrop = ["type", "notes", "..."]
+        mainSheetRaw = xlsx.parse("main")
+        mainSheet = mainSheetRaw.drop(["type", "notes"], axis=1).set_index("parameter")
 
-    # ColsToDrop = ["type", "notes", "..."]
-    mainSheetRaw = sheets_dict.get("main")
-    mainSheet = mainSheetRaw.drop(["type", "notes"], axis=1).set_index("parameter")
+        try: TimeSeriesFile = mainSheet.loc["TimeSeriesFile", "value"]
+        except: TimeSeriesFile = None
+        try: StorePath = mainSheet.loc["TimeSeriesStore", "value"]
+        except: StorePath = "NO"
+        StorePath = StorePath.strip() if isinstance(StorePath, str) and StorePath.strip() != "" else "NO"
+        StorePath = ".tsstore" if StorePath.upper() == "YES" else StorePath
 
-    TimeSeriesSheetRaw = sheets_dict.get("Green&LoadTimeSeries")
-    TimeSeriesSheet = TimeSeriesSheetRaw.drop("notes", axis=1).drop(0,axis=0).reset_index(drop=True)
+        if isinstance(TimeSeriesFile, str) and TimeSeriesFile.strip() != "":
+            # relative paths start from the folder of the excel file
+            TimeSeriesPath = os.path.join(ExcelDir, TimeSeriesFile.strip())
+            parser = lambda: read_time_series(TimeSeriesPath)
+            SourceKey = TimeSeriesStore.hash_file if StorePath.upper() != "NO" else None
+            SourceKey = SourceKey(TimeSeriesPath) if SourceKey is not None else None
+        else:
+            parser = lambda: xlsx.parse("Green&LoadTimeSeries").drop("notes", axis=1).drop(0,axis=0).reset_index(drop=True)
+            SourceKey = TimeSeriesStore.hash_xlsx_sheet(ExcelPath, "Green&LoadTimeSeries") if StorePath.upper() != "NO" else None
+        if StorePath.upper() == "NO":
+            TimeSeriesSheet = parser()
+        else: # stored series are typed (VerifTimeSeriesSheet) : they are read as they were saved, never parsed again
+            store = TimeSeriesStore(os.path.join(ExcelDir, StorePath))
+            TimeSeriesSheet = store.load(SourceKey, lambda: VerifTimeSeriesSheet(parser()))
 
-    GridPricesSheetRaw = sheets_dict.get("GridPrices")
-    GridPricesSheet = GridPricesSheetRaw.drop("Consumption Mode", axis=1).set_index("Id")
-    GridScheduleSheetRaw = sheets_dict.get("GridSchedule")
-    GridScheduleSheet = GridScheduleSheetRaw.set_index("Hour | Month")
+        GridPricesSheetRaw = xlsx.parse("GridPrices")
+        GridPricesSheet = GridPricesSheetRaw.drop("Consumption Mode", axis=1).set_index("Id")
+        GridScheduleSheetRaw = xlsx.parse("GridSchedule")
+        GridScheduleSheet = GridScheduleSheetRaw.set_index("Hour | Month")
 
-    BattSheetRaw = sheets_dict.get("Batteries")
-    BattSheet = BattSheetRaw.drop(["unit","etc"], axis=1, errors="ignore").iloc[:10].set_index("parameter")
+        BattSheetRaw = xlsx.parse("Batteries")
+        BattSheet = BattSheetRaw.drop(["unit","etc"], axis=1, errors="ignore").iloc[:10].set_index("parameter")
 
-    DieselSheetRaw = sheets_dict.get("DieselGenerator")
-    DieselSheet = DieselSheetRaw.drop(["unit","notes"], axis=1).set_index("parameter")
+        DieselSheetRaw = xlsx.parse("DieselGenerator")
+        DieselSheet = DieselSheetRaw.drop(["unit","notes"], axis=1).set_index("parameter")
 
-    outFSheetRaw = sheets_dict.get("outputFormat")
-    outFSheet = outFSheetRaw.drop("notes", axis=1).set_index("dataset")
+        outFSheetRaw = xlsx.parse("outputFormat")
+        outFSheet = outFSheetRaw.drop("notes", axis=1).set_index("dataset")
 
     return mainSheet, TimeSeriesSheet, GridPricesSheet, GridScheduleSheet, BattSheet, DieselSheet, outFSheet
 
@@ -66,12 +115,93 @@ def VerifTimeSeriesSheet(TimeSeriesSheet: pd.DataFrame)-> pd.DataFrame:
     Returns:
         pd.DataFrame: TimeSeriesSheet, with each column converted to the good format
     """
-    TimeSeriesSheetNew = pd.DataFrame.copy(TimeSeriesSheet)
-    TimeSeriesSheetNew["Time"] = pd.to_datetime(TimeSeriesSheetNew["Time"])
-    TimeSeriesSheetNew["Load"] = pd.to_numeric(TimeSeriesSheetNew["Load"], errors="coerce")
-    TimeSeriesSheetNew["Green Prod"] = pd.to_numeric(TimeSeriesSheetNew["Green Prod"], errors="coerce")
+    TimeSeriesSheetNew = TimeSeriesSheet.copy(deep=False) # columns are replaced, never modified : (read-only) input arrays can be shared
+    if not pd.api.types.is_datetime64_any_dtype(TimeSeriesSheetNew["Time"]):
+        TimeSeriesSheetNew["Time"] = pd.to_datetime(TimeSeriesSheetNew["Time"])
+    for col in ["Load", "Green Prod", "Grid State"]:
+        if col in TimeSeriesSheetNew.columns and not pd.api.types.is_numeric_dtype(TimeSeriesSheetNew[col]):
+            TimeSeriesSheetNew[col] = pd.to_numeric(TimeSeriesSheetNew[col], errors="coerce")
     return TimeSeriesSheetNew
 
+def RepairTimeSeriesSheet(TimeSeriesSheet: pd.DataFrame, dt: float = None, policy: str = 'interpolate')-> tuple[pd.DataFrame, dict]:
+    """Sorts the time series, removes duplicated dates and fills the missing time steps, so that every time step lasts dt (dispatching strategies rely on it).
+    Vectorized : a multi-year 1-minute time serie is repaired in well under a second.
+
+    Args:
+        TimeSeriesSheet (pd.DataFrame): output of VerifTimeSeriesSheet ("Time" converted to datetime, other columns numeric)
+        dt (float, optional): nominal duration of a time step, in hours. Defaults to None (most frequent time step of the input).
+        policy (str, optional): how missing time steps are filled
+                                'interpolate' : Load and Green Prod are joined linearly, Grid State keeps its last value,
+                                'hold' : every column keeps its last value,
+                                'zero' : Load and Green Prod are 0, Grid State keeps its last value,
+                                'outage' : Load and Green Prod keep their last value, Grid State is 0 (grid cut-off while data is missing).
+                                Defaults to 'interpolate'.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: repaired TimeSeriesSheet, gap report (dt in hours, number of unsorted, duplicated, misaligned and filled time steps,
+                                   gaps as a pd.DataFrame : last date before the gap, first date after the gap, number of missing time steps)
+    """
+    assert(policy in ['interpolate', 'hold', 'zero', 'outage'])
+    t_raw = TimeSeriesSheet["Time"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    unsorted = int(np.count_nonzero(np.diff(t_raw) < 0))
+    order = np.argsort(t_raw, kind='stable')
+    t = t_raw[order]
+
+    # nominal time step : most frequent one
+    steps = np.diff(t)
+    if dt is None:
+        step_values, step_counts = np.unique(steps[steps > 0], return_counts=True)
+        dt_ns = int(step_values[np.argmax(step_counts)])
+    else:
+        dt_ns = int(round(dt * 3600e9))
+
+    # position of every row on the regular time grid, the first row of a duplicated position is kept
+    slots = np.rint((t - t[0]) / dt_ns).astype(np.int64)
+    misaligned = int(np.count_nonzero(np.abs(t - t[0] - slots * dt_ns) > 0.01 * dt_ns))
+    keep = np.concatenate(([True], np.diff(slots) != 0))
+    duplicates = int(len(slots) - np.count_nonzero(keep))
+    slots, rows = slots[keep], order[keep]
+
+    # gaps
+    slot_steps = np.diff(slots)
+    gap_idx = np.flatnonzero(slot_steps > 1)
+    gaps = pd.DataFrame({"start": (t[0] + slots[gap_idx] * dt_ns).astype("datetime64[ns]"),
+                         "end": (t[0] + slots[gap_idx + 1] * dt_ns).astype("datetime64[ns]"),
+                         "missing_steps": slot_steps[gap_idx] - 1})
+    full = np.arange(slots[-1] + 1)
+    previous = np.searchsorted(slots, full, side='right') - 1 # last existing row at or before every time step
+    missing = np.ones(len(full), dtype=bool)
+    missing[slots] = False
+
+    TimeSeriesSheetNew = pd.DataFrame({"Time": (t[0] + full * dt_ns).astype("datetime64[ns]")})
+    for col in TimeSeriesSheet.columns:
+        if col == "Time":
+            continue
+        values = TimeSeriesSheet[col].to_numpy()
+        values = values if (unsorted == 0 and duplicates == 0) else values[rows] # sorted input arrays are used as they are (no copy)
+        if len(gaps) == 0: # nothing to fill, dtypes are kept
+            filled = values
+        elif col == "Grid State":
+            filled = np.zeros(len(full), dtype=values.dtype) if policy == 'outage' else values[previous]
+            filled[slots] = values
+        elif policy == 'interpolate':
+            filled = np.interp(full, slots, values.astype(float))
+        elif policy == 'zero':
+            filled = np.zeros(len(full))
+            filled[slots] = values
+        else: # 'hold', 'outage'
+            filled = values[previous]
+        TimeSeriesSheetNew[col] = filled
+
+    report = {"dt": dt_ns / 3600e9, "unsorted": unsorted, "duplicates": duplicates, "misaligned": misaligned,
+              "filled": int(np.count_nonzero(missing)), "policy": policy, "gaps": gaps}
+    if unsorted or duplicates or misaligned or len(gaps):
+        print(f"!!! time series repaired (dt = {round(report['dt'] * 60, 4)} min) : {unsorted} unsorted, {duplicates} duplicated, {misaligned} misaligned dates, "
+              f"{len(gaps)} gap(s) = {report['filled']} time steps filled with policy '{policy}' !!!")
+        if len(gaps):
+            print(gaps.sort_values("missing_steps", ascending=False).head(5).to_string(index=False))
+    return TimeSeriesSheetNew, report
+
 def VerifGridPricesSheet(GridPricesSheet: pd.DataFrame)-> pd.DataFrame:
     """Verify the validity of the excel sheet "GridPrices"
     
@@ -175,7 +305,7 @@ def VerifoutFSheet(outFSheet: pd.DataFrame)-> pd.DataFrame:
         outFSheet (pd.DataFrame): content of the "" sheet as a pd.DataFrame. "" column is the index 
     
     Returns:
-        pd.DataFrame: only necessary values of outFSheet (nan index lines dropped)
+        pd.DataFrame: only necessary values of outFSheet (nan index lines dropped, missing data format columns added as False)
     """
     outFSheetNew = pd.DataFrame.copy(outFSheet)
     for row in outFSheet.index:
@@ -189,5 +319,45 @@ def VerifoutFSheet(outFSheet: pd.DataFrame)-> pd.DataFrame:
                 outFSheetNew.iloc[i,j] = True if outFSheetNew.iloc[i,j]=="YES" else False
             except:
                 print(f"wrong value for line {i} col {j} in outputFormat")
+    for fmt in DataFormats: # columnar formats are optional columns (older input files)
+        if fmt not in outFSheetNew.columns:
+            outFSheetNew[fmt] = False
     return outFSheetNew
+# test section
+# -----------------------------------------------------------------
+if __name__ == "__main__":
+    print("\n --- testing RepairTimeSeriesSheet() ---\n")
+    TimeFull = np.arange(np.datetime64('2024-01-01T00:00'), np.datetime64('2026-01-01T00:00'), np.timedelta64(1, 'm')) # 2 years, 1-minute
+    LoadFull = np.arange(len(TimeFull), dtype=float)
+    missing = np.zeros(len(TimeFull), dtype=bool)
+    missing[[10, 11, 12, 5000, 700000]] = True
+    dfTS = pd.DataFrame({"Time": TimeFull, "Load": LoadFull, "Green Prod": 1.0, "Grid State": 1})[~missing]
+    dfTS = pd.concat([dfTS.iloc[100:], dfTS.iloc[:100], dfTS.iloc[50:52]])       # unsorted, with 2 duplicates
+
+    for GapPolicy in ['interpolate', 'hold', 'zero', 'outage']:
+        dfRepaired, GapReport = RepairTimeSeriesSheet(dfTS, policy=GapPolicy)
+        assert(len(dfRepaired) == len(TimeFull) and np.all(dfRepaired["Time"].to_numpy() == TimeFull))
+        assert(GapReport["duplicates"] == 2 and GapReport["filled"] == 5 and len(GapReport["gaps"]) == 3)
+    dfRepaired, GapReport = RepairTimeSeriesSheet(dfTS, policy='interpolate')
+    assert(np.all(dfRepaired["Load"] == LoadFull))
+    dfRepaired, GapReport = RepairTimeSeriesSheet(dfTS, policy='outage')
+    assert(np.all((dfRepaired["Grid State"] == 0) == missing) and dfRepaired["Load"][12] == 9)
+
+    print("\n --- testing read_time_series() ---\n")
+    import tempfile
+    dfTS = pd.DataFrame({"Time": TimeFull[:1000], "Load": LoadFull[:1000], "Green Prod": 1.0, "Grid State": 1})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        np.savez(os.path.join(tmpdir, "TS.npz"), **{col: dfTS[col].to_numpy() for col in dfTS.columns})
+        pd.DataFrame({"Time":["%Y-%m-%d %H:%M:%S"],"Load":["kW"], "Green Prod":["kW"], "Grid State": ["binary (optional)"]}).to_csv(os.path.join(tmpdir, "TS.csv"), index=False)
+        dfTS.to_csv(os.path.join(tmpdir, "TS.csv"), mode='a', header=False, index=False)
+        for ext in ['.npz', '.csv']:
+            dfRead = VerifTimeSeriesSheet(read_time_series(os.path.join(tmpdir, "TS" + ext)))
+            assert(list(dfRead.columns) == list(dfTS.columns) and np.all(dfRead["Time"].to_numpy() == TimeFull[:1000]))
+            assert(np.all(dfRead["Load"] == LoadFull[:1000]) and np.all(dfRead["Grid State"] == 1))
+
+        print("\n --- testing openxlsx() without TimeSeriesStore parameter ---\n")
+        import shutil
+        shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "input", "inpParam.xlsx"), tmpdir)
+        TimeSeriesSheet = openxlsx(os.path.join(tmpdir, "inpParam.xlsx"))[1]
+        assert(len(TimeSeriesSheet) > 0 and not os.path.exists(os.path.join(tmpdir, ".tsstore")))     # the store is opt-in
 # %%
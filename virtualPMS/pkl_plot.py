@@ -4,11 +4,13 @@
 :Project: virtual PMS for microgrids
 :Version: 1.0
 :Author: Mathieu Lafitte
-:Description: This script uses matplotlib to show some plots saved with the '.pkl' extension.
+:Description: This script uses matplotlib to show the figures saved by the virtual PMS : figure bundles ('.vfig', time series + layout)
+and, for older results, pickled figures ('.pkl'). Figure bundles are read lazily : the curves are plotted at the resolution of the screen,
+and at full resolution in the visible window when you zoom in or pan, so that multi-year results stay fluid.
 :How to use:
 Method 1 (for ad hoc use) :
-python pickle_plot.py "pklfilepath"
-example : python pickle_plot.py "output//result.pkl"
+python pkl_plot.py "filepath"
+example : python pkl_plot.py "output//result.vfig"
 
 Method 2 (for regular use, windows environment) :
 In this method you will create an executable file and define it as default app to open '.pkl' files.
@@ -16,28 +18,34 @@ In this method you will create an executable file and define it as default app t
 - "pyinstaller --onefile pkl_plot.py". This step might take a few minutes.
       NB: if you don't want to display the python terminal (which closes automatically when you close the plot page), run "pyinstaller --onefile --noconsole pkl_plot.py" instead
 - find pkl_plot.exe under "pkl_plot_build/dist/": copy it wherever you want, preferably in a folder that won't change
-- set pkl_plot.exe as the default app for '.pkl' extension : 
-      --> right click on a .pkl file
+- set pkl_plot.exe as the default app for '.vfig' (and '.pkl') extension : 
+      --> right click on a .vfig file
               --> open with
                       --> choose another app
                               --> enter the path of pkl_plot.exe
 '''
 #---------------------
 # %%
+import os
 import sys
 import pickle
 import matplotlib.pyplot as plt
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))) # add the entire module to python path
 
 if len(sys.argv) != 2:
-    print("Usage: python affiche_figure.py <figure_file.pkl>")
+    print("Usage: python pkl_plot.py <figure_file.vfig>")
     sys.exit(1)
 
-fichier_pkl = sys.argv[1]
+fichier_fig = sys.argv[1]
 
 try:
-    with open(fichier_pkl, 'rb') as f:
-        fig = pickle.load(f)
-    plt.show()
+    if fichier_fig.lower().endswith('.pkl'): # pickled matplotlib figure (older results)
+        with open(fichier_fig, 'rb') as f:
+            fig = pickle.load(f)
+        plt.show()
+    else:
+        from virtualPMS.TimeSeriesAnalysis import show_figure_bundle
+        show_figure_bundle(fichier_fig)
 except Exception as e:
-    print(f"Erreur lors du chargement de {fichier_pkl} : {e}")
+    print(f"Erreur lors du chargement de {fichier_fig} : {e}")
     sys.exit(1)